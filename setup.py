@@ -47,6 +47,7 @@ setup(
             "pytest-cov",
             "pre-commit",
         ],
+        "zstd": ["zstandard>=0.21"],
     },
     entry_points={
         "console_scripts": [
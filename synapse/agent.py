@@ -1,8 +1,36 @@
 # synapse/agent.py
+import asyncio
+import inspect
+import threading
 import time
 import traceback
 import uuid
-from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Executor, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .batching import MicroBatcher
+from .executors import RemoteAgentError, RemoteAgentFunction
+from .retry import RetryPolicy
+from .run_state import AgentResult
+from .streams import ItemStream
+
+
+class AttemptClaim:
+    """
+    Decides whether an attempt or its timeout gets recorded.
+
+    Used when the attempt's timeout is enforced by the scheduler rather than
+    by the attempt itself: whichever of the two takes the claim first records
+    the outcome, the other one is dropped.
+    """
+
+    def __init__(self) -> None:
+        self.started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        return self._lock.acquire(blocking=False)
 
 
 class Agent:
@@ -18,100 +46,452 @@ class Agent:
         retries: int = 1,
         timeout_s: float = 30.0,
         metadata: Optional[Dict] = None,
+        retry_policy: Optional[RetryPolicy] = None,
     ):
         self.name = name
         self.func = func
         self.model = model
-        self.retries = retries
+        self.retry_policy = retry_policy or RetryPolicy(retries=retries)
+        self.retries = self.retry_policy.retries
         self.timeout_s = timeout_s
         self.metadata = metadata or {}
         self.id = str(uuid.uuid4())
+        self.is_async = inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(
+            func
+        )
+        # generator agents yield items; their output is {"items": [...]}
+        self.is_stream = inspect.isgeneratorfunction(
+            func
+        ) or inspect.isasyncgenfunction(func)
+
+    @property
+    def runs_in_thread(self) -> bool:
+        """Whether a call runs on the calling thread and cannot be stopped."""
+        return not self.is_async and not isinstance(
+            self.func, (RemoteAgentFunction, MicroBatcher)
+        )
 
-    def run(self, context: Dict[str, Any], tracer: Any) -> Any:
+    def run(self, context: Dict[str, Any], tracer: Any) -> AgentResult:
         """
         Run the agent synchronously with enhanced error handling.
+
+        Coroutine agents are driven to completion on a private event loop.
+        Each attempt is limited to timeout_s; a timeout counts as a failed
+        attempt. Retries sleep inline according to retry_policy; the
+        scheduler uses run_attempt instead so it can retry without blocking.
+
+        Returns:
+            AgentResult with the output, attempts and timings
         """
-        attempt = 0
-        last_exc = None
+        result = AgentResult(self.name, model=self.model, started_at=time.time())
+        while True:
+            result.attempts += 1
+            try:
+                out = self.run_attempt(context, tracer, result.attempts)
+                return result.succeed(out)
+            except Exception as e:
+                if not self.retry_policy.should_retry(e, result.attempts):
+                    # All retries exhausted
+                    raise self.exhausted(context, e, result.fail(e))
+                time.sleep(self.retry_policy.delay(result.attempts))
 
-        while attempt <= self.retries:
-            attempt += 1
-            start = time.time()
+    async def arun(
+        self,
+        context: Dict[str, Any],
+        tracer: Any,
+        executor: Optional[Executor] = None,
+    ) -> AgentResult:
+        """
+        Run the agent on the current event loop.
 
+        Coroutine agents are awaited directly, process agents are awaited on
+        their pool's future and plain sync agents are pushed to executor so
+        they never block the loop.
+        """
+        result = AgentResult(self.name, model=self.model, started_at=time.time())
+        while True:
+            result.attempts += 1
             try:
-                # Validate context
-                if not isinstance(context, dict):
-                    raise ValueError(
-                        f"Context must be a dictionary, got {type(context)}"
-                    )
-
-                # Call agent function
-                out = self.func(context)
-
-                # Validate output
-                if out is None:
-                    raise ValueError(f"Agent {self.name} returned None")
-
-                duration = time.time() - start
-
-                # Record success
-                tracer.record_node(
-                    run_id=tracer.current_run_id,
-                    agent_id=self.id,
-                    name=self.name,
-                    input_ctx=context,
-                    output=out,
-                    duration=duration,
-                    attempt=attempt,
-                    model=self.model,
-                    metadata=self.metadata,
+                out = await self.arun_attempt(
+                    context, tracer, result.attempts, executor
                 )
+                return result.succeed(out)
+            except Exception as e:
+                if not self.retry_policy.should_retry(e, result.attempts):
+                    raise self.exhausted(context, e, result.fail(e))
+                await asyncio.sleep(self.retry_policy.delay(result.attempts))
 
-                # Let mypy know out is a Dict[str, Any]
-                # out = cast(Dict[str, Any], out)
+    def run_attempt(
+        self,
+        context: Dict[str, Any],
+        tracer: Any,
+        attempt: int,
+        hedge: bool = False,
+        queue_wait: Optional[float] = None,
+        sink: Optional[ItemStream] = None,
+        item_index: Optional[int] = None,
+        claim: Optional[AttemptClaim] = None,
+    ) -> Any:
+        """
+        Run a single attempt and record it; errors are re-raised.
 
-                return out
+        hedge marks a duplicate started while the original attempt is still
+        running; it is recorded with hedge set in its trace metadata.
+        queue_wait is the time the attempt waited to be scheduled, recorded
+        apart from its duration. Items yielded by a generator agent are
+        published to sink as they arrive. item_index is recorded as
+        map_index for the item tasks of a map_over agent.
 
-            except Exception as e:
-                duration = time.time() - start
-                err = traceback.format_exc()
-
-                # Enhanced error information
-                error_info = self._format_error(e, err, context)
-
-                tracer.record_error(
-                    run_id=tracer.current_run_id,
-                    agent_id=self.id,
-                    name=self.name,
-                    error=error_info["message"],
-                    stack=error_info["stack"],
-                    duration=duration,
-                    attempt=attempt,
-                    model=self.model,
-                    metadata=self.metadata,
+        With a claim, timeout_s is left to the caller, which calls give_up
+        at the deadline; the attempt is then only recorded if it takes the
+        claim first.
+        """
+        metadata = self._attempt_metadata(hedge, item_index)
+        start = time.time()
+        # whether this attempt, rather than its timeout, gets recorded
+        claimed = claim is None
+        if claim is not None:
+            claim.started = start
+        try:
+            # Validate context
+            if not isinstance(context, dict):
+                raise ValueError(f"Context must be a dictionary, got {type(context)}")
+
+            # Call agent function
+            out = self._call(context, sink, timeout=claim is None)
+            metadata = self._stream_metadata(metadata, sink, start)
+            if not claimed:
+                claimed = claim is not None and claim.take()
+                if not claimed:
+                    return out
+
+            return self._record_success(
+                context, out, start, attempt, tracer, metadata, queue_wait
+            )
+
+        except Exception as e:
+            if not claimed:
+                claimed = claim is not None and claim.take()
+            if claimed:
+                self._record_failure(
+                    e, context, start, attempt, tracer, metadata, queue_wait
                 )
+            raise
+
+    def give_up(
+        self,
+        claim: AttemptClaim,
+        context: Dict[str, Any],
+        tracer: Any,
+        attempt: int,
+        hedge: bool = False,
+        queue_wait: Optional[float] = None,
+        item_index: Optional[int] = None,
+    ) -> Optional["AgentTimeoutError"]:
+        """
+        Record an attempt run with claim as timed out.
+
+        Returns:
+            The timeout error, or None if the attempt already finished
+        """
+        if not claim.take():
+            return None
+        error = self._timeout_error()
+        self._record_failure(
+            error,
+            context,
+            claim.started or time.time(),
+            attempt,
+            tracer,
+            self._attempt_metadata(hedge, item_index),
+            queue_wait,
+            stack="",
+        )
+        return error
+
+    async def arun_attempt(
+        self,
+        context: Dict[str, Any],
+        tracer: Any,
+        attempt: int,
+        executor: Optional[Executor] = None,
+        hedge: bool = False,
+        queue_wait: Optional[float] = None,
+        sink: Optional[ItemStream] = None,
+        item_index: Optional[int] = None,
+    ) -> Any:
+        """
+        Async counterpart of run_attempt.
+
+        An attempt cancelled from outside, e.g. a hedge that lost the race,
+        is recorded with status cancelled.
+        """
+        metadata = self._attempt_metadata(hedge, item_index)
+        start = time.time()
+        try:
+            if not isinstance(context, dict):
+                raise ValueError(f"Context must be a dictionary, got {type(context)}")
+
+            out = await self._acall(context, executor, sink)
+            metadata = self._stream_metadata(metadata, sink, start)
+
+            return self._record_success(
+                context, out, start, attempt, tracer, metadata, queue_wait
+            )
+
+        except asyncio.CancelledError as e:
+            self._record_failure(
+                e, context, start, attempt, tracer, metadata, queue_wait, "cancelled"
+            )
+            raise
+        except Exception as e:
+            self._record_failure(
+                e, context, start, attempt, tracer, metadata, queue_wait
+            )
+            raise
+
+    def _call(
+        self,
+        context: Dict[str, Any],
+        sink: Optional[ItemStream] = None,
+        timeout: bool = True,
+    ) -> Any:
+        """
+        Call the agent function once, enforcing timeout_s.
 
-                last_exc = e
+        Sync agents run on a throwaway daemon thread that is abandoned on
+        timeout, unless timeout is False: they are then called on the
+        current thread and the caller enforces timeout_s. Process agents
+        have their worker killed and batched agents have the call dropped
+        from its batch.
+        """
+        if self.is_async:
+            return asyncio.run(self._acall(context, None, sink))
+
+        if isinstance(self.func, (RemoteAgentFunction, MicroBatcher)):
+            future = self.func.submit(context)
+            try:
+                return future.result(timeout=self.timeout_s or None)
+            except FutureTimeoutError:
+                error = self._timeout_error()
+                self.func.kill(future, error)
+                raise error from None
+
+        func = self._collector(sink) if self.is_stream else self.func
+        if not self.timeout_s or not timeout:
+            return func(context)
+
+        try:
+            return self._call_in_thread(func, context).result(timeout=self.timeout_s)
+        except FutureTimeoutError:
+            # the thread keeps running, its result is simply dropped
+            raise self._timeout_error() from None
+
+    async def _acall(
+        self,
+        context: Dict[str, Any],
+        executor: Optional[Executor],
+        sink: Optional[ItemStream] = None,
+    ) -> Any:
+        """Await the agent function once, cancelling it after timeout_s."""
+        future: Optional["Future[Any]"] = None
+        call: Awaitable[Any]
+        if self.is_async and self.is_stream:
+            call = self._acollect(context, sink)
+        elif self.is_async:
+            call = self.func(context)
+        elif isinstance(self.func, (RemoteAgentFunction, MicroBatcher)):
+            future = self.func.submit(context)
+            call = asyncio.wrap_future(future)
+        else:
+            loop = asyncio.get_running_loop()
+            func = self._collector(sink) if self.is_stream else self.func
+            call = loop.run_in_executor(executor, func, context)
+
+        try:
+            return await asyncio.wait_for(call, timeout=self.timeout_s or None)
+        except asyncio.TimeoutError:
+            error = self._timeout_error()
+            if future is not None and isinstance(
+                self.func, (RemoteAgentFunction, MicroBatcher)
+            ):
+                self.func.kill(future, error)
+            raise error from None
+
+    def _collector(self, sink: Optional[ItemStream]) -> Callable[[Dict], Any]:
+        """Wrap a generator agent so a call drains it into its output."""
+
+        def collect(context: Dict[str, Any]) -> Dict[str, Any]:
+            items = []
+            for item in self.func(context):
+                items.append(item)
+                if sink is not None:
+                    sink.put(item)
+            return {"items": items}
+
+        return collect
 
-                # Backoff
-                if attempt <= self.retries:
-                    time.sleep(min(1 * attempt, 3))
+    async def _acollect(
+        self, context: Dict[str, Any], sink: Optional[ItemStream]
+    ) -> Dict[str, Any]:
+        """Async counterpart of _collector for async generator agents."""
+        items = []
+        async for item in self.func(context):
+            items.append(item)
+            if sink is not None:
+                sink.put(item)
+        return {"items": items}
+
+    @staticmethod
+    def _stream_metadata(
+        metadata: Dict[str, Any], sink: Optional[ItemStream], start: float
+    ) -> Dict[str, Any]:
+        """Add the time to the first streamed item to an attempt's metadata."""
+        if sink is None or sink.first_item_at is None:
+            return metadata
+        return {**metadata, "time_to_first_item": sink.first_item_at - start}
 
-        # All retries exhausted
-        raise AgentExecutionError(
-            f"Agent {self.name} failed after {self.retries + 1} attempts",
+    @staticmethod
+    def _traced_input(context: Dict[str, Any]) -> Dict[str, Any]:
+        """Context as recorded in the trace, streams replaced by producer."""
+        streams = context.get("streams")
+        if not streams:
+            return context
+        traced = {k: v for k, v in context.items() if k != "stream"}
+        traced["streams"] = sorted(streams)
+        return traced
+
+    def _call_in_thread(
+        self, func: Callable[[Dict], Any], context: Dict[str, Any]
+    ) -> "Future[Any]":
+        """Run a sync agent function on its own daemon thread."""
+        future: "Future[Any]" = Future()
+
+        def target() -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(context))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(
+            target=target, name=f"synapse-agent-{self.name}", daemon=True
+        ).start()
+        return future
+
+    def _timeout_error(self) -> "AgentTimeoutError":
+        return AgentTimeoutError(
+            f"Agent {self.name} timed out after {self.timeout_s}s",
+            agent_name=self.name,
+            timeout_s=self.timeout_s,
+        )
+
+    def _attempt_metadata(
+        self, hedge: bool, item_index: Optional[int] = None
+    ) -> Dict[str, Any]:
+        if not hedge and item_index is None:
+            return self.metadata
+        metadata = dict(self.metadata)
+        if hedge:
+            metadata["hedge"] = True
+        if item_index is not None:
+            metadata["map_index"] = item_index
+        return metadata
+
+    def _record_success(
+        self,
+        context: Dict[str, Any],
+        out: Any,
+        start: float,
+        attempt: int,
+        tracer: Any,
+        metadata: Optional[Dict[str, Any]] = None,
+        queue_wait: Optional[float] = None,
+    ) -> Any:
+        """Validate an attempt's output and record it in the trace."""
+        # Validate output
+        if out is None:
+            raise ValueError(f"Agent {self.name} returned None")
+
+        duration = time.time() - start
+
+        # Record success
+        tracer.record_node(
+            run_id=tracer.current_run_id,
+            agent_id=self.id,
+            name=self.name,
+            input_ctx=self._traced_input(context),
+            output=out,
+            duration=duration,
+            attempt=attempt,
+            model=self.model,
+            metadata=self.metadata if metadata is None else metadata,
+            queue_wait=queue_wait,
+        )
+
+        return out
+
+    def _record_failure(
+        self,
+        error: BaseException,
+        context: Dict[str, Any],
+        start: float,
+        attempt: int,
+        tracer: Any,
+        metadata: Optional[Dict[str, Any]] = None,
+        queue_wait: Optional[float] = None,
+        status: str = "error",
+        stack: Optional[str] = None,
+    ) -> None:
+        """Record a failed attempt in the trace."""
+        duration = time.time() - start
+        err = traceback.format_exc() if stack is None else stack
+
+        # Enhanced error information
+        error_info = self._format_error(error, err, context)
+
+        tracer.record_error(
+            run_id=tracer.current_run_id,
+            agent_id=self.id,
+            name=self.name,
+            error=error_info["message"],
+            stack=error_info["stack"],
+            duration=duration,
+            attempt=attempt,
+            model=self.model,
+            metadata=self.metadata if metadata is None else metadata,
+            status=status,
+            queue_wait=queue_wait,
+        )
+
+    def exhausted(
+        self,
+        context: Dict[str, Any],
+        last_exc: Optional[Exception],
+        result: AgentResult,
+    ) -> "AgentExecutionError":
+        """Build the error raised once the agent will not be retried again."""
+        return AgentExecutionError(
+            f"Agent {self.name} failed after {result.attempts} attempts",
             agent_name=self.name,
             last_error=last_exc or Exception("No error"),
             context=context,
+            result=result,
         )
 
     def _format_error(
-        self, error: Exception, stack: str, context: dict
+        self, error: BaseException, stack: str, context: dict
     ) -> Dict[str, Any]:
         """Format error with agent context."""
+        error_type = type(error).__name__
+        if isinstance(error, RemoteAgentError):
+            # keep the worker's traceback, it is the one that matters
+            error_type = error.remote_type
+            stack = f"{error.remote_traceback}\n(raised in worker process)\n{stack}"
         return {
             "message": str(error),
-            "type": type(error).__name__,
+            "type": error_type,
             "stack": stack,
             "agent": self.name,
             "context_keys": list(context.keys()),
@@ -128,9 +508,21 @@ class AgentExecutionError(Exception):
         agent_name: str,
         last_error: Optional[Exception] = None,
         context: Optional[Dict[str, Any]] = None,
+        result: Optional[AgentResult] = None,
     ):
         self.message = message
         self.agent_name = agent_name
         self.last_error = last_error
         self.context = context
+        self.result = result
+        super().__init__(self.message)
+
+
+class AgentTimeoutError(TimeoutError):
+    """An agent attempt ran longer than its timeout."""
+
+    def __init__(self, message: str, agent_name: str, timeout_s: float):
+        self.message = message
+        self.agent_name = agent_name
+        self.timeout_s = timeout_s
         super().__init__(self.message)
@@ -1,8 +1,11 @@
 # synapse/agent_loader.py
 import ast
+import hashlib
 import importlib.util
+import inspect
 import os
 import sys
+from types import ModuleType
 from typing import Any, Callable, Dict, List, Optional, cast
 
 
@@ -78,6 +81,9 @@ class AgentLoader:
                 - func: Callable agent function
                 - metadata: Agent metadata
                 - security_report: Security analysis report
+                - file_path: Resolved path of the agent file
+                - source_hash: sha256 of the agent source
+                - batch_func: the optional run_batch function, or None
         """
         # check cache
         if agent_file in self._loaded_agents:
@@ -93,16 +99,25 @@ class AgentLoader:
         security_report = self._analyze_security(file_path)
 
         # load agent function
-        func = self._load_agent_function(file_path)
+        module = self._load_agent_module(file_path)
+        func = cast(Callable[..., Any], getattr(module, "run"))
+
+        # optional vectorized entry point: run_batch(contexts) -> outputs
+        batch_func = getattr(module, "run_batch", None)
+        if batch_func is not None and not callable(batch_func):
+            raise ValueError(f"Agent file {file_path} exports a non-callable run_batch")
 
         # extract metadata
         metadata = self._extract_metadata(file_path, func)
+        metadata["has_batch"] = batch_func is not None
 
         result = {
             "func": func,
             "metadata": metadata,
             "security_report": security_report,
             "file_path": file_path,
+            "source_hash": metadata["source_hash"],
+            "batch_func": batch_func,
         }
 
         # cache result
@@ -159,11 +174,17 @@ class AgentLoader:
         analyzer.visit(tree)
         return analyzer.get_report()
 
-    def _load_agent_function(self, file_path: str) -> Callable[..., Any]:
+    def _load_agent_module(self, file_path: str) -> ModuleType:
         """
-        Load agent function from Python file.
-
-        Expected signature: def run(context: dict) -> dict
+        Execute an agent Python file and return its module.
+
+        The module must export run, with the signature
+        def run(context: dict) -> dict
+        or: async def run(context: dict) -> dict
+        or a generator / async generator yielding items.
+        The module name is only derived from the file name, so agent files
+        sharing one replace each other in sys.modules; use the module
+        returned rather than looking it up there.
         """
 
         # generate unique module name
@@ -192,27 +213,32 @@ class AgentLoader:
             must export a 'run' function"
             )
 
-        func = getattr(module, "run")
-
         # validate function signature
-        if not callable(func):
+        if not callable(getattr(module, "run")):
             raise ValueError(
                 f"Agent file {file_path} must export a callable 'run' function"
             )
 
-        # Cast to help mypy know the type
-        return cast(Callable[..., Any], func)
+        return module
 
     def _extract_metadata(self, file_path: str, func: Callable) -> Dict[str, Any]:
         """
         Extract metadata from agent file and function.
         """
+        with open(file_path, "rb") as f:
+            source_hash = hashlib.sha256(f.read()).hexdigest()
+
         metadata = {
             "file_path": file_path,
             "file_name": os.path.basename(file_path),
+            "source_hash": source_hash,
             "function_name": func.__name__,
             "docstring": func.__doc__ or "",
             "module": func.__module__,
+            "is_async": inspect.iscoroutinefunction(func)
+            or inspect.isasyncgenfunction(func),
+            "is_stream": inspect.isgeneratorfunction(func)
+            or inspect.isasyncgenfunction(func),
         }
 
         # Try to extract more metadata from docstring
@@ -0,0 +1,144 @@
+# synapse/batching.py
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Defaults for agents exporting run_batch
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT = 0.01
+
+
+class MicroBatcher:
+    """
+    Groups single calls of an agent into calls of its run_batch function.
+
+    Calls queue up until max_size are pending or the oldest has waited
+    max_wait seconds; run_batch then gets all of their contexts at once and
+    each caller receives the output at its position. Calls from concurrent
+    runs of a workflow share the queue. Batches of one agent run one after
+    another on a dedicated thread, and a failing batch fails every call in it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[List[Dict[str, Any]]], Any],
+        max_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError(f"Agent {name} batch max_size must be at least 1")
+        if max_wait < 0:
+            raise ValueError(f"Agent {name} batch max_wait cannot be negative")
+        self.name = name
+        self.func = func
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.__name__ = "run_batch"
+        self.__doc__ = func.__doc__
+        self._is_async = inspect.iscoroutinefunction(func)
+        # (context, future, time queued)
+        self._pending: List[Tuple[Dict[str, Any], "Future[Any]", float]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._loop, name=f"synapse-batch-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, context: Dict[str, Any]) -> "Future[Any]":
+        """Queue one call; the future resolves once its batch has run."""
+        future: "Future[Any]" = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("cannot schedule new calls after shutdown")
+            self._pending.append((context, future, time.monotonic()))
+            self._cond.notify()
+        return future
+
+    def kill(self, future: "Future[Any]", error: BaseException) -> bool:
+        """
+        Fail a call with error.
+
+        A call still queued never reaches run_batch; one already in a
+        running batch has its output dropped.
+        """
+        if future.cancel():
+            return True
+        _settle(future.set_exception, error)
+        return False
+
+    def __call__(self, context: Dict[str, Any]) -> Any:
+        return self.submit(context).result()
+
+    def _take(self) -> Optional[List[Tuple[Dict[str, Any], "Future[Any]"]]]:
+        """Wait for the next batch; None once closed and drained."""
+        with self._cond:
+            while True:
+                if self._pending:
+                    if len(self._pending) >= self.max_size or self._closed:
+                        break
+                    remaining = self._pending[0][2] + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            batch = self._pending[: self.max_size]
+            del self._pending[: self.max_size]
+        # calls cancelled while queued (timed out, lost a hedge) are dropped
+        return [
+            (context, future)
+            for context, future, _ in batch
+            if future.set_running_or_notify_cancel()
+        ]
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._take()
+            if batch is None:
+                return
+            if batch:
+                self._run(batch)
+
+    def _run(self, batch: List[Tuple[Dict[str, Any], "Future[Any]"]]) -> None:
+        contexts = [context for context, _ in batch]
+        try:
+            if self._is_async:
+                outputs = list(asyncio.run(self.func(contexts)))
+            else:
+                outputs = list(self.func(contexts))
+            if len(outputs) != len(contexts):
+                raise ValueError(
+                    f"Agent {self.name} run_batch returned {len(outputs)} "
+                    f"outputs for {len(contexts)} contexts"
+                )
+        except Exception as e:
+            for _, future in batch:
+                _settle(future.set_exception, e)
+            return
+
+        for (_, future), out in zip(batch, outputs):
+            _settle(future.set_result, out)
+
+    def close(self) -> None:
+        """Stop accepting calls; those already queued still run."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def __repr__(self) -> str:
+        return f"<MicroBatcher for {self.name}>"
+
+
+def _settle(setter: Callable[[Any], None], value: Any) -> None:
+    """Resolve a future unless a timeout already failed it."""
+    try:
+        setter(value)
+    except InvalidStateError:
+        pass
@@ -0,0 +1,143 @@
+# synapse/cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+CACHE_DB_PATH = os.path.join(os.getcwd(), ".synapse/cache.db")
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def cache_key(source_hash: str, model: str, inputs: Any) -> str:
+    """Content address of an agent call: its source, model and inputs."""
+    payload = json.dumps(
+        {"source": source_hash, "model": model, "inputs": inputs},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of agent outputs keyed by cache_key.
+
+    Entries expire after a per-lookup TTL and the least recently used ones
+    are evicted once the stored outputs exceed max_bytes. Once closed, every
+    lookup misses and outputs are no longer stored.
+    Tables:
+        - entries(key, output_json, size, duration, created_at, accessed_at)
+    """
+
+    def __init__(
+        self, db_path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.db_path = db_path or CACHE_DB_PATH
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._init_db()
+
+    def _init_db(self) -> None:
+        c = self.conn.cursor()
+        c.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                output_json TEXT,
+                size INTEGER,
+                duration REAL,
+                created_at REAL,
+                accessed_at REAL
+            )"""
+        )
+        c.execute(
+            """CREATE INDEX IF NOT EXISTS idx_entries_accessed_at
+            ON entries (accessed_at)"""
+        )
+        self.conn.commit()
+        c.execute("SELECT COALESCE(SUM(size), 0) FROM entries")
+        self._size = int(c.fetchone()[0])
+
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """
+        Look up a cached output.
+
+        Returns:
+            (output, duration of the original call) or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            if self._closed:
+                return None
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT output_json, size, duration, created_at
+                FROM entries WHERE key=?""",
+                (key,),
+            )
+            row = c.fetchone()
+            if row is None:
+                return None
+
+            output_json, size, duration, created_at = row
+            if ttl is not None and now - created_at > ttl:
+                c.execute("DELETE FROM entries WHERE key=?", (key,))
+                self._size -= size
+                self.conn.commit()
+                return None
+
+            c.execute("UPDATE entries SET accessed_at=? WHERE key=?", (now, key))
+            self.conn.commit()
+        return json.loads(output_json), duration
+
+    def put(self, key: str, output: Any, duration: float) -> None:
+        output_json = json.dumps(output)
+        size = len(output_json)
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            if self._closed:
+                return
+            c = self.conn.cursor()
+            c.execute("SELECT size FROM entries WHERE key=?", (key,))
+            row = c.fetchone()
+            if row is not None:
+                self._size -= row[0]
+            c.execute(
+                """INSERT OR REPLACE INTO entries (key, output_json, size,
+                duration, created_at, accessed_at) VALUES (?,?,?,?,?,?)""",
+                (key, output_json, size, float(duration), now, now),
+            )
+            self._size += size
+            self._evict(c)
+            self.conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self.conn.close()
+
+    def _evict(self, c: sqlite3.Cursor) -> None:
+        """Drop least recently used entries until under max_bytes."""
+        while self._size > self.max_bytes:
+            c.execute(
+                """SELECT key, size FROM entries
+                ORDER BY accessed_at ASC LIMIT 64"""
+            )
+            rows = c.fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for key, size in rows:
+                c.execute("DELETE FROM entries WHERE key=?", (key,))
+                self._size -= size
+                if self._size <= self.max_bytes:
+                    return
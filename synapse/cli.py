@@ -9,13 +9,16 @@ import threading
 import tty
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Callable, Optional
+from typing import Any, Callable, List, Optional
 
 import typer
 import uvicorn
 from rich.console import Console
 
+from .config import PROJECT_CONFIG_FILE
 from .orchestrator import Orchestrator
+from .trace import TraceStore
+from .trace_backends import NDJSON_DIR, import_ndjson, list_segments
 
 app = typer.Typer()
 console = Console()
@@ -24,9 +27,6 @@ console = Console()
 MODEL_COSTS = {"gpt-4": 0.03, "gpt-3.5-turbo": 0.002, "mock": 0.0}
 
 
-PROJECT_CONFIG_FILE = ".synapse/config.json"
-
-
 def getch(
     timeout: float = 0.1,
 ) -> Optional[str]:  # Reduced timeout for more responsive log updates
@@ -261,15 +261,54 @@ def requires_init(func: Callable[..., Any]) -> Callable[..., Any]:
 @requires_init
 def run(
     workflow: str = typer.Argument(..., help="Path to workflow YAML file"),
-    prompt: str = typer.Option(..., "--prompt", "-p", help="Initial prompt/input"),
+    prompt: Optional[str] = typer.Option(
+        None, "--prompt", "-p", help="Initial prompt/input"
+    ),
+    resume: Optional[str] = typer.Option(
+        None,
+        "--resume",
+        help="Resume a failed run, re-running only agents that did not succeed",
+    ),
+    max_concurrency: Optional[int] = typer.Option(
+        None,
+        "--max-concurrency",
+        "-j",
+        help="Maximum number of agents running at once",
+    ),
+    executor: Optional[str] = typer.Option(
+        None,
+        "--executor",
+        "-e",
+        help="Agent executor: 'thread', 'async' or 'process'",
+    ),
+    target: Optional[List[str]] = typer.Option(
+        None,
+        "--target",
+        "-t",
+        help="Only run this agent and its ancestors (repeatable)",
+    ),
+    trace: Optional[str] = typer.Option(
+        None,
+        "--trace",
+        help="Trace backend: 'sqlite', 'ndjson', 'memory' or 'null'",
+    ),
 ) -> None:
     """
     Run a Synapse workflow.
 
     Example:
         synapse run pipeline.yaml --prompt "research neural rendering"
+        synapse run pipeline.yaml --prompt "..." --max-concurrency 8
+        synapse run pipeline.yaml --prompt "..." --executor async
+        synapse run pipeline.yaml --prompt "..." --target AnalysisAgent
+        synapse run pipeline.yaml --prompt "..." --trace null
+        synapse run pipeline.yaml --resume <run_id>
     """
 
+    if prompt is None and resume is None:
+        console.print("[red]Error:[/red] either --prompt or --resume is required")
+        raise typer.Exit(1)
+
     # check if workflow file exists
     if not os.path.exists(workflow):
         console.print(
@@ -280,7 +319,13 @@ def run(
 
     try:
         # initialize orchestrator
-        orch = Orchestrator(workflow)
+        orch = Orchestrator(
+            workflow,
+            max_concurrency=max_concurrency,
+            executor=executor,
+            targets=target,
+            trace=trace,
+        )
 
         # run workflow
         console.print("[cyan]Starting workflow execution...[/cyan]")
@@ -298,7 +343,11 @@ def run(
         def run_workflow() -> None:
             try:
                 # Run the workflow (result is captured via orchestrator state)
-                orch.run(prompt)
+                with orch:
+                    if resume:
+                        orch.resume(resume)
+                    else:
+                        orch.run(prompt or "")
 
                 # Save execution results to a file for logs command
                 execution_results = orch.get_execution_results()
@@ -311,10 +360,12 @@ def run(
                 run_data = {
                     "run_id": orch.run_id,
                     "workflow": workflow,
-                    "prompt": prompt,
+                    "prompt": prompt or f"(resumed from {resume})",
+                    "resumed_from": resume,
                     "start_time": datetime.now().isoformat(),
                     "status": "running",
                     "results": execution_results,
+                    "peak_rss": orch.state.peak_rss if orch.state else None,
                 }
 
                 run_file = logs_dir / f"run_{orch.run_id}.json"
@@ -330,7 +381,8 @@ def run(
                 error_data = {
                     "run_id": orch.run_id,
                     "workflow": workflow,
-                    "prompt": prompt,
+                    "prompt": prompt or f"(resumed from {resume})",
+                    "resumed_from": resume,
                     "start_time": datetime.now().isoformat(),
                     "status": "failed",
                     "error": str(e),
@@ -344,6 +396,9 @@ def run(
         # Start the workflow in a background thread
         thread = threading.Thread(target=run_workflow)
         thread.start()
+        # stay in the main thread until it ends: once the main thread exits
+        # the interpreter starts shutting down and agent pools refuse work
+        thread.join()
 
     except KeyboardInterrupt:
         console.print("\n[yellow]Interrupted by user[/yellow]")
@@ -353,6 +408,188 @@ def run(
         raise typer.Exit(1)
 
 
+def read_batch_inputs(input_file: str) -> List[str]:
+    """
+    Prompts for a batch: one per non-empty line, or for .jsonl files one
+    JSON value per line, either a string or an object with a "prompt" key.
+    """
+    prompts = []
+    jsonl = input_file.endswith(".jsonl")
+    for line in Path(input_file).read_text().splitlines():
+        if not line.strip():
+            continue
+        if not jsonl:
+            prompts.append(line.strip())
+            continue
+        value = json.loads(line)
+        prompts.append(value["prompt"] if isinstance(value, dict) else str(value))
+    return prompts
+
+
+@app.command()
+@requires_init
+def batch(
+    workflow: str = typer.Argument(..., help="Path to workflow YAML file"),
+    input_file: str = typer.Option(
+        ...,
+        "--input-file",
+        "-i",
+        help="Prompts, one per line (or JSON lines for a .jsonl file)",
+    ),
+    max_runs: Optional[int] = typer.Option(
+        None,
+        "--max-runs",
+        "-n",
+        help="Maximum number of runs in flight (default: max concurrency)",
+    ),
+    output: Optional[str] = typer.Option(
+        None, "--output", "-o", help="Write one JSON line per finished run here"
+    ),
+    max_concurrency: Optional[int] = typer.Option(
+        None,
+        "--max-concurrency",
+        "-j",
+        help="Maximum number of agents running at once in each run",
+    ),
+    executor: Optional[str] = typer.Option(
+        None,
+        "--executor",
+        "-e",
+        help="Agent executor: 'thread', 'async' or 'process'",
+    ),
+    target: Optional[List[str]] = typer.Option(
+        None,
+        "--target",
+        "-t",
+        help="Only run this agent and its ancestors (repeatable)",
+    ),
+    trace: Optional[str] = typer.Option(
+        None,
+        "--trace",
+        help="Trace backend: 'sqlite', 'ndjson', 'memory' or 'null'",
+    ),
+) -> None:
+    """
+    Run a workflow once per prompt in a file, several runs at a time.
+
+    Example:
+        synapse batch pipeline.yaml --input-file prompts.txt
+        synapse batch pipeline.yaml -i prompts.jsonl --max-runs 8 -o results.jsonl
+        synapse batch pipeline.yaml -i prompts.txt --trace ndjson
+    """
+
+    for path in (workflow, input_file):
+        if not os.path.exists(path):
+            console.print(f"[red]Error:[/red] file not found: {path}")
+            raise typer.Exit(1)
+
+    try:
+        prompts = read_batch_inputs(input_file)
+        orch = Orchestrator(
+            workflow,
+            max_concurrency=max_concurrency,
+            executor=executor,
+            targets=target,
+            trace=trace,
+        )
+    except Exception as e:
+        console.print(f"[red]Error:[/red] {str(e)}")
+        raise typer.Exit(1)
+
+    console.print(f"[cyan]Running {len(prompts)} inputs through {workflow}...[/cyan]\n")
+    logs_dir = Path(".synapse/logs")
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    out_file = open(output, "w") if output else None
+    failed = 0
+    try:
+        with orch:
+            for done, item in enumerate(orch.run_many(prompts, max_runs), 1):
+                error = item["error"]
+                run_data = {
+                    "run_id": item["run_id"],
+                    "workflow": workflow,
+                    "prompt": prompts[item["index"]],
+                    "start_time": datetime.now().isoformat(),
+                    "status": "failed" if error else "completed",
+                    "results": item["results"],
+                    "peak_rss": item["peak_rss"],
+                }
+                if error:
+                    failed += 1
+                    run_data["error"] = str(error)
+                run_file = logs_dir / f"run_{item['run_id']}.json"
+                run_file.write_text(json.dumps(run_data, indent=2))
+
+                if out_file is not None:
+                    line = {
+                        "index": item["index"],
+                        "run_id": item["run_id"],
+                        "status": run_data["status"],
+                        "error": run_data.get("error"),
+                        "outputs": item["final_context"].get("outputs", {}),
+                    }
+                    out_file.write(json.dumps(line, default=str) + "\n")
+                    out_file.flush()
+
+                icon = "[red]❌[/red]" if error else "[green]✅[/green]"
+                console.print(
+                    f"  {icon} [{done}/{len(prompts)}] #{item['index']} "
+                    f"[dim]{item['run_id']}[/dim]"
+                )
+    except KeyboardInterrupt:
+        console.print("\n[yellow]Interrupted by user[/yellow]")
+        raise typer.Exit(1)
+    finally:
+        if out_file is not None:
+            out_file.close()
+
+    console.print(f"\n[bold]{len(prompts) - failed} completed, {failed} failed[/bold]")
+    if failed:
+        raise typer.Exit(1)
+
+
+@app.command("import-traces")
+@requires_init
+def import_traces(
+    directory: str = typer.Option(
+        NDJSON_DIR, "--dir", "-d", help="Directory of NDJSON trace segments"
+    ),
+    partial: bool = typer.Option(
+        False,
+        "--partial",
+        help="Also import .part segments, e.g. left behind by a crashed run",
+    ),
+    keep: bool = typer.Option(
+        False, "--keep", help="Keep segments after importing them"
+    ),
+) -> None:
+    """
+    Import traces recorded with the ndjson backend into the SQLite trace DB.
+
+    Example:
+        synapse import-traces
+        synapse import-traces --dir /data/traces --keep
+    """
+    segments = list_segments(directory, partial=partial)
+    if not segments:
+        console.print(f"[yellow]No trace segments in {directory}[/yellow]")
+        return
+
+    store = TraceStore()
+    try:
+        for path in segments:
+            imported = import_ndjson([path], store)
+            if not keep:
+                os.remove(path)
+            console.print(
+                f"  [green]✓[/green] {os.path.basename(path)} "
+                f"[dim]{imported} records[/dim]"
+            )
+    finally:
+        store.close()
+    console.print(f"\n[bold]Imported {len(segments)} segments[/bold]")
+
+
 @app.command()
 @requires_init
 def serve(
@@ -452,6 +689,9 @@ def logs(
                 status_text = status.capitalize()
 
             console.print(f"{status_icon} Status: {status_text}")
+            if data.get("peak_rss"):
+                peak_mb = data["peak_rss"] / (1024 * 1024)
+                console.print(f"[dim]Peak memory:[/dim] {peak_mb:.1f} MB")
 
             # Display results if available
             if "results" in data and data["results"]:
@@ -473,6 +713,12 @@ def logs(
                     if status == "success":
                         icon = "[green]✅[/green]"
                         status_text = "success"
+                    elif status == "cached":
+                        icon = "[cyan]⚡[/cyan]"
+                        status_text = "cached"
+                    elif status == "skipped":
+                        icon = "[dim]⏭[/dim]"
+                        status_text = "skipped"
                     elif status == "retry_success":
                         icon = "[yellow]✅[/yellow]"
                         status_text = (
@@ -0,0 +1,212 @@
+# synapse/conditions.py
+import ast
+import operator
+from typing import Any, Callable, Dict, Mapping, Optional, Set
+
+_COMPARE: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+}
+
+# no * or ** so an expression cannot build huge values
+_BINARY: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+
+_UNARY: Dict[type, Callable[[Any], Any]] = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "len": len,
+    "any": any,
+    "all": all,
+    "min": min,
+    "max": max,
+    "abs": abs,
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+}
+
+_NODES = (
+    ast.Expression,
+    ast.BoolOp,
+    ast.And,
+    ast.Or,
+    ast.Compare,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.IfExp,
+    ast.Call,
+    ast.Name,
+    ast.Load,
+    ast.Attribute,
+    ast.Subscript,
+    ast.Constant,
+    ast.List,
+    ast.Tuple,
+    ast.Set,
+    *_COMPARE,
+    *_BINARY,
+    *_UNARY,
+)
+
+
+class ConditionError(ValueError):
+    """A when condition is not a valid expression or failed to evaluate."""
+
+
+class Condition:
+    """
+    A when condition of a schema 2.0 agent, e.g.
+
+        when: "ClassifyAgent.category == 'science' and len(input) > 10"
+
+    The expression is parsed once and evaluated against the agent's context
+    without eval: only literals, comparisons, boolean and basic arithmetic
+    operators, conditional expressions and the functions in FUNCTIONS are
+    allowed. Names are context keys such as input and outputs, or agent names
+    standing for their outputs. a.b and a["b"] both read keys of a dict, and
+    anything missing, e.g. the output of a skipped agent, reads as None.
+    outputs.A and outputs["A"] name agent A just like A does.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ConditionError(f"invalid condition '{source}': {e.msg}") from None
+        for node in ast.walk(tree):
+            # subscripts are wrapped in ast.Index before Python 3.9
+            if not isinstance(node, _NODES) and type(node).__name__ != "Index":
+                raise ConditionError(
+                    f"'{type(node).__name__}' is not allowed in condition '{source}'"
+                )
+            if isinstance(node, ast.Call) and (
+                not isinstance(node.func, ast.Name)
+                or node.func.id not in FUNCTIONS
+                or node.keywords
+            ):
+                raise ConditionError(
+                    f"only {', '.join(FUNCTIONS)} can be called in condition "
+                    f"'{source}'"
+                )
+        called = {
+            id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)
+        }
+        # context keys and agent names the expression reads
+        self.names: Set[str] = {
+            node.id
+            for node in ast.walk(tree)
+            if isinstance(node, ast.Name) and id(node) not in called
+        }
+        for node in ast.walk(tree):
+            name = _output_name(node)
+            if name is not None:
+                self.names.add(name)
+        self._body = tree.body
+
+    def evaluate(self, context: Mapping[str, Any]) -> bool:
+        """Whether the agent should run for this context."""
+        try:
+            return bool(_evaluate(self._body, context))
+        except Exception as e:
+            raise ConditionError(f"condition '{self.source}' failed: {e}") from e
+
+    def __repr__(self) -> str:
+        return f"<Condition {self.source!r}>"
+
+
+def _index(node: ast.Subscript) -> ast.AST:
+    # wrapped in ast.Index before Python 3.9
+    index = node.slice
+    if type(index).__name__ == "Index":
+        index = getattr(index, "value")
+    return index
+
+
+def _output_name(node: ast.AST) -> Optional[str]:
+    """The agent read by outputs.<name> or outputs["<name>"], if node is one."""
+    if not isinstance(node, (ast.Attribute, ast.Subscript)):
+        return None
+    if not isinstance(node.value, ast.Name) or node.value.id != "outputs":
+        return None
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    index = _index(node)
+    if isinstance(index, ast.Constant) and isinstance(index.value, str):
+        return index.value
+    return None
+
+
+def _lookup(container: Any, key: Any) -> Any:
+    """Read a key or index; never attributes, so nothing can escape."""
+    if isinstance(container, Mapping):
+        return container.get(key)
+    if isinstance(container, (list, tuple, str)) and isinstance(key, int):
+        return container[key] if -len(container) <= key < len(container) else None
+    return None
+
+
+def _evaluate(node: ast.AST, context: Mapping[str, Any]) -> Any:
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id in context:
+            return context[node.id]
+        return _lookup(context.get("outputs"), node.id)
+    if isinstance(node, ast.Attribute):
+        return _lookup(_evaluate(node.value, context), node.attr)
+    if isinstance(node, ast.Subscript):
+        return _lookup(_evaluate(node.value, context), _evaluate(_index(node), context))
+    if isinstance(node, ast.BoolOp):
+        value: Any = None
+        for operand in node.values:
+            value = _evaluate(operand, context)
+            # short-circuit like Python: and stops at falsy, or at truthy
+            if bool(value) != isinstance(node.op, ast.And):
+                return value
+        return value
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, context)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evaluate(comparator, context)
+            if not _COMPARE[type(op)](left, right):
+                return False
+            left = right
+        return True
+    if isinstance(node, ast.BinOp):
+        return _BINARY[type(node.op)](
+            _evaluate(node.left, context), _evaluate(node.right, context)
+        )
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY[type(node.op)](_evaluate(node.operand, context))
+    if isinstance(node, ast.IfExp):
+        if _evaluate(node.test, context):
+            return _evaluate(node.body, context)
+        return _evaluate(node.orelse, context)
+    if isinstance(node, ast.Call):
+        func = FUNCTIONS[getattr(node.func, "id")]
+        return func(*(_evaluate(arg, context) for arg in node.args))
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_evaluate(element, context) for element in node.elts]
+    if isinstance(node, ast.Set):
+        return {_evaluate(element, context) for element in node.elts}
+    raise ConditionError(f"'{type(node).__name__}' is not allowed in conditions")
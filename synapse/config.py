@@ -0,0 +1,20 @@
+# synapse/config.py
+import json
+import os
+from typing import Any, Dict, Optional
+
+PROJECT_CONFIG_FILE = ".synapse/config.json"
+
+
+def load_project_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read the project config written by 'synapse init'.
+
+    Returns an empty dict when the project has not been initialized.
+    """
+    path = path or os.path.join(os.getcwd(), PROJECT_CONFIG_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf8") as f:
+        config: Dict[str, Any] = json.load(f)
+    return config
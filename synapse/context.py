@@ -0,0 +1,120 @@
+# synapse/context.py
+from typing import Any, Dict, Iterable, Mapping, NoReturn, Optional, Sequence, Tuple
+
+# Context keys, besides outputs, that an agent can declare in its inputs
+INPUT_KEYS = ("input", "last_output")
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict used for shared context namespaces.
+
+    Still a real dict, so it serializes to JSON and pickles like one.
+    """
+
+    def _readonly(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError("context namespaces are read-only snapshots")
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    __ior__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (FrozenDict, (dict(self),))
+
+    def __copy__(self) -> "FrozenDict":
+        return self
+
+
+class RunContext:
+    """
+    Copy-on-write context for a run.
+
+    Every agent output is stored under its own key in the "outputs"
+    namespace. The namespace is never mutated: recording an output builds a
+    new FrozenDict that shares every existing output object, so a snapshot
+    handed to a running agent stays consistent without deep-copying
+    anything. Outputs themselves are shared between agents and should be
+    treated as read-only.
+
+    Only the outputs of an agent's ancestors are guaranteed to be present in
+    its snapshot; siblings that happened to finish earlier may show up too.
+    """
+
+    def __init__(self, initial: Dict[str, Any]):
+        self._base = FrozenDict(initial)
+        self._outputs = FrozenDict()
+        self.last_output: Any = None
+
+    @property
+    def outputs(self) -> FrozenDict:
+        return self._outputs
+
+    def set_output(self, name: str, output: Any) -> None:
+        outputs = dict(self._outputs)
+        outputs[name] = output
+        self._outputs = FrozenDict(outputs)
+        self.last_output = output
+
+    def release(self, name: str, replacement: Any = None) -> None:
+        """
+        Drop an output nothing will read any more, or swap in a replacement
+        such as a reference to a spilled copy, or the output read back from it.
+
+        Snapshots taken earlier keep their own reference to it.
+        """
+        outputs = dict(self._outputs)
+        if replacement is None:
+            outputs.pop(name, None)
+        else:
+            outputs[name] = replacement
+        self._outputs = FrozenDict(outputs)
+
+    def snapshot(self, last_output_from: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Context passed to an agent.
+
+        last_output is kept for agents written against the old single-slot
+        context; it holds the output of last_output_from when given.
+        """
+        ctx = dict(self._base)
+        ctx["outputs"] = self._outputs
+        if last_output_from is not None and last_output_from in self._outputs:
+            ctx["last_output"] = self._outputs[last_output_from]
+        return ctx
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Full context for tracing and the final run result."""
+        ctx = dict(self._base)
+        ctx["outputs"] = self._outputs
+        if self.last_output is not None:
+            ctx["last_output"] = self.last_output
+        return ctx
+
+
+def project(context: Dict[str, Any], paths: Iterable[Sequence[str]]) -> Dict[str, Any]:
+    """
+    The parts of an agent context named by paths, keeping their nesting.
+
+    ("outputs", "Research", "papers") yields {"outputs": {"Research":
+    {"papers": ...}}}. Parts that are missing are left out. No path may
+    extend another, since the values are shared and never copied.
+    """
+    projected: Dict[str, Any] = {}
+    for path in paths:
+        value: Any = context
+        for key in path:
+            if not isinstance(value, Mapping) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+    return projected
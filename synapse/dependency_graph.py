@@ -47,6 +47,27 @@ class DependencyGraph:
                 reverse[dep].add(agent)
         return dict(reverse)
 
+    def get_dependencies(self, agent_name: str) -> List[str]:
+        """Direct dependencies of an agent, in the order they were declared."""
+        for agent in self.agents:
+            if agent["name"] == agent_name:
+                depends_on = agent.get("depends_on") or []
+                if isinstance(depends_on, str):
+                    depends_on = [depends_on]
+                return list(depends_on)
+        return []
+
+    def get_ancestors(self, agent_name: str) -> Set[str]:
+        """All agents that agent_name depends on, directly or transitively."""
+        ancestors: Set[str] = set()
+        stack = list(self.graph.get(agent_name, set()))
+        while stack:
+            dep = stack.pop()
+            if dep not in ancestors:
+                ancestors.add(dep)
+                stack.extend(self.graph.get(dep, set()))
+        return ancestors
+
     def get_execution_order(self) -> List[str]:
         """
         Get topological sort of agents for execution order.
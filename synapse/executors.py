@@ -0,0 +1,282 @@
+# synapse/executors.py
+import asyncio
+import importlib.util
+import inspect
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import traceback
+from concurrent.futures import Executor, Future
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class AsyncioExecutor(Executor):
+    """
+    Executor that runs coroutine functions on a single event loop.
+
+    The loop lives on a dedicated thread, so the scheduler can keep working
+    with plain concurrent futures while every agent shares one loop.
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = threading.Thread(
+            target=self._run_loop, name="synapse-asyncio", daemon=True
+        )
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _cancel_all(self) -> None:
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+
+    def submit(
+        self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any
+    ) -> "Future[Any]":
+        """Schedule fn(*args, **kwargs), which must return a coroutine."""
+        if self._thread is None:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        return asyncio.run_coroutine_threadsafe(fn(*args, **kwargs), self.loop)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        if self._thread is None:
+            return
+        if cancel_futures:
+            self.loop.call_soon_threadsafe(self._cancel_all)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if wait:
+            self._thread.join()
+            self.loop.close()
+        self._thread = None
+
+
+class RemoteAgentError(Exception):
+    """An agent raised inside a worker process."""
+
+    def __init__(self, message: str, remote_type: str, remote_traceback: str):
+        super().__init__(message)
+        self.remote_type = remote_type
+        self.remote_traceback = remote_traceback
+
+
+class WorkerCrashedError(RuntimeError):
+    """A worker process died while running an agent."""
+
+
+def _load_run_functions(agent_files: Iterable[str]) -> Dict[str, Any]:
+    """Import each agent file once; failures are kept and reported per call."""
+    funcs: Dict[str, Any] = {}
+    for file_path in agent_files:
+        module_name = f"agent_{os.path.basename(file_path).replace('.', '_')}"
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, file_path)
+            if spec is None or spec.loader is None:
+                raise ImportError(f"Could not load agent from {file_path}")
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            funcs[file_path] = getattr(module, "run")
+        except Exception as e:
+            funcs[file_path] = e
+    return funcs
+
+
+async def _collect_async(agen: Any) -> List[Any]:
+    return [item async for item in agen]
+
+
+def _process_worker_main(conn: Connection, agent_files: List[str]) -> None:
+    """Worker process loop: receive (file, context), reply (ok, value)."""
+    funcs = _load_run_functions(agent_files)
+    while True:
+        try:
+            file_path, context = pickle.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            return
+
+        try:
+            func = funcs.get(file_path)
+            if func is None:
+                raise ImportError(f"Agent {file_path} was not preloaded")
+            if isinstance(func, Exception):
+                raise func
+            if inspect.iscoroutinefunction(func):
+                out = asyncio.run(func(context))
+            elif inspect.isasyncgenfunction(func):
+                out = {"items": asyncio.run(_collect_async(func(context)))}
+            elif inspect.isgeneratorfunction(func):
+                # items cannot stream across the pipe; send them all at once
+                out = {"items": list(func(context))}
+            else:
+                out = func(context)
+            reply = pickle.dumps((True, out), pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            error = (str(e), type(e).__name__, traceback.format_exc())
+            reply = pickle.dumps((False, error), pickle.HIGHEST_PROTOCOL)
+
+        try:
+            conn.send_bytes(reply)
+        except (EOFError, OSError):
+            return
+
+
+class ProcessAgentPool:
+    """
+    Pool of preforked worker processes for CPU-bound agents.
+
+    Workers import every agent module once at start-up, so a call costs one
+    pickled round trip over a pipe instead of a process spawn. Each worker
+    is fed by a parent-side thread that also respawns it if it dies.
+    """
+
+    def __init__(self, agent_files: Iterable[str], workers: int) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.agent_files = sorted(set(agent_files))
+        self._mp = multiprocessing.get_context("spawn")
+        self._jobs: "queue.Queue[Optional[Tuple[str, Any, Future[Any]]]]" = (
+            queue.Queue()
+        )
+        self._procs: List[Tuple[Any, Connection]] = []
+        self._running: List[Optional["Future[Any]"]] = [None] * workers
+        self._killed: List[bool] = [False] * workers
+        self._lock = threading.Lock()
+        self._feeders: List[threading.Thread] = []
+        self._closed = False
+
+        for slot in range(workers):
+            self._procs.append(self._spawn())
+            feeder = threading.Thread(
+                target=self._feed,
+                args=(slot,),
+                name=f"synapse-process-feeder-{slot}",
+                daemon=True,
+            )
+            feeder.start()
+            self._feeders.append(feeder)
+
+    def _spawn(self) -> Tuple[Any, Connection]:
+        parent_conn, child_conn = self._mp.Pipe()
+        proc = self._mp.Process(
+            target=_process_worker_main,
+            args=(child_conn, self.agent_files),
+            daemon=True,
+        )
+        proc.start()
+        child_conn.close()
+        return proc, parent_conn
+
+    def submit(self, file_path: str, context: Any) -> "Future[Any]":
+        """Run the agent in file_path on the next free worker."""
+        if self._closed:
+            raise RuntimeError("cannot schedule new calls after shutdown")
+        future: "Future[Any]" = Future()
+        self._jobs.put((file_path, context, future))
+        return future
+
+    def _feed(self, slot: int) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            file_path, context, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                payload = pickle.dumps((file_path, context), pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+
+            proc, conn = self._procs[slot]
+            with self._lock:
+                self._running[slot] = future
+            try:
+                conn.send_bytes(payload)
+                reply: Optional[bytes] = conn.recv_bytes()
+            except (EOFError, OSError):
+                reply = None
+
+            with self._lock:
+                self._running[slot] = None
+                killed = self._killed[slot]
+                self._killed[slot] = False
+
+            if reply is None or killed:
+                self._replace(slot)
+            if reply is None:
+                if not future.done():
+                    future.set_exception(
+                        WorkerCrashedError(
+                            f"Worker process {proc.pid} died running {file_path}"
+                        )
+                    )
+                continue
+            if future.done():
+                # killed after the reply was already on its way
+                continue
+
+            ok, value = pickle.loads(reply)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RemoteAgentError(*value))
+
+    def kill(self, future: "Future[Any]", error: BaseException) -> bool:
+        """
+        Fail a call with error, hard-killing its worker if it already started.
+
+        The worker is replaced by a freshly preforked one.
+        """
+        with self._lock:
+            for slot, running in enumerate(self._running):
+                if running is future:
+                    self._killed[slot] = True
+                    future.set_exception(error)
+                    self._procs[slot][0].kill()
+                    return True
+        # still queued: make sure it never starts
+        return future.cancel()
+
+    def _replace(self, slot: int) -> None:
+        """Reap a dead worker and prefork its replacement."""
+        proc, conn = self._procs[slot]
+        conn.close()
+        proc.join(timeout=1)
+        if not self._closed:
+            self._procs[slot] = self._spawn()
+
+    def shutdown(self) -> None:
+        self._closed = True
+        for _ in self._feeders:
+            self._jobs.put(None)
+        for proc, conn in self._procs:
+            conn.close()
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.kill()
+
+
+class RemoteAgentFunction:
+    """Callable stand-in for an agent's run function living in a pool."""
+
+    def __init__(self, pool: ProcessAgentPool, file_path: str) -> None:
+        self.pool = pool
+        self.file_path = file_path
+        self.__name__ = "run"
+        self.__doc__ = f"Runs {file_path} in a worker process"
+
+    def submit(self, context: Dict[str, Any]) -> "Future[Any]":
+        return self.pool.submit(self.file_path, context)
+
+    def kill(self, future: "Future[Any]", error: BaseException) -> bool:
+        return self.pool.kill(future, error)
+
+    def __call__(self, context: Dict[str, Any]) -> Any:
+        return self.submit(context).result()
@@ -0,0 +1,103 @@
+# synapse/limits.py
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class TokenBucket:
+    """
+    Token bucket allowing rate calls per second with bursts of up to burst.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available; 0 if one is available now."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class ModelLimiter:
+    """
+    Concurrency caps and token-bucket rate limits keyed by model label.
+
+    Configured from the 'models' section of the project config
+    (.synapse/config.json) and the workflow, the workflow winning per
+    setting:
+
+        models:
+            gpt-4: {max_concurrency: 2, requests_per_minute: 60, burst: 5}
+
+    Models without an entry are not limited. Acquire and release may be
+    called from different threads.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.max_concurrency: Dict[str, int] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for model, settings in (limits or {}).items():
+            settings = settings or {}
+            if settings.get("max_concurrency"):
+                self.max_concurrency[model] = int(settings["max_concurrency"])
+            if settings.get("requests_per_minute"):
+                self.buckets[model] = TokenBucket(
+                    float(settings["requests_per_minute"]) / 60.0,
+                    burst=int(settings.get("burst", 1)),
+                )
+
+    @classmethod
+    def from_config(
+        cls, *configs: Optional[Dict[str, Dict[str, Any]]]
+    ) -> "ModelLimiter":
+        """Merge 'models' sections; later configs override earlier ones."""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for config in configs:
+            for model, settings in (config or {}).items():
+                merged.setdefault(model, {}).update(settings or {})
+        return cls(merged)
+
+    def __bool__(self) -> bool:
+        return bool(self.max_concurrency or self.buckets)
+
+    def acquire(self, model: str) -> Optional[float]:
+        """
+        Try to start a call against model.
+
+        Returns None once the call may start, otherwise how long to wait
+        before trying again: the time until a token is available, or 0 when
+        the model is at its concurrency cap and a running call must finish
+        first.
+        """
+        with self._lock:
+            cap = self.max_concurrency.get(model)
+            if cap is not None and self.active.get(model, 0) >= cap:
+                return 0.0
+            bucket = self.buckets.get(model)
+            if bucket is not None:
+                wait = bucket.wait_time(time.monotonic())
+                if wait > 0:
+                    return wait
+                bucket.take()
+            self.active[model] = self.active.get(model, 0) + 1
+            return None
+
+    def release(self, model: str) -> None:
+        with self._lock:
+            self.active[model] = max(0, self.active.get(model, 0) - 1)
@@ -0,0 +1,102 @@
+# synapse/memory.py
+import os
+import pickle
+import shutil
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+SPILL_DIR = os.path.join(os.getcwd(), ".synapse/spill")
+
+# How values of release_outputs are handled once an output has no consumers
+RELEASE_MODES = ("drop", "spill")
+
+# Seconds between RSS samples while a run is being monitored
+RSS_SAMPLE_INTERVAL = 0.05
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PeakRSSMonitor:
+    """
+    Tracks the peak resident set size of the process while a run executes.
+
+    RSS is sampled on a daemon thread, so short spikes between samples can
+    be missed. Where /proc is unavailable, peak is left as None. Runs that
+    execute concurrently in one process see the same memory, so each
+    reports the process peak during its own lifetime.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "PeakRSSMonitor":
+        if self.peak is not None:
+            self._thread = threading.Thread(
+                target=self._sample, name="synapse-rss", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._record(current_rss())
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._record(current_rss())
+
+    def _record(self, rss: Optional[int]) -> None:
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+
+def spill_output(run_id: str, agent_name: str, output: Any) -> Optional[Dict[str, str]]:
+    """
+    Pickle an output to the run's spill directory.
+
+    Returns the reference left in the context in its place, which
+    load_output turns back into the output, or None if the output cannot
+    be pickled, e.g. it holds a lock or a class defined in an agent file;
+    nothing is written and the output has to stay in memory.
+    """
+    run_dir = os.path.join(SPILL_DIR, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    path = os.path.join(run_dir, f"{agent_name}.pkl")
+    try:
+        with open(path, "wb") as f:
+            pickle.dump(output, f, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        os.remove(path)
+        return None
+    return {"spilled_to": path}
+
+
+def is_spilled(value: Any) -> bool:
+    """Whether a context value is a reference left by spill_output."""
+    return isinstance(value, Mapping) and set(value) == {"spilled_to"}
+
+
+def load_output(value: Any) -> Any:
+    """An output from a run's context, read back from disk if it was spilled."""
+    if is_spilled(value):
+        with open(value["spilled_to"], "rb") as f:
+            return pickle.load(f)
+    return value
+
+
+def remove_spill(run_id: str) -> None:
+    """Delete the run's spill directory, if it has one."""
+    shutil.rmtree(os.path.join(SPILL_DIR, run_id), ignore_errors=True)
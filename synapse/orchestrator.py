@@ -1,28 +1,179 @@
 # synapse/orchestrator.py
+import functools
+import itertools
+import os
+import statistics
+import threading
 import time
 import uuid
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
-from .agent import Agent
+from .agent import Agent, AgentExecutionError, AttemptClaim
 from .agent_loader import AgentLoader
+from .batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT, MicroBatcher
+from .cache import DEFAULT_MAX_BYTES as DEFAULT_CACHE_MAX_BYTES
+from .cache import ResultCache, cache_key
+from .conditions import Condition, ConditionError
+from .config import load_project_config
+from .context import INPUT_KEYS, RunContext, project
 from .dependency_graph import DependencyGraph
-from .trace import TraceStore
+from .executors import AsyncioExecutor, ProcessAgentPool, RemoteAgentFunction
+from .limits import ModelLimiter
+from .memory import (
+    RELEASE_MODES,
+    PeakRSSMonitor,
+    is_spilled,
+    load_output,
+    remove_spill,
+    spill_output,
+)
+from .retry import RetryPolicy
+from .run_state import AgentResult, RunState
+from .scheduler import (
+    DEFAULT_MAX_CONCURRENCY,
+    SPARE_WORKERS,
+    DagScheduler,
+    item_key,
+)
+from .streams import ItemStream
+from .trace import RunTrace
+from .trace_backends import DURATION_WINDOW, create_trace_backend
 from .yaml_loader import load_workflow
 
+# How schema 2.0 agents are executed
+EXECUTOR_MODES = ("thread", "async", "process")
+
+# Upper bound on threads used for sync agents in async mode, besides the
+# scheduler's SPARE_WORKERS for calls still running after their timeout
+MAX_SYNC_WORKERS = 32
+
+# Successful runs an agent needs before a percentile hedge_after applies
+HEDGE_MIN_SAMPLES = 5
+
+
+def parse_hedge_after(agent_name: str, value: Any) -> Tuple[str, float]:
+    """
+    Parse an agent's hedge_after setting.
+
+    Either a number of seconds ("after", 2.5) or a percentile of the agent's
+    historical durations written as "p95" ("percentile", 95.0).
+    """
+    if isinstance(value, str) and value.lower().startswith("p"):
+        try:
+            percentile = float(value[1:])
+        except ValueError:
+            percentile = -1.0
+        if not 0 < percentile < 100:
+            raise ValueError(
+                f"Agent {agent_name} has invalid hedge_after '{value}', "
+                "expected seconds or a percentile like p95"
+            )
+        return "percentile", percentile
+    seconds = float(value)
+    if seconds <= 0:
+        raise ValueError(f"Agent {agent_name} hedge_after must be positive")
+    return "after", seconds
+
 
 class Orchestrator:
-    def __init__(self, workflow_path: str):
+    def __init__(
+        self,
+        workflow_path: str,
+        max_concurrency: Optional[int] = None,
+        executor: Optional[str] = None,
+        targets: Optional[Iterable[str]] = None,
+        trace: Optional[str] = None,
+    ):
         self.workflow_path = workflow_path
         self.workflow = load_workflow(workflow_path)
-        self.trace = TraceStore()
+        # only these agents and their ancestors are run, when given
+        self.targets = list(targets or [])
+        # CLI/API values win over the workflow-level settings
+        self.max_concurrency = int(
+            max_concurrency
+            or self.workflow.get("max_concurrency")
+            or DEFAULT_MAX_CONCURRENCY
+        )
+        self.executor_mode = executor or self.workflow.get("executor") or "thread"
+        if self.executor_mode not in EXECUTOR_MODES:
+            raise ValueError(
+                f"Unknown executor '{self.executor_mode}', "
+                f"expected one of {', '.join(EXECUTOR_MODES)}"
+            )
+        self.process_workers = int(
+            self.workflow.get("process_workers")
+            or min(os.cpu_count() or 1, self.max_concurrency)
+        )
+        # outputs no agent still has to read: kept (None), dropped or spilled
+        self.release_outputs: Optional[str] = (
+            self.workflow.get("release_outputs") or None
+        )
+        if self.release_outputs not in (None, *RELEASE_MODES):
+            raise ValueError(
+                f"Unknown release_outputs '{self.release_outputs}', "
+                f"expected one of {', '.join(RELEASE_MODES)}"
+            )
+        self.process_pool: Optional[ProcessAgentPool] = None
+        # agents exporting run_batch; shared by every run, like the pool
+        self.batchers: Dict[str, MicroBatcher] = {}
+        # opened on first use by an agent with 'cache' enabled
+        self.cache: Optional[ResultCache] = None
+        self.cache_settings: Dict[str, Dict[str, Any]] = {}
+        self.hedge_settings: Dict[str, Tuple[str, float]] = {}
+        # streaming consumer -> generator agents it reads while they run
+        self.stream_inputs: Dict[str, Set[str]] = {}
+        # map_over agent -> (source agent, field path in its output)
+        self.map_settings: Dict[str, Tuple[str, List[str]]] = {}
+        # agents declaring inputs: the context paths they are given
+        self.input_paths: Dict[str, List[List[str]]] = {}
+        # agents that only run when their when: expression holds
+        self.conditions: Dict[str, Condition] = {}
+        # per-model caps and trace settings from the project config,
+        # overridden by the workflow
+        project_config = load_project_config()
+        self.limiter = ModelLimiter.from_config(
+            project_config.get("models"), self.workflow.get("models")
+        )
+        self.trace = create_trace_backend(
+            project_config.get("trace"), self.workflow.get("trace"), backend=trace
+        )
+        # recent successful durations per agent, newest first: read from the
+        # trace on the first run, then updated from each run's results
+        self._durations: Optional[Dict[str, Deque[float]]] = None
+        self._durations_lock = threading.Lock()
         # Initialize run_id as None, will be set in run()
         self.run_id: Optional[str] = None
         self.agents: Dict[str, Agent] = {}
         self.agent_loader = AgentLoader(agent_dir=self.workflow.get("workflow_dir"))
         self.execution_order: Optional[List[str]] = None
+        self.state: Optional[RunState] = None
+        # event loop and sync pool shared by the runs of a run_many batch
+        self._batch_pools: Optional[Tuple[Executor, Executor]] = None
 
         # Backward compatibility: check if old schema
         self.use_new_schema = self.workflow.get("schema_version") == "2.0"
+        if self.targets and not self.use_new_schema:
+            raise ValueError("Targets need a schema 2.0 workflow")
 
     def _resolve_agent_function(
         self, agent_config: Dict[str, Any]
@@ -79,24 +230,128 @@ class Orchestrator:
             if not self.dependency_graph.validate_cycles():
                 raise ValueError("Circular dependency detected in agent graph")
 
+            if self.targets:
+                # demand-driven: drop everything the targets don't depend on
+                needed = self._target_ancestry()
+                agents_config = [a for a in agents_config if a["name"] in needed]
+                self.dependency_graph = DependencyGraph(agents_config)
+
             # Get execution order
             execution_order = self.dependency_graph.get_execution_order()
 
+            # Resolve functions first so process agents can share one pool
+            resolved = {}
+            process_files = {}
+            for agent_config in agents_config:
+                name = agent_config["name"]
+                resolved[name] = self._resolve_agent_function(agent_config)
+                agent_executor = agent_config.get("executor", self.executor_mode)
+                if agent_executor not in EXECUTOR_MODES:
+                    raise ValueError(
+                        f"Agent {name} has unknown executor '{agent_executor}'"
+                    )
+                if agent_executor == "process":
+                    process_files[name] = resolved[name][1]["file_path"]
+
+            if process_files and self.process_pool is None:
+                # prefork once; workers import the agent modules at start-up
+                self.process_pool = ProcessAgentPool(
+                    process_files.values(), workers=self.process_workers
+                )
+
             # Instantiate agents
+            agents_config_by_name = {a["name"]: a for a in agents_config}
             for agent_config in agents_config:
                 name = agent_config["name"]
-                func, metadata = self._resolve_agent_function(agent_config)
+                func, metadata = resolved[name]
+                if name in process_files and self.process_pool is not None:
+                    func = RemoteAgentFunction(self.process_pool, process_files[name])
+                batch = agent_config.get("batch", True)
+                if metadata.get("has_batch") and batch is not False:
+                    if name in process_files:
+                        raise ValueError(
+                            f"Agent {name} exports run_batch and cannot run in a "
+                            "worker process, set 'executor: thread' or 'async' "
+                            "on it, or 'batch: false'"
+                        )
+                    if metadata["is_stream"]:
+                        raise ValueError(f"Agent {name} cannot both stream and batch")
+                    func = self._batcher(name, agent_config["run"], batch)
                 model = agent_config.get("model", "mock")
-                retries = int(agent_config.get("retries", 1))
-                timeout = float(agent_config.get("timeout", 30.0))
+                retry_policy = RetryPolicy.from_config(agent_config)
+                # a timeout of 0 or null disables the limit
+                timeout = float(agent_config.get("timeout", 30.0) or 0)
 
                 self.agents[name] = Agent(
                     name=name,
                     func=func,
                     model=model,
-                    retries=retries,
                     timeout_s=timeout,
                     metadata=metadata,
+                    retry_policy=retry_policy,
+                )
+
+                cache = agent_config.get("cache")
+                if cache:
+                    # cache: true, or cache: {ttl: seconds}
+                    ttl = cache.get("ttl") if isinstance(cache, dict) else None
+                    self.cache_settings[name] = {
+                        "ttl": float(ttl) if ttl is not None else None,
+                        "source_hash": metadata["source_hash"],
+                    }
+
+                hedge_after = agent_config.get("hedge_after")
+                if hedge_after:
+                    self.hedge_settings[name] = parse_hedge_after(name, hedge_after)
+
+                inputs = agent_config.get("inputs")
+                if inputs is not None:
+                    self.input_paths[name] = self._input_paths(name, inputs)
+
+                when = agent_config.get("when")
+                if when is not None:
+                    self.conditions[name] = self._condition(name, when)
+
+                map_over = agent_config.get("map_over")
+                if map_over:
+                    source, _, path = str(map_over).partition(".")
+                    if source not in self.dependency_graph.get_dependencies(name):
+                        raise ValueError(
+                            f"Agent {name} maps over {source}, "
+                            "which must be in its depends_on"
+                        )
+                    self.map_settings[name] = (source, path.split(".") if path else [])
+
+                if agent_config.get("stream"):
+                    if map_over:
+                        raise ValueError(
+                            f"Agent {name} cannot both stream and map_over"
+                        )
+                    if name in process_files:
+                        raise ValueError(
+                            f"Agent {name} cannot stream in a worker process, "
+                            "set 'executor: thread' or 'async' on it"
+                        )
+                    if cache:
+                        raise ValueError(f"Agent {name} cannot both stream and cache")
+                    self.stream_inputs[name] = {
+                        dep
+                        for dep in self.dependency_graph.get_dependencies(name)
+                        # a mapped generator only finishes once all items have
+                        if resolved[dep][1].get("is_stream")
+                        and not agents_config_by_name[dep].get("map_over")
+                    }
+
+            producers = set().union(*self.stream_inputs.values())
+            for name in producers & set(self.hedge_settings):
+                raise ValueError(f"Agent {name} is streamed and cannot be hedged")
+
+            if self.cache_settings and self.cache is None:
+                max_mb = self.workflow.get("cache_max_mb")
+                self.cache = ResultCache(
+                    max_bytes=int(float(max_mb) * 1024 * 1024)
+                    if max_mb
+                    else DEFAULT_CACHE_MAX_BYTES
                 )
 
             self.execution_order = execution_order
@@ -121,110 +376,890 @@ class Orchestrator:
             self.execution_order = None
             self.start_node = self.workflow.get("start")
 
+    def _input_paths(self, agent_name: str, inputs: Any) -> List[List[str]]:
+        """
+        Parse an agent's inputs list into context paths.
+
+        Entries are context keys such as input, or outputs of agents it
+        depends on, optionally narrowed to a field: Research.papers becomes
+        ["outputs", "Research", "papers"].
+        """
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        ancestors = self.dependency_graph.get_ancestors(agent_name)
+        paths: List[List[str]] = []
+        for entry in inputs:
+            head, *fields = str(entry).split(".")
+            if head in INPUT_KEYS:
+                path = [head, *fields]
+            elif head in ancestors:
+                path = ["outputs", head, *fields]
+            else:
+                raise ValueError(
+                    f"Agent {agent_name} input '{entry}' is neither "
+                    f"{' nor '.join(INPUT_KEYS)} nor the output of an agent "
+                    "it depends on"
+                )
+            if path not in paths:
+                paths.append(path)
+        # a field of an output that is passed whole adds nothing
+        return [
+            path
+            for path in paths
+            if not any(
+                len(other) < len(path) and path[: len(other)] == other
+                for other in paths
+            )
+        ]
+
+    def _condition(self, agent_name: str, when: Any) -> Condition:
+        """
+        Parse an agent's when: expression.
+
+        It may only name context keys such as input, or agents it depends
+        on: other agents may not have run yet, or already be released.
+        """
+        try:
+            condition = Condition(str(when))
+        except ConditionError as e:
+            raise ValueError(f"Agent {agent_name} has an invalid when: {e}")
+        ancestors = self.dependency_graph.get_ancestors(agent_name)
+        unknown = sorted(condition.names - ancestors - {*INPUT_KEYS, "outputs"})
+        if unknown:
+            raise ValueError(
+                f"Agent {agent_name} when: reads {', '.join(unknown)}, which is "
+                f"neither {' nor '.join(INPUT_KEYS)} nor the output of an agent "
+                "it depends on"
+            )
+        return condition
+
+    def _target_ancestry(self) -> Set[str]:
+        """The targets plus every agent they depend on, directly or not."""
+        names = {agent["name"] for agent in self.dependency_graph.agents}
+        needed: Set[str] = set()
+        for target in self.targets:
+            if target not in names:
+                raise ValueError(f"Target agent {target} not found in workflow")
+            needed.add(target)
+            needed |= self.dependency_graph.get_ancestors(target)
+        return needed
+
+    def _batcher(self, name: str, agent_file: str, batch: Any) -> MicroBatcher:
+        """
+        Micro-batcher feeding the agent's run_batch, created on first use.
+
+        batch is true or {max_size: 16, max_wait: seconds} from the YAML.
+        """
+        batcher = self.batchers.get(name)
+        if batcher is None:
+            settings = batch if isinstance(batch, dict) else {}
+            batcher = self.batchers[name] = MicroBatcher(
+                name,
+                self.agent_loader.load_agent(agent_file)["batch_func"],
+                max_size=int(settings.get("max_size", DEFAULT_MAX_BATCH_SIZE)),
+                max_wait=float(settings.get("max_wait", DEFAULT_MAX_WAIT)),
+            )
+        return batcher
+
     def run(self, initial_input: str) -> Dict[str, Any]:
         """Run workflow with initial input."""
         # Start run
         if self.run_id is None:
             self.run_id = str(uuid.uuid4())
-        workflow_name = self.workflow.get("workflow_name", "unnamed")
-        # We can safely use self.run_id here as we just ensured it's not None
-        self.trace.start_run(self.run_id, workflow=workflow_name)
-        self.trace.current_run_id = self.run_id
+        state = RunState(self.run_id, RunContext({"input": initial_input}))
+        return self._execute(state)
+
+    def resume(self, run_id: str) -> Dict[str, Any]:
+        """
+        Resume a failed run as a new run linked to it.
+
+        Outputs of agents that succeeded in run_id, or that run_id itself
+        reused from the run it resumed, are loaded back from the trace; only
+        the remaining agents (the failed one, its dependents and anything
+        that never started) are executed.
+        """
+        if not self.use_new_schema:
+            raise ValueError("Only schema 2.0 workflows can be resumed")
+
+        # every version holds the run input; the first is cheapest to rebuild
+        first = self.trace.fetch_context(run_id, 1)
+        if first is None:
+            raise ValueError(f"Run {run_id} not found in trace store")
+        initial_input = first["ctx"].get("input")
+        agent_names = {agent["name"] for agent in self.workflow.get("agents", [])}
+
+        # agents reused from an earlier run never ran in this one, but their
+        # outputs were in its context before anything else finished
+        outputs: Dict[str, Any] = {
+            name: output
+            for name, output in (first["ctx"].get("outputs") or {}).items()
+            if name in agent_names
+        }
+        # then the latest successful output per agent, in the order they finished
+        for name, output in self.trace.fetch_outputs(run_id).items():
+            if name in agent_names:
+                outputs[name] = output
+
+        self.run_id = str(uuid.uuid4())
+        state = RunState(
+            self.run_id, RunContext({"input": initial_input}), parent_run_id=run_id
+        )
+        for name, output in outputs.items():
+            state.context.set_output(name, output)
+        state.reused = set(outputs)
+        return self._execute(state)
+
+    def run_many(
+        self, inputs: Iterable[str], max_runs: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Run the workflow once per input, several runs at a time.
+
+        The workflow is loaded and validated once, and every run is traced
+        under its own run_id. Results are yielded as runs complete rather
+        than in input order, each as {"index", "run_id", "final_context",
+        "results", "peak_rss", "error"} where error is the exception a
+        failed run raised.
+
+        At most max_runs runs (default max_concurrency) are in flight, each
+        with at most max_concurrency agents; model limits apply across all
+        of them. In async mode the runs share one event loop.
+        """
+        max_runs = int(max_runs or self.max_concurrency)
+        if max_runs < 1:
+            raise ValueError("max_runs must be at least 1")
         self._instantiate_agents()
-        self.execution_results = []
+        if self.use_new_schema and self.executor_mode == "async":
+            self._batch_pools = self._async_pools()
 
-        context = {"input": initial_input}
-        version = 0
+        runner = ThreadPoolExecutor(
+            max_workers=max_runs, thread_name_prefix="synapse-run"
+        )
+        pending: Dict["Future[Dict[str, Any]]", Tuple[int, RunState]] = {}
+        # inputs are consumed lazily, so they can be a generator
+        queued = enumerate(inputs)
+        try:
+            while True:
+                for index, initial_input in itertools.islice(
+                    queued, max_runs - len(pending)
+                ):
+                    state = RunState(
+                        str(uuid.uuid4()), RunContext({"input": initial_input})
+                    )
+                    future = runner.submit(self._execute, state, batch=True)
+                    pending[future] = (index, state)
+                if not pending:
+                    return
 
-        if self.use_new_schema:
-            # New schema: execute based on dependency order
-            if self.execution_order is None:
-                raise ValueError("Execution order not initialized for new schema")
-            for agent_name in self.execution_order:
-                agent = self.agents.get(agent_name)
-                if not agent:
-                    raise ValueError(f"Agent {agent_name} not found")
-
-                version += 1
-                self.trace.record_context_version(
-                    self.run_id, version, agent_name, context
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, state = pending.pop(future)
+                    yield {
+                        "index": index,
+                        "run_id": state.run_id,
+                        "final_context": state.context.to_dict(),
+                        "results": state.execution_results(),
+                        "peak_rss": state.peak_rss,
+                        "error": future.exception(),
+                    }
+        finally:
+            # no more than max_runs are ever submitted, so each one has
+            # already started; let them finish before tearing down the pools
+            runner.shutdown(wait=True)
+            if self._batch_pools is not None:
+                self._shutdown_pools(*self._batch_pools)
+                self._batch_pools = None
+
+    def _execute(self, state: RunState, batch: bool = False) -> Dict[str, Any]:
+        workflow_name = self.workflow.get("workflow_name", "unnamed")
+        self.trace.start_run(
+            state.run_id, workflow=workflow_name, parent_run_id=state.parent_run_id
+        )
+        if not batch:
+            # a batch instantiates its agents once and shares them
+            self.trace.current_run_id = state.run_id
+            self._instantiate_agents()
+            self.state = state
+        # agents record under the run_id of the view they are handed
+        tracer = RunTrace(self.trace, state.run_id)
+
+        monitor = PeakRSSMonitor()
+        try:
+            with monitor:
+                if self.use_new_schema:
+                    # New schema: execute based on dependency order
+                    if self.execution_order is None:
+                        raise ValueError(
+                            "Execution order not initialized for new schema"
+                        )
+                    self._run_graph(state, tracer)
+                else:
+                    # Old schema: sequential execution
+                    self._run_sequential(state, tracer)
+            self.trace.record_context_version(
+                state.run_id, state.next_version(), "end", state.context.to_dict()
+            )
+        finally:
+            state.peak_rss = monitor.peak
+            # also waits until the run's trace records are committed
+            self.trace.finish_run(state.run_id, monitor.peak)
+
+        return {
+            "run_id": state.run_id,
+            "final_context": state.context.to_dict(),
+            "peak_rss": state.peak_rss,
+        }
+
+    def _async_pools(self) -> Tuple[Executor, Executor]:
+        """
+        One event loop for every agent; sync agents get a bounded pool.
+
+        A sync call that timed out keeps its worker until it returns, so the
+        pool has SPARE_WORKERS more threads than agents can run at once.
+        """
+        sync_pool = ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, MAX_SYNC_WORKERS) + SPARE_WORKERS,
+            thread_name_prefix="synapse-sync-agent",
+        )
+        return AsyncioExecutor(), sync_pool
+
+    @staticmethod
+    def _shutdown_pools(pool: Executor, sync_pool: Executor) -> None:
+        pool.shutdown()
+        # don't wait on sync agents abandoned after a timeout
+        sync_pool.shutdown(wait=False)
+
+    def _run_graph(self, state: RunState, tracer: RunTrace) -> None:
+        """Execute a schema 2.0 workflow on the ready-queue scheduler."""
+        context = state.context
+        pool: Optional[Executor] = None
+        sync_pool: Optional[Executor] = None
+        own_pools = self._batch_pools is None
+        if self.executor_mode == "async":
+            pool, sync_pool = self._batch_pools or self._async_pools()
+        durations = self._duration_priors()
+        # in thread mode the scheduler times out sync agents on their future
+        timeouts = {}
+        if self.executor_mode != "async":
+            timeouts = {
+                name: agent.timeout_s
+                for name, agent in self.agents.items()
+                if agent.runs_in_thread and agent.timeout_s
+            }
+        scheduler = DagScheduler(
+            self.dependency_graph,
+            self.max_concurrency,
+            executor=pool,
+            estimates=self._duration_estimates(durations),
+            hedge_after=self._hedge_delays(durations),
+            models={name: agent.model for name, agent in self.agents.items()},
+            limiter=self.limiter or None,
+            stream_inputs=self.stream_inputs,
+            timeouts=timeouts,
+        )
+        snapshots: Dict[str, Dict[str, Any]] = {}
+        # (task key, hedge) -> give_up of the running attempt and its stream
+        give_ups: Dict[
+            Tuple[str, bool],
+            Tuple[Callable[[], Optional[BaseException]], Optional[ItemStream]],
+        ] = {}
+        cache_keys: Dict[str, str] = {}
+        # latest stream of each generator agent that has streaming consumers
+        producers = set().union(*self.stream_inputs.values())
+        streams: Dict[str, ItemStream] = {}
+        # item task key -> (map_over agent, index); items and gathered outputs
+        item_tasks: Dict[str, Tuple[str, int]] = {}
+        map_items: Dict[str, List[Any]] = {}
+        map_outputs: Dict[str, List[Any]] = {}
+        # readers of each agent's output still to finish; reused ones never will
+        consumers_left = {
+            name: len(readers - state.reused)
+            for name, readers in self._output_readers().items()
+        }
+
+        def release(agent_name: str) -> None:
+            """Let go of an output once its last consumer has finished."""
+            if (
+                self.release_outputs is None
+                or agent_name in self.targets
+                or agent_name not in context.outputs
+            ):
+                return
+            replacement = None
+            if self.release_outputs == "spill":
+                replacement = spill_output(
+                    state.run_id, agent_name, context.outputs[agent_name]
                 )
+                if replacement is None:
+                    # cannot be pickled, so it stays in memory
+                    return
+            context.release(agent_name, replacement)
+            streams.pop(agent_name, None)
+            if agent_name in state.results:
+                state.results[agent_name].output = None
+
+        def consumed(agent_name: str) -> None:
+            """Called once agent_name has finished or was skipped."""
+            # retries are over, so its snapshot is no longer needed either
+            snapshots.pop(agent_name, None)
+            for source in self._read_outputs(agent_name):
+                consumers_left[source] -= 1
+                if consumers_left[source] == 0:
+                    release(source)
+
+        def take_snapshot(agent_name: str) -> None:
+            self.trace.record_context_version(
+                state.run_id, state.next_version(), agent_name, context.to_dict()
+            )
+            # Snapshots share the copy-on-write outputs namespace, so
+            # completions of concurrent agents never change them mid-run;
+            # retries and item tasks reuse the same one
+            dependencies = self.dependency_graph.get_dependencies(agent_name)
+            snapshot = context.snapshot(dependencies[-1] if dependencies else None)
+            if agent_name in self.input_paths:
+                # only what the agent declared is passed on and traced
+                snapshot = project(snapshot, self.input_paths[agent_name])
+            snapshots[agent_name] = snapshot
 
-                # Track execution
-                agent_start = time.time()
-                attempts = 0
+        def expand(agent_name: str) -> Optional[int]:
+            if agent_name not in self.map_settings:
+                return None
+            take_snapshot(agent_name)
+            items = self._map_items(agent_name, context.outputs)
+            map_items[agent_name] = items
+            map_outputs[agent_name] = [None] * len(items)
+            for index in range(len(items)):
+                item_tasks[item_key(agent_name, index)] = (agent_name, index)
+            agent = self.agents[agent_name]
+            state.results[agent_name] = AgentResult(
+                agent_name, model=agent.model, started_at=time.time()
+            )
+            return len(items)
 
+        def gather(agent_name: str) -> None:
+            agent = self.agents[agent_name]
+            result = state.results[agent_name]
+            out = {"items": map_outputs[agent_name]}
+            self.trace.record_node(
+                run_id=state.run_id,
+                agent_id=agent.id,
+                name=agent_name,
+                input_ctx=snapshots[agent_name],
+                output=out,
+                duration=time.time() - (result.started_at or time.time()),
+                attempt=1,
+                model=agent.model,
+                metadata={**agent.metadata, "map_items": len(map_items[agent_name])},
+            )
+            state.finish(result.succeed(out))
+            context.set_output(agent_name, out)
+            consumed(agent_name)
+
+        def skip(agent_name: str, skipped_dependencies: Set[str]) -> bool:
+            dependencies = self.dependency_graph.get_dependencies(agent_name)
+            if dependencies and len(skipped_dependencies) == len(dependencies):
+                # only reachable through skipped branches
+                reason = "dependencies skipped"
+            elif agent_name in self.conditions:
+                condition = self.conditions[agent_name]
+                # only ancestors have surely finished, so only they are visible
+                ancestors = self.dependency_graph.get_ancestors(agent_name)
+                view = context.snapshot(dependencies[-1] if dependencies else None)
+                view["outputs"] = {
+                    name: output
+                    for name, output in context.outputs.items()
+                    if name in ancestors
+                }
                 try:
-                    out = agent.run(context, tracer=self.trace)
-                    agent_duration = time.time() - agent_start
-                    attempts = 1
-
-                    # get attempts from trace
-                    nodes = self.trace.fetch_nodes(self.run_id)
-                    agent_nodes = [n for n in nodes if n["name"] == agent_name]
-
-                    if agent_nodes:
-                        attempts = max([n["attempt"] for n in agent_nodes])
-
-                    self.execution_results.append(
-                        {
-                            "agent_name": agent_name,
-                            "status": "retry_success" if attempts > 1 else "success",
-                            "duration": agent_duration,
-                            "attempts": attempts,
-                            "model": agent.model,
-                            "error_type": None,
-                        }
-                    )
+                    if condition.evaluate(view):
+                        return False
+                except ConditionError as e:
+                    raise ValueError(f"Agent {agent_name}: {e}") from e
+                reason = f"when: {condition.source}"
+            else:
+                return False
+
+            agent = self.agents[agent_name]
+            tracer.record_skip(state.run_id, agent.id, agent_name, agent.model, reason)
+            result = AgentResult(agent_name, model=agent.model, started_at=time.time())
+            state.results[agent_name] = result
+            state.finish(result.skip())
+            consumed(agent_name)
+            return True
 
-                    context["last_output"] = out
-
-                except Exception as e:
-                    agent_duration = time.time() - agent_start
-                    attempts = 1
-
-                    # get attempts from trace
-                    nodes = self.trace.fetch_nodes(self.run_id)
-                    agent_nodes = [n for n in nodes if n["name"] == agent_name]
-                    if agent_nodes:
-                        attempts = max([n["attempt"] for n in agent_nodes])
-
-                    self.execution_results.append(
-                        {
-                            "agent_name": agent_name,
-                            "status": "failed",
-                            "duration": agent_duration,
-                            "attempts": attempts,
-                            "model": agent.model,
-                            "error_type": type(e).__name__,
-                        }
+        def prepare(task_key: str, attempt: int, hedge: bool) -> Callable[[], Any]:
+            agent_name, item_index = item_tasks.get(task_key, (task_key, None))
+            agent = self.agents.get(agent_name)
+            if not agent:
+                raise ValueError(f"Agent {agent_name} not found")
+
+            if attempt == 1:
+                if item_index is None:
+                    take_snapshot(agent_name)
+                else:
+                    snapshots[task_key] = {
+                        **snapshots[agent_name],
+                        "item": map_items[agent_name][item_index],
+                        "item_index": item_index,
+                    }
+                if agent_name in self.cache_settings:
+                    cache_keys[task_key] = self._cache_key(agent, snapshots[task_key])
+            snapshot = snapshots[task_key]
+            sink = None
+            if agent_name in producers:
+                if attempt == 1:
+                    streams[agent_name] = ItemStream(agent_name)
+                sink = streams[agent_name]
+            if agent_name in self.stream_inputs:
+                snapshot = self._stream_snapshot(
+                    agent_name, snapshot, streams, context.outputs
+                )
+            if hedge:
+                result = state.results[task_key]
+                result.hedged = True
+            else:
+                result = state.begin_attempt(task_key, agent.model)
+            key = cache_keys.get(task_key)
+            # a hedge duplicates an attempt that already missed the cache
+            lookup = key is not None and attempt == 1 and not hedge
+            queue_wait = None if hedge else scheduler.queue_waits.get(task_key)
+
+            if self.executor_mode == "async":
+
+                async def async_task() -> Any:
+                    if result.started_at is None:
+                        result.started_at = time.time()
+                    if lookup and key is not None:
+                        cached = self._from_cache(state, agent, snapshot, key)
+                        if cached is not None:
+                            result.cached = True
+                            return cached
+
+                    attempt_start = time.time()
+                    out = await agent.arun_attempt(
+                        snapshot,
+                        tracer,
+                        attempt,
+                        executor=sync_pool,
+                        hedge=hedge,
+                        queue_wait=queue_wait,
+                        sink=sink,
+                        item_index=item_index,
                     )
-                    raise
+                    if key is not None and self.cache is not None:
+                        self.cache.put(key, out, time.time() - attempt_start)
+                    return out
+
+                if sink is not None:
+                    return self._astreaming(async_task, sink)
+                return async_task
+
+            claim = None
+            if agent_name in timeouts:
+                claim = AttemptClaim()
+                give_up = functools.partial(
+                    agent.give_up,
+                    claim,
+                    snapshot,
+                    tracer,
+                    attempt,
+                    hedge=hedge,
+                    queue_wait=queue_wait,
+                    item_index=item_index,
+                )
+                give_ups[(task_key, hedge)] = (give_up, sink)
+
+            def task() -> Any:
+                if result.started_at is None:
+                    result.started_at = time.time()
+                if lookup and key is not None:
+                    cached = self._from_cache(state, agent, snapshot, key)
+                    if cached is not None:
+                        result.cached = True
+                        return cached
+
+                attempt_start = time.time()
+                out = agent.run_attempt(
+                    snapshot,
+                    tracer,
+                    attempt,
+                    hedge=hedge,
+                    queue_wait=queue_wait,
+                    sink=sink,
+                    item_index=item_index,
+                    claim=claim,
+                )
+                if key is not None and self.cache is not None:
+                    self.cache.put(key, out, time.time() - attempt_start)
+                return out
+
+            if sink is not None:
+                return self._streaming(task, sink)
+            return task
+
+        def expire(task_key: str, hedge: bool) -> Optional[BaseException]:
+            if (task_key, hedge) not in give_ups:
+                return None
+            give_up, sink = give_ups.pop((task_key, hedge))
+            error = give_up()
+            if error is not None and sink is not None:
+                # as _streaming does once an attempt fails
+                sink.close(error)
+            return error
+
+        def complete(
+            task_key: str, attempt: int, future: "Future[Any]"
+        ) -> Optional[float]:
+            agent_name, item_index = item_tasks.get(task_key, (task_key, None))
+            agent = self.agents[agent_name]
+            result = state.results[task_key]
+            error = future.exception()
+            give_ups.pop((task_key, False), None)
+            give_ups.pop((task_key, True), None)
 
+            if error is not None:
+                if isinstance(error, Exception) and agent.retry_policy.should_retry(
+                    error, attempt
+                ):
+                    # re-enqueued by the scheduler once the backoff elapses
+                    if agent_name in producers:
+                        # consumers retrying meanwhile read the next attempt
+                        streams[agent_name] = ItemStream(agent_name)
+                    return agent.retry_policy.delay(attempt)
+
+                state.finish(result.fail(error))
+                if isinstance(error, Exception):
+                    raise agent.exhausted(snapshots[task_key], error, result)
+                raise error
+
+            out = future.result()
+            state.finish(result.succeed(out))
+            if item_index is not None:
+                # gathered in item order once every item task is done
+                map_outputs[agent_name][item_index] = out
+                snapshots.pop(task_key, None)
+            else:
+                context.set_output(agent_name, out)
+                consumed(agent_name)
+            return None
+
+        try:
+            scheduler.run(
+                prepare,
+                complete,
+                completed=state.reused,
+                expand=expand,
+                gather=gather,
+                skip=skip,
+                expire=expire,
+            )
+        finally:
+            if self.release_outputs == "spill":
+                self._unspill(state)
+            self._record_durations(state)
+            if own_pools and pool is not None and sync_pool is not None:
+                self._shutdown_pools(pool, sync_pool)
+
+    @staticmethod
+    def _unspill(state: RunState) -> None:
+        """
+        Read spilled outputs back into the final context of a run and
+        delete its spill files.
+        """
+        for name, value in state.context.outputs.items():
+            if is_spilled(value):
+                state.context.release(name, load_output(value))
+        remove_spill(state.run_id)
+
+    def _read_outputs(self, agent_name: str) -> Set[str]:
+        """
+        Agents whose outputs agent_name reads.
+
+        An agent declaring inputs reads the outputs it lists, besides those
+        of its direct dependencies (map_over, streams and last_output come
+        from them) and those its when: condition names. Any other agent
+        reads every ancestor's output: they are all in its context, and in
+        its cache key.
+        """
+        sources = set(self.dependency_graph.graph.get(agent_name, set()))
+        if agent_name in self.conditions:
+            sources |= self.conditions[agent_name].names & set(self.agents)
+        if agent_name in self.input_paths:
+            sources.update(
+                path[1] for path in self.input_paths[agent_name] if path[0] == "outputs"
+            )
         else:
-            # Old schema: sequential execution
-            current = self.start_node
-            while current:
-                agent = self.agents.get(current)
-                if not agent:
-                    raise ValueError(f"Agent {current} not found")
-
-                version += 1
-                self.trace.record_context_version(
-                    self.run_id, version, current, context
+            sources |= self.dependency_graph.get_ancestors(agent_name)
+        return sources
+
+    def _output_readers(self) -> Dict[str, Set[str]]:
+        """Agents reading each agent's output, see _read_outputs."""
+        readers: Dict[str, Set[str]] = {name: set() for name in self.agents}
+        for name in self.agents:
+            for source in self._read_outputs(name):
+                readers[source].add(name)
+        return readers
+
+    def _map_items(self, agent_name: str, outputs: Dict[str, Any]) -> List[Any]:
+        """The list a map_over agent fans out over, e.g. Research.papers."""
+        source, path = self.map_settings[agent_name]
+        value = outputs.get(source)
+        for field in path:
+            value = value.get(field) if isinstance(value, dict) else None
+        if not isinstance(value, (list, tuple)):
+            where = ".".join([source, *path])
+            raise ValueError(
+                f"Agent {agent_name} maps over {where}, "
+                f"which is {type(value).__name__}, not a list"
+            )
+        return list(value)
+
+    def _stream_snapshot(
+        self,
+        agent_name: str,
+        snapshot: Dict[str, Any],
+        streams: Dict[str, ItemStream],
+        outputs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """
+        Add the streams a consumer reads to its snapshot.
+
+        context["streams"] maps each generator dependency to its stream and
+        context["stream"] is the one of the last declared. Producers reused
+        from a resumed run are replayed from their recorded output.
+        """
+        inputs = {}
+        for producer in self.stream_inputs[agent_name]:
+            if producer not in streams:
+                streams[producer] = self._replay(producer, outputs.get(producer))
+            inputs[producer] = streams[producer]
+        snapshot = dict(snapshot)
+        snapshot["streams"] = inputs
+        for dep in self.dependency_graph.get_dependencies(agent_name):
+            if dep in inputs:
+                snapshot["stream"] = inputs[dep]
+        return snapshot
+
+    @staticmethod
+    def _replay(
+        producer: str, output: Any, stream: Optional[ItemStream] = None
+    ) -> ItemStream:
+        """Close a stream, first publishing output's items if none streamed."""
+        stream = stream or ItemStream(producer)
+        if stream.first_item_at is None and isinstance(output, dict):
+            # cached, resumed or worker-process producers
+            for item in output.get("items") or []:
+                stream.put(item)
+        stream.close()
+        return stream
+
+    def _streaming(
+        self, task: Callable[[], Any], sink: ItemStream
+    ) -> Callable[[], Any]:
+        """Close a producer's stream when its attempt ends."""
+
+        def streaming_task() -> Any:
+            try:
+                out = task()
+            except BaseException as e:
+                sink.close(e)
+                raise
+            self._replay(sink.producer, out, sink)
+            return out
+
+        return streaming_task
+
+    def _astreaming(
+        self, task: Callable[[], Awaitable[Any]], sink: ItemStream
+    ) -> Callable[[], Awaitable[Any]]:
+        """Async counterpart of _streaming."""
+
+        async def streaming_task() -> Any:
+            try:
+                out = await task()
+            except BaseException as e:
+                sink.close(e)
+                raise
+            self._replay(sink.producer, out, sink)
+            return out
+
+        return streaming_task
+
+    def _duration_priors(self) -> Dict[str, List[float]]:
+        """
+        Durations of each agent's recent successful attempts, newest first.
+
+        Only the first run queries the trace; run_many would otherwise pay
+        for the lookup once per input.
+        """
+        with self._durations_lock:
+            if self._durations is None:
+                workflow_name = self.workflow.get("workflow_name", "unnamed")
+                self._durations = {
+                    name: deque(samples, maxlen=DURATION_WINDOW)
+                    for name, samples in self.trace.fetch_durations(
+                        workflow_name, window=DURATION_WINDOW
+                    ).items()
+                }
+            return {name: list(samples) for name, samples in self._durations.items()}
+
+    def _record_durations(self, state: RunState) -> None:
+        """Add the agents that succeeded at the first try to the priors."""
+        with self._durations_lock:
+            if self._durations is None:
+                return
+            for name, result in state.results.items():
+                # retried, hedged and cached durations are not the agent's own
+                if (
+                    name in self.agents
+                    and result.status == "success"
+                    and not result.hedged
+                ):
+                    samples = self._durations.setdefault(
+                        name, deque(maxlen=DURATION_WINDOW)
+                    )
+                    samples.appendleft(result.duration)
+
+    def _duration_estimates(
+        self, durations: Dict[str, List[float]]
+    ) -> Dict[str, float]:
+        """Median duration of each agent's recent successful attempts."""
+        return {
+            name: statistics.median(samples)
+            for name, samples in durations.items()
+            if name in self.agents
+        }
+
+    def _hedge_delays(self, durations: Dict[str, List[float]]) -> Dict[str, float]:
+        """
+        Seconds after which each hedged agent gets a duplicate attempt.
+
+        Percentile settings only apply once the agent has HEDGE_MIN_SAMPLES
+        successful attempts in the trace.
+        """
+        delays = {}
+        for name, (kind, value) in self.hedge_settings.items():
+            if kind == "after":
+                delays[name] = value
+                continue
+            samples = durations.get(name, [])
+            if len(samples) >= HEDGE_MIN_SAMPLES:
+                # linear interpolation between the closest ranks
+                ordered = sorted(samples)
+                rank = (len(ordered) - 1) * value / 100
+                low = int(rank)
+                high = min(low + 1, len(ordered) - 1)
+                delays[name] = ordered[low] + (ordered[high] - ordered[low]) * (
+                    rank - low
                 )
+        return delays
+
+    def _cache_key(self, agent: Agent, snapshot: Dict[str, Any]) -> str:
+        """
+        Key a cached agent on its source, model and inputs.
+
+        Only ancestor outputs count as inputs: they are the ones guaranteed
+        to be in the snapshot regardless of scheduling.
+        """
+        ancestors = sorted(self.dependency_graph.get_ancestors(agent.name))
+        outputs = snapshot.get("outputs", {})
+        inputs = {
+            "input": snapshot.get("input"),
+            "outputs": {name: outputs.get(name) for name in ancestors},
+        }
+        if "item_index" in snapshot:
+            # item tasks of a map_over agent
+            inputs["item"] = snapshot["item"]
+        source_hash = self.cache_settings[agent.name]["source_hash"]
+        return cache_key(source_hash, agent.model, inputs)
+
+    def _from_cache(
+        self, state: RunState, agent: Agent, snapshot: Dict[str, Any], key: str
+    ) -> Any:
+        """Return a cached output, recording the hit in the trace, or None."""
+        if self.cache is None:
+            return None
+        start = time.time()
+        hit = self.cache.get(key, ttl=self.cache_settings[agent.name]["ttl"])
+        if hit is None:
+            return None
+
+        output, saved_duration = hit
+        metadata = {
+            **agent.metadata,
+            "cache": {"key": key, "saved_duration": saved_duration},
+        }
+        if "item_index" in snapshot:
+            metadata["map_index"] = snapshot["item_index"]
+        self.trace.record_node(
+            run_id=state.run_id,
+            agent_id=agent.id,
+            name=agent.name,
+            input_ctx=snapshot,
+            output=output,
+            duration=time.time() - start,
+            attempt=1,
+            model=agent.model,
+            metadata=metadata,
+            status="cached",
+        )
+        return output
+
+    def _run_sequential(self, state: RunState, tracer: RunTrace) -> None:
+        """Execute a legacy workflow by following 'next' links."""
+        context = state.context
+        current = self.start_node
+        previous: Optional[str] = None
+        while current:
+            agent = self.agents.get(current)
+            if not agent:
+                raise ValueError(f"Agent {current} not found")
+
+            self.trace.record_context_version(
+                state.run_id, state.next_version(), current, context.to_dict()
+            )
+
+            try:
+                result = agent.run(context.snapshot(previous), tracer=tracer)
+            except AgentExecutionError as e:
+                if e.result is not None:
+                    state.results[current] = state.finish(e.result)
+                raise
+            state.results[current] = state.finish(result)
+            context.set_output(current, result.output)
+            previous = current
+
+            nxt = self.workflow.get("nodes", {}).get(current, {}).get("next")
+            if not nxt:
+                break
+            current = nxt
+
+    def close(self) -> None:
+        """
+        Shut down worker processes and batchers started for agents, store
+        any trace records still queued and close the trace and the cache.
+        """
+        self.trace.close()
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+        for batcher in self.batchers.values():
+            batcher.close()
+        self.batchers = {}
 
-                out = agent.run(context, tracer=self.trace)
-                context["last_output"] = out
+    def __enter__(self) -> "Orchestrator":
+        return self
 
-                nxt = self.workflow.get("nodes", {}).get(current, {}).get("next")
-                if not nxt:
-                    break
-                current = nxt
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
-        version += 1
-        self.trace.record_context_version(self.run_id, version, "end", context)
-        return {"run_id": self.run_id, "final_context": context}
+    @property
+    def execution_results(self) -> List[Dict[str, Any]]:
+        """Per-agent results of the latest run, in completion order."""
+        return self.state.execution_results() if self.state else []
 
     def get_execution_results(self) -> List[Dict[str, Any]]:
         """Get execution results for CLI display."""
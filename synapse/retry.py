@@ -0,0 +1,80 @@
+# synapse/retry.py
+import random
+from typing import Any, Dict, Iterable, Optional
+
+JITTER_MODES = ("none", "full", "equal")
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff for failed agent attempts.
+
+    The delay before retry n is min(cap, base * 2 ** (n - 1)), spread by the
+    jitter mode so agents failing together do not retry in lockstep:
+        - none: the exact delay
+        - full: uniform between 0 and the delay
+        - equal: half the delay plus uniform up to the other half
+    """
+
+    def __init__(
+        self,
+        retries: int = 1,
+        base: float = 1.0,
+        cap: float = 3.0,
+        jitter: str = "full",
+        retry_on: Optional[Iterable[str]] = None,
+    ):
+        if jitter not in JITTER_MODES:
+            raise ValueError(
+                f"Unknown jitter '{jitter}', expected one of {', '.join(JITTER_MODES)}"
+            )
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+        # exception type names; None retries every exception
+        self.retry_on = set(retry_on) if retry_on is not None else None
+
+    @classmethod
+    def from_config(cls, agent_config: Dict[str, Any]) -> "RetryPolicy":
+        """
+        Build a policy from agent YAML:
+
+            retries: 3
+            backoff: {base: 0.5, cap: 10, jitter: equal}
+            retry_on: [TimeoutError, ConnectionError]
+        """
+        backoff = agent_config.get("backoff") or {}
+        retry_on = agent_config.get("retry_on")
+        if isinstance(retry_on, str):
+            retry_on = [retry_on]
+        return cls(
+            retries=int(agent_config.get("retries", 1)),
+            base=float(backoff.get("base", 1.0)),
+            cap=float(backoff.get("cap", 3.0)),
+            jitter=backoff.get("jitter", "full"),
+            retry_on=retry_on,
+        )
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """Whether a failed attempt (1-based) should be retried."""
+        if attempt > self.retries:
+            return False
+        if self.retry_on is None:
+            return True
+
+        names = {cls.__name__ for cls in type(error).__mro__}
+        # errors from worker processes carry their original type name
+        remote_type = getattr(error, "remote_type", None)
+        if remote_type:
+            names.add(remote_type)
+        return bool(names & self.retry_on)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait after failed attempt (1-based) before retrying."""
+        delay = min(self.cap, self.base * 2.0 ** (attempt - 1))
+        if self.jitter == "full":
+            return random.uniform(0, delay)
+        if self.jitter == "equal":
+            return delay / 2 + random.uniform(0, delay / 2)
+        return delay
@@ -0,0 +1,110 @@
+# synapse/run_state.py
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from .context import RunContext
+
+
+@dataclass
+class AgentResult:
+    """
+    Compact outcome of one agent in a run.
+
+    Kept in memory so the orchestrator never has to read attempts or
+    timings back from the trace store.
+    """
+
+    agent_name: str
+    model: str = "mock"
+    status: str = "pending"
+    output: Any = None
+    attempts: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error_type: Optional[str] = None
+    cached: bool = False
+    # a duplicate attempt was started while one was running slow
+    hedged: bool = False
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first attempt starting to the agent finishing."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def succeed(self, output: Any) -> "AgentResult":
+        self.output = output
+        if self.cached:
+            self.status = "cached"
+        else:
+            self.status = "retry_success" if self.attempts > 1 else "success"
+        self.finished_at = time.time()
+        return self
+
+    def skip(self) -> "AgentResult":
+        self.status = "skipped"
+        self.finished_at = time.time()
+        return self
+
+    def fail(self, error: BaseException) -> "AgentResult":
+        self.status = "failed"
+        self.error_type = type(error).__name__
+        self.finished_at = time.time()
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Execution result entry as shown by the CLI, without the output."""
+        return {
+            "agent_name": self.agent_name,
+            "status": self.status,
+            "duration": self.duration,
+            "attempts": self.attempts,
+            "model": self.model,
+            "error_type": self.error_type,
+            "hedged": self.hedged,
+        }
+
+
+class RunState:
+    """
+    In-memory state of a single workflow run.
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        context: RunContext,
+        parent_run_id: Optional[str] = None,
+    ):
+        self.run_id = run_id
+        self.context = context
+        self.version = 0
+        self.results: Dict[str, AgentResult] = {}
+        # run this one resumes, and agents whose outputs it reuses
+        self.parent_run_id = parent_run_id
+        self.reused: Set[str] = set()
+        # bytes, highest resident set size of the process during the run
+        self.peak_rss: Optional[int] = None
+        # agent names in the order they finished
+        self._finished: List[str] = []
+
+    def next_version(self) -> int:
+        self.version += 1
+        return self.version
+
+    def begin_attempt(self, agent_name: str, model: str) -> AgentResult:
+        """Count a new attempt for an agent, creating its result if needed."""
+        result = self.results.get(agent_name)
+        if result is None:
+            result = self.results[agent_name] = AgentResult(agent_name, model=model)
+        result.attempts += 1
+        return result
+
+    def finish(self, result: AgentResult) -> AgentResult:
+        self._finished.append(result.agent_name)
+        return result
+
+    def execution_results(self) -> List[Dict[str, Any]]:
+        return [self.results[name].to_dict() for name in self._finished]
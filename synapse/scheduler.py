@@ -0,0 +1,458 @@
+# synapse/scheduler.py
+import functools
+import heapq
+import itertools
+import statistics
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .dependency_graph import DependencyGraph
+from .limits import ModelLimiter
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Seconds assumed for an agent when no agent in the workflow has history
+DEFAULT_DURATION_ESTIMATE = 1.0
+
+# How often an agent blocked on a model's concurrency cap re-checks it, in
+# case the slot is held outside this run
+LIMIT_POLL_INTERVAL = 0.05
+
+# Attempts given up on after their timeout that are still running, which do
+# not count against max_concurrency; past this many they take slots again.
+# Pools running timed attempts get as many extra workers.
+SPARE_WORKERS = 4
+
+
+def item_key(agent_name: str, index: int) -> str:
+    """Key of one item task of an expanded agent."""
+    return f"{agent_name}[{index}]"
+
+
+class DagScheduler:
+    """
+    Ready-queue executor for a dependency graph.
+
+    An agent is submitted to the worker pool as soon as every agent it
+    depends on has finished, with at most max_concurrency agents in flight.
+    When more agents are ready than there are free slots, the one heading
+    the longest remaining path to the end of the graph goes first, with
+    each agent weighted by its estimated duration.
+
+    Agents listed in hedge_after get a duplicate attempt once their current
+    one has run that long; the first to succeed wins and the other is
+    cancelled, or left to finish with its result discarded.
+
+    With a limiter, an agent whose model is at its concurrency cap or out of
+    rate tokens stays in the ready queue without taking a slot, and agents
+    on other models go ahead of it. The time each attempt spent ready but
+    not yet submitted is kept in queue_waits.
+
+    stream_inputs maps streaming consumers to the generator agents they
+    read from; such a consumer is released as soon as those producers are
+    submitted instead of when they finish. While a producer waits to be
+    retried, its consumers are held back without a slot until its next
+    attempt is submitted, so they cannot block the slot it needs.
+
+    An agent can be expanded into one task per item when it becomes ready.
+    Item tasks are keyed "Agent[i]" in prepare and complete, take slots and
+    model limits like any other attempt and are retried individually; the
+    agent finishes once all of them have.
+
+    An agent can also be skipped when it becomes ready. It then counts as
+    finished without taking a slot, and its dependents are released.
+
+    Agents listed in timeouts have each attempt limited to that many
+    seconds, measured on its future so no thread is spent watching it. A
+    thread cannot be interrupted, so an attempt given up on keeps running
+    on its worker; up to SPARE_WORKERS of them are carried by extra workers
+    rather than slots.
+    """
+
+    def __init__(
+        self,
+        graph: DependencyGraph,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        executor: Optional[Executor] = None,
+        estimates: Optional[Dict[str, float]] = None,
+        hedge_after: Optional[Dict[str, float]] = None,
+        models: Optional[Dict[str, str]] = None,
+        limiter: Optional[ModelLimiter] = None,
+        stream_inputs: Optional[Dict[str, Set[str]]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.graph = graph
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        # expected seconds per agent, e.g. historical medians
+        self.estimates = estimates or {}
+        # seconds after which a still-running attempt gets a duplicate
+        self.hedge_after = hedge_after or {}
+        # model label per agent, checked against limiter before submitting
+        self.models = models or {}
+        self.limiter = limiter
+        self.stream_inputs = stream_inputs or {}
+        # seconds after which a still-running attempt is given up on
+        self.timeouts = timeouts or {}
+        # seconds the latest attempt of each agent waited to be submitted
+        self.queue_waits: Dict[str, float] = {}
+
+    def priorities(self) -> Dict[str, float]:
+        """
+        Length of the longest path from each agent to the end of the graph.
+
+        Agents without an estimate are assumed to take the median of the
+        known estimates, or DEFAULT_DURATION_ESTIMATE if there are none.
+        """
+        default = (
+            statistics.median(self.estimates.values())
+            if self.estimates
+            else DEFAULT_DURATION_ESTIMATE
+        )
+        rank: Dict[str, float] = {}
+        for name in reversed(self.graph.get_execution_order()):
+            dependents = self.graph.reverse_graph.get(name, set())
+            downstream = max((rank[d] for d in dependents), default=0.0)
+            rank[name] = self.estimates.get(name, default) + downstream
+        return rank
+
+    def run(
+        self,
+        prepare: Callable[[str, int, bool], Callable[[], Any]],
+        complete: Callable[[str, int, "Future[Any]"], Optional[float]],
+        completed: Optional[Set[str]] = None,
+        expand: Optional[Callable[[str], Optional[int]]] = None,
+        gather: Optional[Callable[[str], None]] = None,
+        skip: Optional[Callable[[str, Set[str]], bool]] = None,
+        expire: Optional[Callable[[str, bool], Optional[BaseException]]] = None,
+    ) -> None:
+        """
+        Execute every agent in the graph.
+
+        Args:
+            prepare: Called on the scheduling thread right before an attempt
+                (1-based) is submitted; returns the callable to run on a
+                worker. The flag is set for hedged duplicates of an attempt
+                that is already running.
+            complete: Called on the scheduling thread when an attempt
+                finishes. Returning a delay in seconds re-enqueues the agent
+                once it has elapsed, without holding a worker slot in the
+                meantime. Raising from it stops new submissions; agents
+                already in flight are drained and the first error is
+                re-raised.
+            completed: Agents that already finished, e.g. in the run being
+                resumed; they are not executed again.
+            expand: Called when an agent becomes ready; returning a count
+                replaces it with that many item tasks.
+            gather: Called once every item task of an expanded agent has
+                finished, before its dependents are released.
+            skip: Called when an agent becomes ready, before expand, with
+                those of its dependencies that were skipped; returning True
+                skips it too.
+            expire: Called when an attempt of an agent in timeouts, or its
+                hedged duplicate if the flag is set, is still running at its
+                deadline. Returns the error the attempt fails with, passed to
+                complete, or None if it is finishing after all.
+        """
+        completed = completed or set()
+        order = [
+            name for name in self.graph.get_execution_order() if name not in completed
+        ]
+        position = {name: i for i, name in enumerate(order)}
+        remaining = {
+            name: len(self.graph.graph.get(name, set()) - completed) for name in order
+        }
+        rank = self.priorities()
+        # (-rank, position, item index, key) heap: critical path first, then
+        # topological, then item order
+        ready: List[Tuple[float, int, int, str]] = []
+        ready_at: Dict[str, float] = {}
+        # item task key -> (agent, index), and items left per expanded agent
+        items: Dict[str, Tuple[str, int]] = {}
+        items_left: Dict[str, int] = {}
+
+        def agent_of(key: str) -> str:
+            return items[key][0] if key in items else key
+
+        def make_ready(key: str) -> None:
+            name, index = items.get(key, (key, 0))
+            ready_at[key] = time.monotonic()
+            heapq.heappush(ready, (-rank[name], position[name], index, key))
+
+        # producer -> consumers released when the producer is submitted
+        early: Dict[str, Set[str]] = {}
+        for consumer, producers in self.stream_inputs.items():
+            if consumer in completed:
+                continue
+            for producer in producers - completed:
+                early.setdefault(producer, set()).add(consumer)
+        # producers waiting to be retried, and consumers held back by them
+        idle: Set[str] = set()
+        parked: Dict[str, Set[str]] = {}
+        attempts: Dict[str, int] = {}
+        # (due, seq, name) heap of delayed retries
+        retries: List[Tuple[float, int, str]] = []
+        # (due, seq, name, attempt) heap of pending hedges
+        hedges: List[Tuple[float, int, str, int]] = []
+        hedges_due: Deque[Tuple[str, int]] = deque()
+        seq = itertools.count()
+        in_flight: Dict["Future[Any]", str] = {}
+        # futures of each agent's current attempt, original first
+        racing: Dict[str, List["Future[Any]"]] = {}
+        # hedge losers that could not be cancelled; they keep their slot
+        abandoned: Set["Future[Any]"] = set()
+        # (due, seq, future, hedge) heap of attempt deadlines
+        deadlines: List[Tuple[float, int, "Future[Any]", bool]] = []
+        # attempts given up on at their deadline that are still running
+        expired: Set["Future[Any]"] = set()
+        first_error: Optional[BaseException] = None
+
+        own_executor = self.executor is None
+        executor = self.executor or ThreadPoolExecutor(
+            max_workers=self.max_concurrency + (SPARE_WORKERS if self.timeouts else 0),
+            thread_name_prefix="synapse-agent",
+        )
+
+        def full() -> bool:
+            busy = len(in_flight) + len(abandoned)
+            return busy + max(0, len(expired) - SPARE_WORKERS) >= self.max_concurrency
+
+        skipped: Set[str] = set()
+
+        def start(name: str) -> None:
+            dependencies = self.graph.graph.get(name, set())
+            if skip is not None and skip(name, dependencies & skipped):
+                skipped.add(name)
+                # streaming consumers were waiting on the submit, not finish
+                release(self.graph.reverse_graph.get(name, set()))
+                return
+            count = expand(name) if expand is not None else None
+            if count is None:
+                make_ready(name)
+                return
+            items_left[name] = count
+            if count == 0:
+                finish(name)
+            for index in range(count):
+                key = item_key(name, index)
+                items[key] = (name, index)
+                make_ready(key)
+
+        def resume(producer: str) -> None:
+            idle.discard(producer)
+            for consumer in parked.pop(producer, ()):
+                make_ready(consumer)
+
+        def finish(name: str) -> None:
+            resume(name)
+            if name in items_left and gather is not None:
+                gather(name)
+            dependents = self.graph.reverse_graph.get(name, set())
+            release(dependents - early.get(name, set()))
+
+        def release(dependents: Iterable[str]) -> None:
+            for dependent in dependents:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    start(dependent)
+
+        def submit(name: str, attempt: int, hedge: bool) -> Optional[float]:
+            """Submit an attempt, or return how long its model is throttled."""
+            model = self.models.get(agent_of(name))
+            waiting_on = self.stream_inputs.get(agent_of(name), set()) & idle
+            if waiting_on and not hedge:
+                # the producer's next attempt has not started yet
+                parked.setdefault(min(waiting_on), set()).add(name)
+                return None
+            limiter = self.limiter if model is not None else None
+            if limiter is not None and model is not None:
+                wait = limiter.acquire(model)
+                if wait is not None:
+                    return wait
+
+            attempts[name] = attempt
+            if not hedge:
+                self.queue_waits[name] = time.monotonic() - ready_at[name]
+            try:
+                task = prepare(name, attempt, hedge)
+                future = executor.submit(task)
+            except BaseException:
+                if limiter is not None and model is not None:
+                    limiter.release(model)
+                raise
+            if limiter is not None and model is not None:
+                release_model = functools.partial(limiter.release, model)
+                future.add_done_callback(lambda _: release_model())
+            in_flight[future] = name
+            racing.setdefault(name, []).append(future)
+            if attempt == 1 and not hedge:
+                release(early.get(name, ()))
+            elif not hedge:
+                resume(name)
+            if not hedge and agent_of(name) in self.hedge_after:
+                due = time.monotonic() + self.hedge_after[agent_of(name)]
+                heapq.heappush(hedges, (due, next(seq), name, attempt))
+            if agent_of(name) in self.timeouts:
+                due = time.monotonic() + self.timeouts[agent_of(name)]
+                heapq.heappush(deadlines, (due, next(seq), future, hedge))
+            return None
+
+        try:
+            try:
+                for name in order:
+                    if remaining[name] == 0:
+                        start(name)
+            except Exception as e:
+                first_error = e
+
+            while ready or in_flight or (retries and first_error is None):
+                now = time.monotonic()
+                while retries and retries[0][0] <= now:
+                    make_ready(heapq.heappop(retries)[2])
+                while hedges and hedges[0][0] <= now:
+                    _, _, name, attempt = heapq.heappop(hedges)
+                    hedges_due.append((name, attempt))
+
+                # attempts past their deadline fail like any other
+                late: Dict["Future[Any]", "Future[Any]"] = {}
+                while deadlines and deadlines[0][0] <= now:
+                    _, _, future, hedge = heapq.heappop(deadlines)
+                    if future not in in_flight or future.done() or expire is None:
+                        continue
+                    error = expire(in_flight[future], hedge)
+                    if error is not None:
+                        late[future] = Future()
+                        late[future].set_exception(error)
+
+                # stragglers get the next free slots, ahead of ready agents
+                while hedges_due and first_error is None:
+                    if full():
+                        break
+                    name, attempt = hedges_due.popleft()
+                    if attempts[name] != attempt or len(racing.get(name, [])) != 1:
+                        # finished, failed or already hedged while waiting
+                        continue
+                    try:
+                        # a duplicate is not worth waiting on a limit for
+                        submit(name, attempt, hedge=True)
+                    except Exception as e:
+                        first_error = e
+
+                # monotonic time the next throttled agent should be retried
+                throttled = []
+                throttled_until: Optional[float] = None
+                while ready and first_error is None:
+                    if full():
+                        break
+                    entry = heapq.heappop(ready)
+                    name = entry[3]
+                    try:
+                        wait = submit(name, attempts.get(name, 0) + 1, hedge=False)
+                    except Exception as e:
+                        first_error = e
+                        break
+                    if wait is not None:
+                        # keep its place; agents on other models may go ahead
+                        throttled.append(entry)
+                        due = time.monotonic() + (wait or LIMIT_POLL_INTERVAL)
+                        if throttled_until is None or due < throttled_until:
+                            throttled_until = due
+                for entry in throttled:
+                    heapq.heappush(ready, entry)
+
+                if first_error is not None and not in_flight:
+                    break
+
+                due_times = [
+                    heap[0][0] for heap in (retries, hedges, deadlines) if heap
+                ]
+                if throttled_until is not None:
+                    due_times.append(throttled_until)
+                timeout = None
+                if due_times:
+                    timeout = max(0.0, min(due_times) - time.monotonic())
+                if late:
+                    done = set(late)
+                elif not in_flight and not abandoned and not expired:
+                    if timeout is not None:
+                        time.sleep(timeout)
+                    continue
+                else:
+                    done, _ = wait_futures(
+                        list(in_flight) + list(abandoned) + list(expired),
+                        timeout=timeout,
+                        return_when=FIRST_COMPLETED,
+                    )
+                finished: Set[str] = set()
+                for future in done:
+                    if future in abandoned or future in expired:
+                        abandoned.discard(future)
+                        expired.discard(future)
+                        continue
+                    if future not in in_flight:
+                        # a racer already cancelled by its winning sibling
+                        continue
+                    name = in_flight.pop(future)
+                    racers = racing[name]
+                    racers.remove(future)
+                    if future in late:
+                        # keeps its worker until it returns
+                        expired.add(future)
+                        future = late[future]
+                    if racers and future.exception() is not None:
+                        # the other attempt may still succeed
+                        continue
+
+                    # first result wins; cancel or discard the other attempt
+                    for loser in racing.pop(name):
+                        del in_flight[loser]
+                        if not loser.cancel():
+                            abandoned.add(loser)
+
+                    try:
+                        delay = complete(name, attempts[name], future)
+                    except Exception as e:
+                        if first_error is None:
+                            first_error = e
+                        continue
+                    if delay is not None:
+                        due = time.monotonic() + delay
+                        heapq.heappush(retries, (due, next(seq), name))
+                        if name in early:
+                            idle.add(name)
+                        continue
+                    finished.add(name)
+
+                for name in finished:
+                    if name in items:
+                        name = items[name][0]
+                        items_left[name] -= 1
+                        if items_left[name]:
+                            continue
+                    try:
+                        finish(name)
+                    except Exception as e:
+                        if first_error is None:
+                            first_error = e
+        finally:
+            if own_executor:
+                # don't hold the run open for discarded or expired attempts
+                executor.shutdown(wait=not (abandoned or expired))
+
+        if first_error is not None:
+            raise first_error
@@ -0,0 +1,105 @@
+# synapse/streams.py
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+
+class StreamError(RuntimeError):
+    """The agent producing a stream failed before finishing it."""
+
+
+class ItemStream:
+    """
+    Items yielded by one attempt of a generator agent.
+
+    Written by the producing attempt and read by any number of streaming
+    consumers, each of which sees every item from the start. Iterate it
+    with a plain for loop in sync agents or async for in async agents.
+    Once the producer fails, readers raise StreamError after the last item.
+    """
+
+    def __init__(self, producer: str):
+        self.producer = producer
+        self.first_item_at: Optional[float] = None
+        self._items: List[Any] = []
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+        # futures of async readers waiting for the next item
+        self._waiters: List[
+            Tuple[asyncio.AbstractEventLoop, "asyncio.Future[Any]"]
+        ] = []
+
+    def put(self, item: Any) -> None:
+        """Publish an item; ignored once the stream is closed."""
+        with self._cond:
+            if self._closed:
+                return
+            if self.first_item_at is None:
+                self.first_item_at = time.time()
+            self._items.append(item)
+            self._wake()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._error = error
+            self._wake()
+
+    def _wake(self) -> None:
+        self._cond.notify_all()
+        for loop, waiter in self._waiters:
+            loop.call_soon_threadsafe(_resolve, waiter)
+        self._waiters = []
+
+    def _next(self, index: int) -> Tuple[bool, Any]:
+        """(True, item) at index, or (False, None) once the stream ended."""
+        if index < len(self._items):
+            return True, self._items[index]
+        if self._error is not None:
+            raise StreamError(
+                f"Agent {self.producer} failed while streaming: {self._error}"
+            ) from self._error
+        return False, None
+
+    def __iter__(self) -> Iterator[Any]:
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._items) and not self._closed:
+                    self._cond.wait()
+                ok, item = self._next(index)
+            if not ok:
+                return
+            index += 1
+            yield item
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        loop = asyncio.get_running_loop()
+        index = 0
+        while True:
+            waiter: Optional["asyncio.Future[Any]"] = None
+            with self._cond:
+                if index >= len(self._items) and not self._closed:
+                    waiter = loop.create_future()
+                    self._waiters.append((loop, waiter))
+                else:
+                    ok, item = self._next(index)
+            if waiter is not None:
+                await waiter
+                continue
+            if not ok:
+                return
+            index += 1
+            yield item
+
+    def __repr__(self) -> str:
+        return f"<ItemStream from {self.producer}>"
+
+
+def _resolve(waiter: "asyncio.Future[Any]") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
@@ -1,98 +1,431 @@
 # synapse/trace.py
 import json
 import os
-import sqlite3
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .trace_blobs import LEAF, TREE, blob_hash, compress, decompress
+from .trace_patch import apply, diff
+from .trace_schema import SCHEMA_VERSION, connect, migrate
+from .trace_writer import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL,
+    DURABILITY_MODES,
+    TraceWriter,
+)
 
 DB_PATH = os.path.join(os.getcwd(), ".synapse/synapse_traces.db")
 
+# Hashes of blobs this store has written, remembered so payloads shared
+# between nodes (every downstream input holds earlier outputs) are only
+# compressed and sent to the database once
+KNOWN_BLOBS = 65536
+
+_INSERT_BLOB = """INSERT OR IGNORE INTO blobs (hash, kind, codec, size, data)
+    VALUES (?,?,?,?,?)"""
+
+# Every this many context versions of a run, one is stored in full rather
+# than as a patch, bounding the patches applied to rebuild a version
+DEFAULT_SNAPSHOT_INTERVAL = 16
+
+
+class TraceBackend(ABC):
+    """
+    Where trace records go: TraceStore (SQLite) or one of trace_backends.
 
-class TraceStore:
+    The orchestrator and agents only use these methods. fetch_* return what
+    the backend still holds, which may be less than was recorded, or
+    nothing. ts arguments are when a record happened, now by default;
+    imports pass the original time.
+    """
+
+    current_run_id: Optional[str] = None
+
+    @abstractmethod
+    def start_run(
+        self,
+        run_id: str,
+        workflow: str,
+        parent_run_id: Optional[str] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def finish_run(
+        self, run_id: str, peak_rss: Optional[int], flush: bool = True
+    ) -> None:
+        """Record run stats; with flush, the run's records are stored on return."""
+
+    @abstractmethod
+    def record_node(
+        self,
+        run_id: str,
+        agent_id: str,
+        name: str,
+        input_ctx: Dict[str, Any],
+        output: Dict[str, Any],
+        duration: float,
+        attempt: int,
+        model: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        status: str = "success",
+        queue_wait: Optional[float] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def record_error(
+        self,
+        run_id: str,
+        agent_id: str,
+        name: str,
+        error: str,
+        stack: str,
+        duration: float,
+        attempt: int,
+        model: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        status: str = "error",
+        queue_wait: Optional[float] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def record_skip(
+        self,
+        run_id: str,
+        agent_id: str,
+        name: str,
+        model: str,
+        reason: str,
+        ts: Optional[float] = None,
+    ) -> None:
+        """Record an agent skipped by a when condition, without payloads."""
+
+    @abstractmethod
+    def record_context_version(
+        self,
+        run_id: str,
+        version: int,
+        node_name: str,
+        ctx: Dict[str, Any],
+        ts: Optional[float] = None,
+    ) -> None:
+        ...
+
+    def flush(self) -> None:
+        """Block until every record written so far is stored."""
+
+    def close(self) -> None:
+        """Store pending records and release files, threads and connections."""
+
+    @abstractmethod
+    def fetch_runs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_nodes(self, run_id: str, limit: int = 500) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_outputs(self, run_id: str) -> Dict[str, Any]:
+        """
+        Latest successful or cached output of each agent of a run, however
+        many nodes it has, in the order the agents finished, leaving out
+        map_over item tasks.
+        """
+
+    @abstractmethod
+    def fetch_durations(
+        self, workflow: str, window: int = 50
+    ) -> Dict[str, List[float]]:
+        """
+        Durations of the most recent successful attempts of each agent of
+        the workflow, newest first, leaving out map_over item tasks.
+        """
+
+    @abstractmethod
+    def fetch_contexts(self, run_id: str) -> List[Dict[str, Any]]:
+        """Every context version of a run, in version order."""
+
+    def fetch_context_versions(self, run_id: str) -> List[Dict[str, Any]]:
+        """The context versions of a run without their contexts."""
+        return [
+            {key: version[key] for key in ("version", "node", "ts")}
+            for version in self.fetch_contexts(run_id)
+        ]
+
+    def fetch_context(self, run_id: str, version: int) -> Optional[Dict[str, Any]]:
+        """One context version of a run, or None if it is not there."""
+        for found in self.fetch_contexts(run_id):
+            if found["version"] == version:
+                return found
+        return None
+
+
+class RunTrace:
+    """
+    View of a TraceBackend bound to one run.
+
+    Agents record under tracer.current_run_id, so runs executing
+    concurrently against one store each hand their agents their own view.
+    Everything else is delegated to the store.
+    """
+
+    def __init__(self, store: TraceBackend, run_id: str) -> None:
+        self.store = store
+        self.current_run_id = run_id
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.store, name)
+
+
+class TraceStore(TraceBackend):
     """
     Very small sqlite-backed tracer.
+    The schema is versioned and migrated on open, see trace_schema.
     Tables:
-        - runs(run_id, started_at, workflow_name)
+        - runs(run_id, started_at, workflow_name, parent_run_id, peak_rss)
         - nodes(id, run_id, agent_id, name, input_json,
-                output_json, duration, attempt, error, ts, model, metadata)
-        - contexts(run_id, version, node_name, ctx_json, ts)
+                output_json, duration, attempt, error, ts, model, metadata,
+                status, queue_wait, input_ref, output_ref)
+        - contexts(run_id, version, node_name, ctx_json, ts, base_version)
+        - blobs(hash, kind, codec, size, data)
+
+    Node payloads are stored as content-addressed blobs. An input context
+    is a tree whose top-level values, and each output under "outputs", are
+    blobs of their own, and an output is a single blob, so an output is
+    stored once however many downstream inputs contain it.
+
+    Context versions are stored as JSON patches against the version of the
+    run recorded before them, with a full snapshot every snapshot_interval
+    versions, and rebuilt when read.
+
+    Once closed, the store cannot be written to or read from; records
+    arriving late, e.g. from a hedge loser still running, raise.
+
+    A read_only store, as used by the dashboard, opens the database without
+    migrating it or changing its journal mode, and raises on any write. A
+    database older than SCHEMA_VERSION cannot be opened read-only; opening
+    it once with a writable store, e.g. by running a workflow, upgrades it.
     """
 
-    def __init__(self, db_path: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        durability: str = "batched",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL,
+        read_only: bool = False,
+    ) -> None:
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"Unknown trace durability '{durability}', "
+                f"expected one of {', '.join(DURABILITY_MODES)}"
+            )
         self.db_path = db_path or DB_PATH
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self._init_db()
+        self.read_only = read_only
+        self.conn = connect(self.db_path, check_same_thread=False, read_only=read_only)
+        # reads, and writes in sync mode, share this connection across threads
+        self._lock = threading.RLock()
+        if read_only:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                self.conn.close()
+                raise RuntimeError(
+                    f"Trace database {self.db_path} has schema version {version}, "
+                    f"older than {SCHEMA_VERSION}, and cannot be upgraded while "
+                    "opened read-only; run a workflow once to upgrade it"
+                )
+        else:
+            migrate(self.conn)
+        self._blob_lock = threading.Lock()
+        self._known_blobs: "OrderedDict[str, None]" = OrderedDict()
+        if snapshot_interval < 1:
+            raise ValueError("snapshot_interval must be at least 1")
+        self.snapshot_interval = snapshot_interval
+        # run_id -> (version, context, patches since the last full snapshot)
+        # of the run's last recorded context version, the base of the next
+        self._context_bases: Dict[str, Tuple[int, Any, int]] = {}
+        self._context_lock = threading.Lock()
         self.current_run_id: Optional[str] = None
+        # in batched mode, writes go through a thread with its own connection
+        self._writer: Optional[TraceWriter] = None
+        self._closed = False
+        if durability == "batched" and not read_only:
+            self._writer = TraceWriter(
+                self.db_path,
+                batch_size,
+                flush_interval,
+                on_rollback=self._forget_blobs,
+            )
 
-    def _init_db(self) -> None:
-        c = self.conn.cursor()
-        c.execute(
-            """CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY,
-                started_at REAL, workflow TEXT)"""
-        )
-        c.execute(
-            """CREATE TABLE IF NOT EXISTS nodes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                run_id TEXT,
-                agent_id TEXT,
-                name TEXT,
-                input_json TEXT,
-                output_json TEXT,
-                duration REAL,
-                attempt INTEGER,
-                error TEXT,
-                ts REAL,
-                model TEXT,
-                metadata TEXT
-            )"""
-        )
-        c.execute(
-            """CREATE TABLE IF NOT EXISTS contexts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                run_id TEXT,
-                version INTEGER,
-                node_name TEXT,
-                ctx_json TEXT,
-                ts REAL
-            )"""
+    @classmethod
+    def from_config(cls, *configs: Optional[Dict[str, Any]]) -> "TraceStore":
+        """
+        Build a store from trace settings, later ones winning:
+
+            trace: {durability: batched, batch_size: 256, flush_interval: 0.2,
+                    snapshot_interval: 16}
+        """
+        settings: Dict[str, Any] = {}
+        for config in configs:
+            settings.update(config or {})
+        return cls(
+            durability=settings.get("durability", "batched"),
+            batch_size=int(settings.get("batch_size", DEFAULT_BATCH_SIZE)),
+            flush_interval=float(
+                settings.get("flush_interval", DEFAULT_FLUSH_INTERVAL)
+            ),
+            snapshot_interval=int(
+                settings.get("snapshot_interval", DEFAULT_SNAPSHOT_INTERVAL)
+            ),
         )
-        self.conn.commit()
 
-        # Migrate existing database: add metadata column if it doesn't exist
-        self._migrate_db()
+    def _write(self, sql: str, params: Sequence[Any]) -> None:
+        """Run an INSERT/UPDATE, committed now or by the background writer."""
+        writer = self._writer
+        if writer is not None and not self._closed:
+            # raises too once the writer is closed
+            writer.write(sql, params)
+            return
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot write trace records after close")
+            if self.read_only:
+                raise RuntimeError("cannot write trace records to a read-only store")
+            self.conn.execute(sql, params)
+            self.conn.commit()
+
+    def flush(self) -> None:
+        """Block until every record written so far is committed."""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self) -> None:
+        """Commit pending records, stop the writer and close the database."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        with self._lock:
+            if not self.read_only:
+                # refresh query planner statistics for the indexes
+                self.conn.execute("PRAGMA optimize")
+            self.conn.close()
+
+    def _put_leaf(self, value: Any) -> str:
+        """Store a JSON value as a blob and return its hash."""
+        return self._put_blob(LEAF, json.dumps(value))
 
-    def _migrate_db(self) -> None:
+    def _put_tree(self, value: Mapping[str, Any], nested: Collection[str] = ()) -> str:
         """
-        Migrate database schema to add
-        metadata column if it doesn't exist.
+        Store a mapping as a tree of blobs, one per value, and return its hash.
+
+        Values under the keys in nested are mappings stored as trees too.
         """
-        c = self.conn.cursor()
+        refs = {
+            key: (
+                self._put_tree(item)
+                if key in nested and isinstance(item, Mapping)
+                else self._put_leaf(item)
+            )
+            for key, item in value.items()
+        }
+        return self._put_blob(TREE, json.dumps(refs))
 
-        # Check if metadata column exists in nodes table
+    def _put_blob(self, kind: str, text: str) -> str:
+        data = text.encode("utf8")
+        digest = blob_hash(kind, data)
+        with self._blob_lock:
+            if digest in self._known_blobs:
+                self._known_blobs.move_to_end(digest)
+                return digest
+            self._known_blobs[digest] = None
+            if len(self._known_blobs) > KNOWN_BLOBS:
+                self._known_blobs.popitem(last=False)
+        codec, packed = compress(data)
         try:
-            c.execute("PRAGMA table_info(nodes)")
-            columns = [row[1] for row in c.fetchall()]
-
-            if "metadata" not in columns:
-                # Add metadata column
-                c.execute("ALTER TABLE nodes ADD COLUMN metadata TEXT")
-                self.conn.commit()
-        except Exception:
-            """
-            If table doesn't exist or other error, that's okay,
-            it will be created with the correct schema
-            """
-            pass
-
-    def start_run(self, run_id: str, workflow: str) -> None:
+            self._write(_INSERT_BLOB, (digest, kind, codec, len(data), packed))
+        except BaseException:
+            self._forget_blobs([(_INSERT_BLOB, (digest,))])
+            raise
+        return digest
+
+    def _forget_blobs(self, records: Sequence[Tuple[str, Sequence[Any]]]) -> None:
+        """
+        Unmark blobs whose INSERT was rolled back, so the next node using
+        one writes it again instead of referencing a missing blob.
+        """
+        with self._blob_lock:
+            for sql, params in records:
+                if sql == _INSERT_BLOB:
+                    self._known_blobs.pop(params[0], None)
+
+    def _get_blob(self, c: Any, digest: str, loaded: Dict[str, Any]) -> Any:
+        """
+        Decode the payload stored under digest, following trees.
+
+        loaded memoizes blobs across the nodes of one fetch, so outputs
+        shared between them are decompressed once.
+        """
+        if digest in loaded:
+            return loaded[digest]
+        c.execute("SELECT kind, codec, data FROM blobs WHERE hash=?", (digest,))
+        row = c.fetchone()
+        if row is None:
+            value = None
+        else:
+            value = json.loads(decompress(row[1], row[2]))
+            if row[0] == TREE:
+                value = {
+                    key: self._get_blob(c, ref, loaded) for key, ref in value.items()
+                }
+        loaded[digest] = value
+        return value
+
+    def start_run(
+        self,
+        run_id: str,
+        workflow: str,
+        parent_run_id: Optional[str] = None,
+        ts: Optional[float] = None,
+    ) -> None:
         self.current_run_id = run_id
-        c = self.conn.cursor()
-        c.execute(
-            """INSERT OR REPLACE INTO runs (run_id, started_at, workflow)
-            VALUES (?,?,?)""",
-            (run_id, time.time(), workflow),
+        self._write(
+            """INSERT OR REPLACE INTO runs (run_id, started_at, workflow,
+            parent_run_id) VALUES (?,?,?,?)""",
+            (run_id, ts or time.time(), workflow, parent_run_id),
         )
-        self.conn.commit()
+
+    def finish_run(
+        self, run_id: str, peak_rss: Optional[int], flush: bool = True
+    ) -> None:
+        """Record run stats; with flush, the run's records are committed on return."""
+        with self._context_lock:
+            self._context_bases.pop(run_id, None)
+        self._write("UPDATE runs SET peak_rss=? WHERE run_id=?", (peak_rss, run_id))
+        if flush:
+            self.flush()
 
     def record_node(
         self,
@@ -105,28 +438,33 @@ class TraceStore:
         attempt: int,
         model: str,
         metadata: Optional[Dict[str, Any]] = None,
+        status: str = "success",
+        queue_wait: Optional[float] = None,
+        ts: Optional[float] = None,
     ) -> None:
-        c = self.conn.cursor()
         metadata_json = json.dumps(metadata) if metadata else None
-        c.execute(
-            """INSERT INTO nodes (run_id, agent_id, name, input_json, output_json,
-                    duration, attempt, error, ts, model, metadata)
-                    VALUES (?,?,?,?,?,?,?,?,?,?,?)""",
+        input_ref = self._put_tree(input_ctx, nested=("outputs",))
+        output_ref = self._put_leaf(output)
+        self._write(
+            """INSERT INTO nodes (run_id, agent_id, name, input_ref, output_ref,
+                    duration, attempt, error, ts, model, metadata, status,
+                    queue_wait) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)""",
             (
                 run_id,
                 agent_id,
                 name,
-                json.dumps(input_ctx),
-                json.dumps(output),
+                input_ref,
+                output_ref,
                 float(duration),
                 int(attempt),
                 None,
-                time.time(),
+                ts or time.time(),
                 model,
                 metadata_json,
+                status,
+                queue_wait,
             ),
         )
-        self.conn.commit()
 
     def record_error(
         self,
@@ -139,14 +477,16 @@ class TraceStore:
         attempt: int,
         model: str,
         metadata: Optional[Dict[str, Any]] = None,
+        status: str = "error",
+        queue_wait: Optional[float] = None,
+        ts: Optional[float] = None,
     ) -> None:
-        c = self.conn.cursor()
         err_obj = {"error": error, "stack": stack}
         metadata_json = json.dumps(metadata) if metadata else None
-        c.execute(
+        self._write(
             """INSERT INTO nodes (run_id, agent_id, name, input_json, output_json,
-                    duration, attempt, error, ts, model, metadata)
-                    VALUES (?,?,?,?,?,?,?,?,?,?,?)""",
+                    duration, attempt, error, ts, model, metadata, status,
+                    queue_wait) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)""",
             (
                 run_id,
                 agent_id,
@@ -156,113 +496,260 @@ class TraceStore:
                 float(duration),
                 int(attempt),
                 json.dumps(err_obj),
-                time.time(),
+                ts or time.time(),
                 model,
                 metadata_json,
+                status,
+                queue_wait,
             ),
         )
-        self.conn.commit()
 
-    def record_context_version(
-        self, run_id: str, version: int, node_name: str, ctx: Dict[str, Any]
+    def record_skip(
+        self,
+        run_id: str,
+        agent_id: str,
+        name: str,
+        model: str,
+        reason: str,
+        ts: Optional[float] = None,
     ) -> None:
-        c = self.conn.cursor()
-        c.execute(
-            """INSERT INTO contexts (run_id, version,
-            node_name, ctx_json, ts) VALUES (?,?,?,?,?)""",
-            (run_id, int(version), node_name, json.dumps(ctx), time.time()),
-        )
-        self.conn.commit()
-
-    def fetch_runs(self, limit: int = 50) -> List[Dict[str, Any]]:
-        c = self.conn.cursor()
-        c.execute(
-            """SELECT run_id, started_at,
-            workflow FROM runs ORDER BY started_at DESC LIMIT ?""",
-            (limit,),
+        self._write(
+            """INSERT INTO nodes (run_id, agent_id, name, duration, attempt,
+                    ts, model, metadata, status)
+                    VALUES (?,?,?,?,?,?,?,?,?)""",
+            (
+                run_id,
+                agent_id,
+                name,
+                0.0,
+                0,
+                ts or time.time(),
+                model,
+                json.dumps({"skipped": reason}),
+                "skipped",
+            ),
         )
-        return [
-            {"run_id": r[0], "started_at": r[1], "workflow": r[2]} for r in c.fetchall()
-        ]
 
-    def fetch_nodes(self, run_id: str, limit: int = 500) -> List[Dict[str, Any]]:
-        c = self.conn.cursor()
-        # Check if metadata column exists to handle both old and new schemas
-        try:
-            c.execute("PRAGMA table_info(nodes)")
-            columns = [row[1] for row in c.fetchall()]
-            has_metadata = "metadata" in columns
+    def record_context_version(
+        self,
+        run_id: str,
+        version: int,
+        node_name: str,
+        ctx: Dict[str, Any],
+        ts: Optional[float] = None,
+    ) -> None:
+        """
+        Record a context version, as a patch against the run's previous one.
 
-            if has_metadata:
-                c.execute(
-                    """SELECT id, agent_id, name, input_json,
-                    output_json, duration, attempt, error, ts, model, metadata
-                    FROM nodes WHERE run_id=? ORDER BY ts ASC LIMIT ?""",
-                    (run_id, limit),
-                )
-            else:
-                c.execute(
-                    """SELECT id, agent_id, name, input_json,
-                    output_json, duration, attempt, error, ts, model
-                    FROM nodes WHERE run_id=? ORDER BY ts ASC LIMIT ?""",
-                    (run_id, limit),
-                )
+        ctx is kept as the base of the next version, so it must not be
+        mutated afterwards; RunContext.to_dict() builds a fresh one.
+        """
+        base_version: Optional[int] = None
+        payload: Any = ctx
+        patches = 0
+        with self._context_lock:
+            base = self._context_bases.get(run_id)
+            if base is not None and base[2] + 1 < self.snapshot_interval:
+                base_version, base_ctx, patches = base
+                payload = diff(base_ctx, ctx)
+                patches += 1
+            self._context_bases[run_id] = (int(version), ctx, patches)
+            # under the lock, so a base is always inserted before its patches
+            self._write(
+                """INSERT INTO contexts (run_id, version,
+                node_name, ctx_json, ts, base_version) VALUES (?,?,?,?,?,?)""",
+                (
+                    run_id,
+                    int(version),
+                    node_name,
+                    json.dumps(payload),
+                    ts or time.time(),
+                    base_version,
+                ),
+            )
 
-            out = []
-            for r in c.fetchall():
-                node = {
-                    "id": r[0],
-                    "agent_id": r[1],
-                    "name": r[2],
-                    "input": json.loads(r[3]) if r[3] else {},
-                    "output": json.loads(r[4]) if r[4] else {},
-                    "duration": r[5],
-                    "attempt": r[6],
-                    "error": json.loads(r[7]) if r[7] else None,
-                    "ts": r[8],
-                    "model": r[9],
+    def fetch_runs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        self.flush()
+        with self._lock:
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT run_id, started_at, workflow, parent_run_id, peak_rss
+                FROM runs ORDER BY started_at DESC LIMIT ?""",
+                (limit,),
+            )
+            return [
+                {
+                    "run_id": r[0],
+                    "started_at": r[1],
+                    "workflow": r[2],
+                    "parent_run_id": r[3],
+                    "peak_rss": r[4],
                 }
-                if has_metadata:
-                    node["metadata"] = json.loads(r[10]) if r[10] else None
-                else:
-                    node["metadata"] = None
-                out.append(node)
-            return out
-        except Exception:
-            # Fallback to old schema if error occurs
+                for r in c.fetchall()
+            ]
+
+    def fetch_nodes(self, run_id: str, limit: int = 500) -> List[Dict[str, Any]]:
+        self.flush()
+        with self._lock:
+            c = self.conn.cursor()
             c.execute(
-                """SELECT id, agent_id, name, input_json, output_json,
-                duration, attempt, error, ts, model FROM nodes
-                WHERE run_id=? ORDER BY ts ASC LIMIT ?""",
+                """SELECT id, agent_id, name, input_json, output_json, duration,
+                attempt, error, ts, model, metadata, status, queue_wait,
+                input_ref, output_ref
+                FROM nodes WHERE run_id=? ORDER BY ts ASC LIMIT ?""",
                 (run_id, limit),
             )
+            loaded: Dict[str, Any] = {}
             out = []
             for r in c.fetchall():
+                error = json.loads(r[7]) if r[7] else None
+                # rows from before blobs store their payloads inline
+                if r[13]:
+                    node_input = self._get_blob(c, r[13], loaded)
+                else:
+                    node_input = json.loads(r[3]) if r[3] else {}
+                if r[14]:
+                    node_output = self._get_blob(c, r[14], loaded)
+                else:
+                    node_output = json.loads(r[4]) if r[4] else {}
                 out.append(
                     {
                         "id": r[0],
                         "agent_id": r[1],
                         "name": r[2],
-                        "input": json.loads(r[3]) if r[3] else {},
-                        "output": json.loads(r[4]) if r[4] else {},
+                        "input": node_input,
+                        "output": node_output,
                         "duration": r[5],
                         "attempt": r[6],
-                        "error": json.loads(r[7]) if r[7] else None,
+                        "error": error,
                         "ts": r[8],
                         "model": r[9],
-                        "metadata": None,
+                        "metadata": json.loads(r[10]) if r[10] else None,
+                        # rows from before the status column have none
+                        "status": r[11] or ("error" if error else "success"),
+                        "queue_wait": r[12],
                     }
                 )
             return out
 
+    def fetch_outputs(self, run_id: str) -> Dict[str, Any]:
+        self.flush()
+        with self._lock:
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT name, output_json, output_ref FROM (
+                    SELECT name, output_json, output_ref, ts, id, ROW_NUMBER()
+                    OVER (PARTITION BY name ORDER BY ts DESC, id DESC) AS rn
+                    FROM nodes WHERE run_id=?
+                    AND (status IN ('success', 'cached')
+                        OR (status IS NULL AND error IS NULL))
+                    AND json_extract(metadata, '$.map_index') IS NULL
+                ) WHERE rn = 1 ORDER BY ts ASC, id ASC""",
+                (run_id,),
+            )
+            loaded: Dict[str, Any] = {}
+            outputs: Dict[str, Any] = {}
+            for name, output_json, output_ref in c.fetchall():
+                if output_ref:
+                    outputs[name] = self._get_blob(c, output_ref, loaded)
+                else:
+                    outputs[name] = json.loads(output_json) if output_json else {}
+            return outputs
+
+    def fetch_durations(
+        self, workflow: str, window: int = 50
+    ) -> Dict[str, List[float]]:
+        """
+        Durations of the most recent successful attempts of each agent.
+
+        Only runs of the given workflow are considered, and at most window
+        samples are returned per agent, newest first. Item tasks of
+        map_over agents are left out; the agent's gathered node covers the
+        whole fan-out.
+        """
+        self.flush()
+        with self._lock:
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT name, duration FROM (
+                    SELECT n.name, n.duration, ROW_NUMBER() OVER (
+                        PARTITION BY n.name ORDER BY n.ts DESC
+                    ) AS rn
+                    FROM nodes n JOIN runs r ON r.run_id = n.run_id
+                    WHERE r.workflow=? AND n.duration IS NOT NULL
+                    AND (n.status='success' OR (n.status IS NULL AND n.error IS NULL))
+                    AND json_extract(n.metadata, '$.map_index') IS NULL
+                ) WHERE rn <= ? ORDER BY name, rn""",
+                (workflow, window),
+            )
+            durations: Dict[str, List[float]] = {}
+            for name, duration in c.fetchall():
+                durations.setdefault(name, []).append(float(duration))
+            return durations
+
     def fetch_contexts(self, run_id: str) -> List[Dict[str, Any]]:
-        c = self.conn.cursor()
-        c.execute(
-            """SELECT version, node_name, ctx_json, ts
-            FROM contexts WHERE run_id=? ORDER BY version ASC""",
-            (run_id,),
-        )
-        return [
-            {"version": r[0], "node": r[1], "ctx": json.loads(r[2]), "ts": r[3]}
-            for r in c.fetchall()
-        ]
+        """Every context version of a run, rebuilt, in version order."""
+        self.flush()
+        with self._lock:
+            c = self.conn.cursor()
+            # in recording order, so each base is rebuilt before its patches
+            c.execute(
+                """SELECT version, node_name, ctx_json, ts, base_version
+                FROM contexts WHERE run_id=? ORDER BY id ASC""",
+                (run_id,),
+            )
+            rebuilt: Dict[int, Any] = {}
+            out = []
+            for r in c.fetchall():
+                if r[4] is None:
+                    ctx = json.loads(r[2])
+                else:
+                    ctx = apply(rebuilt[r[4]], json.loads(r[2]))
+                rebuilt[r[0]] = ctx
+                out.append({"version": r[0], "node": r[1], "ctx": ctx, "ts": r[3]})
+            out.sort(key=lambda version: version["version"])
+            return out
+
+    def fetch_context_versions(self, run_id: str) -> List[Dict[str, Any]]:
+        """The context versions of a run without their contexts."""
+        self.flush()
+        with self._lock:
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT version, node_name, ts
+                FROM contexts WHERE run_id=? ORDER BY version ASC""",
+                (run_id,),
+            )
+            return [{"version": r[0], "node": r[1], "ts": r[2]} for r in c.fetchall()]
+
+    def fetch_context(self, run_id: str, version: int) -> Optional[Dict[str, Any]]:
+        """
+        One context version of a run, or None if it was not recorded.
+
+        Only the versions back to the nearest full snapshot are read.
+        """
+        self.flush()
+        with self._lock:
+            c = self.conn.cursor()
+            chain = []
+            wanted: Optional[int] = version
+            while wanted is not None:
+                c.execute(
+                    """SELECT version, node_name, ctx_json, ts, base_version
+                    FROM contexts WHERE run_id=? AND version=?""",
+                    (run_id, wanted),
+                )
+                row = c.fetchone()
+                if row is None:
+                    return None
+                chain.append(row)
+                wanted = row[4]
+            ctx = json.loads(chain[-1][2])
+            for row in reversed(chain[:-1]):
+                ctx = apply(ctx, json.loads(row[2]))
+            return {
+                "version": version,
+                "node": chain[0][1],
+                "ctx": ctx,
+                "ts": chain[0][3],
+            }
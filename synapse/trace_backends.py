@@ -0,0 +1,591 @@
+# synapse/trace_backends.py
+import glob
+import json
+import os
+import threading
+import time
+from abc import abstractmethod
+from collections import OrderedDict, deque
+from itertools import count
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .trace import TraceBackend, TraceStore
+
+# Selected with trace: {backend: ...} or synapse run --trace:
+#   - sqlite: TraceStore, queryable by the dashboard and resume
+#   - ndjson: append-only segment files, imported into SQLite later
+#   - memory: the latest records in a ring buffer, gone with the process
+#   - null: nothing is recorded
+TRACE_BACKENDS = ("sqlite", "ndjson", "memory", "null")
+
+NDJSON_DIR = os.path.join(os.getcwd(), ".synapse/traces")
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+# suffix of the segment a process is still writing
+PARTIAL = ".part"
+
+DEFAULT_CAPACITY = 10000
+
+# Successful durations kept per agent for fetch_durations
+DURATION_WINDOW = 50
+
+_RUN_FIELDS = ("run_id", "started_at", "workflow", "parent_run_id", "peak_rss")
+_NODE_FIELDS = (
+    "id",
+    "agent_id",
+    "name",
+    "input",
+    "output",
+    "duration",
+    "attempt",
+    "error",
+    "ts",
+    "model",
+    "metadata",
+    "status",
+    "queue_wait",
+)
+
+
+def create_trace_backend(
+    *configs: Optional[Dict[str, Any]], backend: Optional[str] = None
+) -> TraceBackend:
+    """
+    Build the trace backend from trace settings, later ones winning:
+
+        trace: {backend: ndjson, segment_bytes: 67108864, directory: ...}
+        trace: {backend: memory, capacity: 10000}
+        trace: {backend: sqlite, durability: batched, ...}
+
+    backend, e.g. from the CLI, overrides the configured one.
+    """
+    settings: Dict[str, Any] = {}
+    for config in configs:
+        settings.update(config or {})
+    name = backend or settings.get("backend") or "sqlite"
+    if name not in TRACE_BACKENDS:
+        raise ValueError(
+            f"Unknown trace backend '{name}', "
+            f"expected one of {', '.join(TRACE_BACKENDS)}"
+        )
+    if name == "ndjson":
+        return NDJSONTrace(
+            settings.get("directory"),
+            segment_bytes=int(settings.get("segment_bytes", DEFAULT_SEGMENT_BYTES)),
+        )
+    if name == "memory":
+        return MemoryTrace(int(settings.get("capacity", DEFAULT_CAPACITY)))
+    if name == "null":
+        return NullTrace()
+    return TraceStore.from_config(settings)
+
+
+class NullTrace(TraceBackend):
+    """Records nothing, for load tests where tracing would be overhead."""
+
+    def start_run(
+        self,
+        run_id: str,
+        workflow: str,
+        parent_run_id: Optional[str] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        self.current_run_id = run_id
+
+    def finish_run(
+        self, run_id: str, peak_rss: Optional[int], flush: bool = True
+    ) -> None:
+        pass
+
+    def record_node(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def record_error(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def record_skip(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def record_context_version(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def fetch_runs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return []
+
+    def fetch_nodes(self, run_id: str, limit: int = 500) -> List[Dict[str, Any]]:
+        return []
+
+    def fetch_outputs(self, run_id: str) -> Dict[str, Any]:
+        return {}
+
+    def fetch_durations(
+        self, workflow: str, window: int = 50
+    ) -> Dict[str, List[float]]:
+        return {}
+
+    def fetch_contexts(self, run_id: str) -> List[Dict[str, Any]]:
+        return []
+
+
+class _RecordTrace(TraceBackend):
+    """
+    Base of the backends storing records as plain dicts, one per call:
+
+        {"type": "run", run_id, started_at, workflow, parent_run_id, peak_rss}
+        {"type": "run_end", run_id, peak_rss}
+        {"type": "node", run_id, agent_id, name, input, output, duration,
+         attempt, error, ts, model, metadata, status, queue_wait}
+        {"type": "context", run_id, version, node, ctx, ts}
+
+    Durations of successful attempts are kept per agent as they are
+    recorded, so scheduling never has to read the stored records back.
+    """
+
+    def __init__(self) -> None:
+        self.current_run_id: Optional[str] = None
+        self._lock = threading.Lock()
+        # run_id -> workflow of runs in progress
+        self._run_workflows: Dict[str, str] = {}
+        # (workflow, agent name) -> latest successful durations
+        self._durations: Dict[Tuple[str, str], Deque[float]] = {}
+
+    @abstractmethod
+    def _emit(self, record: Dict[str, Any]) -> None:
+        """Store or send one record."""
+
+    def start_run(
+        self,
+        run_id: str,
+        workflow: str,
+        parent_run_id: Optional[str] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        self.current_run_id = run_id
+        with self._lock:
+            self._run_workflows[run_id] = workflow
+        self._emit(
+            {
+                "type": "run",
+                "run_id": run_id,
+                "started_at": ts or time.time(),
+                "workflow": workflow,
+                "parent_run_id": parent_run_id,
+                "peak_rss": None,
+            }
+        )
+
+    def finish_run(
+        self, run_id: str, peak_rss: Optional[int], flush: bool = True
+    ) -> None:
+        with self._lock:
+            self._run_workflows.pop(run_id, None)
+        self._emit({"type": "run_end", "run_id": run_id, "peak_rss": peak_rss})
+        if flush:
+            self.flush()
+
+    def record_node(
+        self,
+        run_id: str,
+        agent_id: str,
+        name: str,
+        input_ctx: Dict[str, Any],
+        output: Dict[str, Any],
+        duration: float,
+        attempt: int,
+        model: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        status: str = "success",
+        queue_wait: Optional[float] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        if status == "success" and "map_index" not in (metadata or {}):
+            with self._lock:
+                workflow = self._run_workflows.get(run_id)
+                if workflow is not None:
+                    self._durations.setdefault(
+                        (workflow, name), deque(maxlen=DURATION_WINDOW)
+                    ).append(float(duration))
+        self._emit(
+            _node(
+                run_id,
+                agent_id,
+                name,
+                model,
+                input=input_ctx,
+                output=output,
+                duration=float(duration),
+                attempt=int(attempt),
+                metadata=metadata,
+                status=status,
+                queue_wait=queue_wait,
+                ts=ts,
+            )
+        )
+
+    def record_error(
+        self,
+        run_id: str,
+        agent_id: str,
+        name: str,
+        error: str,
+        stack: str,
+        duration: float,
+        attempt: int,
+        model: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        status: str = "error",
+        queue_wait: Optional[float] = None,
+        ts: Optional[float] = None,
+    ) -> None:
+        self._emit(
+            _node(
+                run_id,
+                agent_id,
+                name,
+                model,
+                duration=float(duration),
+                attempt=int(attempt),
+                error={"error": error, "stack": stack},
+                metadata=metadata,
+                status=status,
+                queue_wait=queue_wait,
+                ts=ts,
+            )
+        )
+
+    def record_skip(
+        self,
+        run_id: str,
+        agent_id: str,
+        name: str,
+        model: str,
+        reason: str,
+        ts: Optional[float] = None,
+    ) -> None:
+        self._emit(
+            _node(
+                run_id,
+                agent_id,
+                name,
+                model,
+                metadata={"skipped": reason},
+                status="skipped",
+                ts=ts,
+            )
+        )
+
+    def record_context_version(
+        self,
+        run_id: str,
+        version: int,
+        node_name: str,
+        ctx: Dict[str, Any],
+        ts: Optional[float] = None,
+    ) -> None:
+        self._emit(
+            {
+                "type": "context",
+                "run_id": run_id,
+                "version": int(version),
+                "node": node_name,
+                "ctx": ctx,
+                "ts": ts or time.time(),
+            }
+        )
+
+    def fetch_durations(
+        self, workflow: str, window: int = 50
+    ) -> Dict[str, List[float]]:
+        """Durations recorded by this process only."""
+        with self._lock:
+            return {
+                name: list(reversed(durations))[:window]
+                for (run_workflow, name), durations in self._durations.items()
+                if run_workflow == workflow
+            }
+
+
+def _node(
+    run_id: str,
+    agent_id: str,
+    name: str,
+    model: str,
+    input: Any = None,
+    output: Any = None,
+    duration: float = 0.0,
+    attempt: int = 0,
+    error: Optional[Dict[str, str]] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    status: str = "success",
+    queue_wait: Optional[float] = None,
+    ts: Optional[float] = None,
+) -> Dict[str, Any]:
+    return {
+        "type": "node",
+        "run_id": run_id,
+        "agent_id": agent_id,
+        "name": name,
+        "input": {} if input is None else input,
+        "output": {} if output is None else output,
+        "duration": duration,
+        "attempt": attempt,
+        "error": error,
+        "ts": ts or time.time(),
+        "model": model,
+        "metadata": metadata or None,
+        "status": status,
+        "queue_wait": queue_wait,
+    }
+
+
+def _latest_outputs(nodes: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """fetch_outputs over node records."""
+    outputs: Dict[str, Any] = {}
+    for node in sorted(nodes, key=lambda node: node["ts"]):
+        if node["status"] not in ("success", "cached"):
+            continue
+        if "map_index" in (node["metadata"] or {}):
+            continue
+        # moved to the end: agents are ordered by their latest output
+        outputs.pop(node["name"], None)
+        outputs[node["name"]] = node["output"]
+    return outputs
+
+
+class MemoryTrace(_RecordTrace):
+    """
+    Keeps the latest capacity node and context records, and as many runs,
+    in memory; the oldest are dropped first and nothing reaches disk.
+
+    Inputs, outputs and contexts are kept by reference rather than
+    serialized, so recording costs next to nothing, but they stay alive
+    until they drop out of the buffer. capacity None keeps everything.
+    """
+
+    def __init__(self, capacity: Optional[int] = DEFAULT_CAPACITY) -> None:
+        super().__init__()
+        if capacity is not None and capacity < 1:
+            raise ValueError("trace capacity must be at least 1")
+        self.capacity = capacity
+        self._runs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self._ids = count(1)
+
+    def _emit(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            if record["type"] == "run":
+                self._runs[record["run_id"]] = {key: record[key] for key in _RUN_FIELDS}
+                if self.capacity is not None and len(self._runs) > self.capacity:
+                    self._runs.popitem(last=False)
+            elif record["type"] == "run_end":
+                run = self._runs.get(record["run_id"])
+                if run is not None:
+                    run["peak_rss"] = record["peak_rss"]
+            else:
+                if record["type"] == "node":
+                    record = dict(record, id=next(self._ids))
+                self._records.append(record)
+
+    def _of_run(self, kind: str, run_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                record
+                for record in self._records
+                if record["type"] == kind and record["run_id"] == run_id
+            ]
+
+    def fetch_runs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            runs = [dict(run) for run in self._runs.values()]
+        runs.sort(key=lambda run: run["started_at"], reverse=True)
+        return runs[:limit]
+
+    def fetch_nodes(self, run_id: str, limit: int = 500) -> List[Dict[str, Any]]:
+        nodes = sorted(self._of_run("node", run_id), key=lambda node: node["ts"])
+        return [{key: node[key] for key in _NODE_FIELDS} for node in nodes[:limit]]
+
+    def fetch_outputs(self, run_id: str) -> Dict[str, Any]:
+        return _latest_outputs(self._of_run("node", run_id))
+
+    def fetch_contexts(self, run_id: str) -> List[Dict[str, Any]]:
+        versions = sorted(
+            self._of_run("context", run_id), key=lambda version: version["version"]
+        )
+        return [
+            {key: version[key] for key in ("version", "node", "ctx", "ts")}
+            for version in versions
+        ]
+
+
+class NDJSONTrace(_RecordTrace):
+    """
+    Appends records as JSON lines to segment files in directory.
+
+    A process writes one segment at a time, named by its start time and
+    pid with a .part suffix that is dropped once it reaches about
+    segment_bytes or the trace is closed. Writes are buffered and reach
+    the file when a run finishes. Reads replay every segment, which gets
+    slow as they pile up: import finished segments into SQLite with
+    `synapse import-traces` to query them there.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+    ) -> None:
+        super().__init__()
+        self.directory = directory or NDJSON_DIR
+        self.segment_bytes = segment_bytes
+        self._file: Optional[TextIO] = None
+        self._path = ""
+        self._size = 0
+
+    def _emit(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._path = os.path.join(
+                    self.directory, f"{time.time_ns()}-{os.getpid()}.ndjson"
+                )
+                self._file = open(
+                    self._path + PARTIAL, "w", encoding="utf8", buffering=1 << 20
+                )
+                self._size = 0
+            self._file.write(line)
+            self._size += len(line)
+            if self._size >= self.segment_bytes:
+                self._seal()
+
+    def _seal(self) -> None:
+        """Finish the current segment; the next record starts a new one."""
+        if self._file is not None:
+            self._file.close()
+            os.replace(self._path + PARTIAL, self._path)
+            self._file = None
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._seal()
+
+    def _replay(self) -> MemoryTrace:
+        self.flush()
+        memory = MemoryTrace(capacity=None)
+        for path in list_segments(self.directory, partial=True):
+            for record in read_segment(path):
+                memory._emit(record)
+        return memory
+
+    def fetch_runs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return self._replay().fetch_runs(limit)
+
+    def fetch_nodes(self, run_id: str, limit: int = 500) -> List[Dict[str, Any]]:
+        return self._replay().fetch_nodes(run_id, limit)
+
+    def fetch_outputs(self, run_id: str) -> Dict[str, Any]:
+        return self._replay().fetch_outputs(run_id)
+
+    def fetch_contexts(self, run_id: str) -> List[Dict[str, Any]]:
+        return self._replay().fetch_contexts(run_id)
+
+
+def list_segments(directory: Optional[str] = None, partial: bool = False) -> List[str]:
+    """
+    NDJSON segments in directory, oldest first.
+
+    Segments still being written, or left behind by a process that died,
+    keep their .part suffix and are only listed with partial.
+    """
+    directory = directory or NDJSON_DIR
+    paths = glob.glob(os.path.join(directory, "*.ndjson"))
+    if partial:
+        paths += glob.glob(os.path.join(directory, "*.ndjson" + PARTIAL))
+    return sorted(paths, key=os.path.basename)
+
+
+def read_segment(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of a segment; a line cut off by a crash is skipped."""
+    with open(path, encoding="utf8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def import_ndjson(paths: Iterable[str], store: TraceStore) -> int:
+    """
+    Bulk-load NDJSON segments into a SQLite store, in order.
+
+    Records go through the store's usual write path, so payloads end up
+    deduplicated and context versions delta-encoded, with their original
+    timestamps. Returns the number of records imported.
+    """
+    imported = 0
+    for path in paths:
+        for record in read_segment(path):
+            kind = record.get("type")
+            if kind == "run":
+                store.start_run(
+                    record["run_id"],
+                    record["workflow"],
+                    record["parent_run_id"],
+                    ts=record["started_at"],
+                )
+            elif kind == "run_end":
+                store.finish_run(record["run_id"], record["peak_rss"], flush=False)
+            elif kind == "context":
+                store.record_context_version(
+                    record["run_id"],
+                    record["version"],
+                    record["node"],
+                    record["ctx"],
+                    ts=record["ts"],
+                )
+            elif kind == "node":
+                _import_node(store, record)
+            else:
+                continue
+            imported += 1
+    store.flush()
+    return imported
+
+
+def _import_node(store: TraceStore, record: Dict[str, Any]) -> None:
+    common = {
+        "run_id": record["run_id"],
+        "agent_id": record["agent_id"],
+        "name": record["name"],
+        "model": record["model"],
+        "ts": record["ts"],
+    }
+    if record["status"] == "skipped":
+        reason = (record["metadata"] or {}).get("skipped", "")
+        store.record_skip(reason=str(reason), **common)
+    elif record["error"] is not None:
+        store.record_error(
+            error=record["error"].get("error"),
+            stack=record["error"].get("stack"),
+            duration=record["duration"],
+            attempt=record["attempt"],
+            metadata=record["metadata"],
+            status=record["status"],
+            queue_wait=record["queue_wait"],
+            **common,
+        )
+    else:
+        store.record_node(
+            input_ctx=record["input"],
+            output=record["output"],
+            duration=record["duration"],
+            attempt=record["attempt"],
+            metadata=record["metadata"],
+            status=record["status"],
+            queue_wait=record["queue_wait"],
+            **common,
+        )
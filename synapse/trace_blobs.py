@@ -0,0 +1,63 @@
+# synapse/trace_blobs.py
+import hashlib
+import zlib
+from typing import Any, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+# Kinds of blob: a JSON value, or a JSON object mapping keys to the hashes
+# of blobs holding their values
+LEAF = "json"
+TREE = "tree"
+
+# Payloads smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 64
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def blob_hash(kind: str, data: bytes) -> str:
+    """Content address of a blob; the kind is hashed in too."""
+    digest = hashlib.blake2b(kind.encode("utf8"), digest_size=16)
+    digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """
+    Compress a blob with zstd when installed, zlib otherwise.
+
+    Returns:
+        (codec, compressed bytes); codec is "none" when compressing would
+        not make it smaller
+    """
+    if len(data) < MIN_COMPRESS_SIZE:
+        return "none", data
+    if zstandard is not None:
+        codec = "zstd"
+        packed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        codec = "zlib"
+        packed = zlib.compress(data, ZLIB_LEVEL)
+    if len(packed) >= len(data):
+        return "none", data
+    return codec, packed
+
+
+def decompress(codec: str, data: Any) -> bytes:
+    if codec == "none":
+        return bytes(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError(
+                "Trace payload is zstd-compressed; install zstandard to read it"
+            )
+        return bytes(zstandard.ZstdDecompressor().decompress(data))
+    raise ValueError(f"Unknown trace blob codec '{codec}'")
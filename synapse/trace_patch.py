@@ -0,0 +1,92 @@
+# synapse/trace_patch.py
+import json
+from typing import Any, Dict, List, Mapping
+
+# The subset of JSON Patch (RFC 6902) used for context versions: add,
+# remove and replace on object members. Lists and other values are always
+# replaced whole, so paths never index into arrays.
+Patch = List[Dict[str, Any]]
+
+
+def diff(old: Any, new: Any) -> Patch:
+    """
+    Operations turning old into new.
+
+    Values that are the same object are skipped without comparing them,
+    which is what makes diffing contexts cheap: unchanged outputs are
+    shared between versions.
+    """
+    ops: Patch = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+def _diff(old: Any, new: Any, path: str, ops: Patch) -> None:
+    if old is new:
+        return
+    if isinstance(old, Mapping) and isinstance(new, Mapping):
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_token(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_token(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                _diff(old[key], value, child, ops)
+        return
+    if not _same(old, new):
+        ops.append({"op": "replace", "path": path, "value": new})
+
+
+def _same(old: Any, new: Any) -> bool:
+    """Equal and of the same types, since 1 == True == 1.0 in Python."""
+    if old is new:
+        return True
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, (list, tuple)):
+        return len(old) == len(new) and all(map(_same, old, new))
+    if isinstance(old, Mapping):
+        return old.keys() == new.keys() and all(_same(old[k], new[k]) for k in old)
+    return bool(old == new)
+
+
+def apply(doc: Any, ops: Patch) -> Any:
+    """
+    Apply operations from diff to a JSON document.
+
+    doc is not modified: objects along each path are copied, and
+    everything else is shared with the result.
+    """
+    for op in ops:
+        path = op["path"]
+        tokens = [_untoken(t) for t in path.split("/")[1:]] if path else []
+        doc = _apply(doc, tokens, op)
+    return doc
+
+
+def _apply(node: Any, tokens: List[str], op: Dict[str, Any]) -> Any:
+    if not tokens:
+        return op["value"]
+    if not isinstance(node, dict):
+        raise ValueError(f"Cannot apply {op['op']} at {op['path']}: not an object")
+    node = dict(node)
+    head = tokens[0]
+    if len(tokens) > 1:
+        node[head] = _apply(node[head], tokens[1:], op)
+    elif op["op"] == "remove":
+        del node[head]
+    else:
+        node[head] = op["value"]
+    return node
+
+
+def _token(key: Any) -> str:
+    # non-string keys as JSON writes them: 1 -> "1", True -> "true"
+    text = key if isinstance(key, str) else json.dumps(key)
+    return text.replace("~", "~0").replace("/", "~1")
+
+
+def _untoken(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
@@ -0,0 +1,192 @@
+# synapse/trace_schema.py
+import os
+import sqlite3
+from typing import Callable, List
+from urllib.request import pathname2url
+
+# Applied to every connection to the trace database. WAL lets the dashboard
+# and other readers work while runs are writing; with WAL, synchronous=NORMAL
+# only risks the last commits on power loss, never corruption.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def connect(
+    db_path: str, check_same_thread: bool = True, read_only: bool = False
+) -> sqlite3.Connection:
+    """
+    Open the trace database with the pragmas above.
+
+    A read-only connection cannot write to the database at all, and leaves
+    its journal mode and synchronous setting to whoever writes it.
+    """
+    if not read_only:
+        conn = sqlite3.connect(
+            db_path, timeout=30.0, check_same_thread=check_same_thread
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    conn = sqlite3.connect(
+        uri, timeout=30.0, check_same_thread=check_same_thread, uri=True
+    )
+    for pragma in PRAGMAS[2:]:
+        conn.execute(pragma)
+    return conn
+
+
+def _baseline(c: sqlite3.Cursor) -> None:
+    """
+    The tables as of the first versioned schema.
+
+    Databases created before versioning have user_version 0 and may miss
+    columns added since, so those are added here.
+    """
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY,
+            started_at REAL, workflow TEXT, parent_run_id TEXT,
+            peak_rss INTEGER)"""
+    )
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS nodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT,
+            agent_id TEXT,
+            name TEXT,
+            input_json TEXT,
+            output_json TEXT,
+            duration REAL,
+            attempt INTEGER,
+            error TEXT,
+            ts REAL,
+            model TEXT,
+            metadata TEXT,
+            status TEXT,
+            queue_wait REAL
+        )"""
+    )
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS contexts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT,
+            version INTEGER,
+            node_name TEXT,
+            ctx_json TEXT,
+            ts REAL
+        )"""
+    )
+    added = {
+        "nodes": [
+            ("metadata", "TEXT"),
+            # success, error, cached, cancelled or skipped
+            ("status", "TEXT"),
+            # seconds spent ready but waiting for a slot or a model limit
+            ("queue_wait", "REAL"),
+        ],
+        "runs": [
+            # set on runs resumed from an earlier failed run
+            ("parent_run_id", "TEXT"),
+            # bytes, highest resident set size seen while the run executed
+            ("peak_rss", "INTEGER"),
+        ],
+    }
+    for table, columns in added.items():
+        c.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in c.fetchall()}
+        for column, column_type in columns:
+            if column not in existing:
+                c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def _indexes(c: sqlite3.Cursor) -> None:
+    """Indexes for the lookups of TraceStore and the dashboard."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_runs_started_at ON runs (started_at)")
+    c.execute(
+        """CREATE INDEX IF NOT EXISTS idx_runs_workflow
+        ON runs (workflow, started_at)"""
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS idx_nodes_run_id ON nodes (run_id, ts)")
+    c.execute(
+        """CREATE INDEX IF NOT EXISTS idx_contexts_run_id
+        ON contexts (run_id, version)"""
+    )
+
+
+def _blobs(c: sqlite3.Cursor) -> None:
+    """
+    Content-addressed, compressed payloads, see trace_blobs.
+
+    Nodes recorded from here on reference their input and output by hash
+    instead of storing input_json and output_json; older rows keep theirs.
+    """
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            kind TEXT,
+            codec TEXT,
+            size INTEGER,
+            data BLOB
+        ) WITHOUT ROWID"""
+    )
+    c.execute("ALTER TABLE nodes ADD COLUMN input_ref TEXT")
+    c.execute("ALTER TABLE nodes ADD COLUMN output_ref TEXT")
+
+
+def _context_deltas(c: sqlite3.Cursor) -> None:
+    """
+    Context versions stored as patches.
+
+    ctx_json of a row with a base_version holds a JSON patch against that
+    version of the run; rows without one, including all older rows, hold
+    the full context.
+    """
+    c.execute("ALTER TABLE contexts ADD COLUMN base_version INTEGER")
+
+
+# Migration i upgrades a database from user_version i to i + 1. Append new
+# steps at the end and never change released ones.
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [
+    _baseline,
+    _indexes,
+    _blobs,
+    _context_deltas,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring the database up to SCHEMA_VERSION in place.
+
+    Each step runs in its own transaction together with the user_version
+    bump, so an interrupted upgrade resumes from the last completed step.
+    The write lock is taken before the version is read, so processes
+    opening the database at the same time apply each step once. Databases
+    from a newer synapse are left alone.
+
+    Returns:
+        the schema version of the database
+    """
+    c = conn.cursor()
+    while True:
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return int(version)
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            # another process may have migrated while we waited for the lock
+            version = c.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                MIGRATIONS[version](c)
+                c.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
@@ -0,0 +1,135 @@
+# synapse/trace_writer.py
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+from .trace_schema import connect
+
+# How trace records reach the database:
+#   - sync: each record is committed before the call returns
+#   - batched: records are queued and committed in batches by a background
+#     thread; those queued when the process dies are lost
+DURABILITY_MODES = ("sync", "batched")
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 0.2
+
+_Record = Tuple[str, Sequence[Any]]
+
+
+class TraceWriteError(RuntimeError):
+    """The background trace writer failed to commit a batch."""
+
+
+class TraceWriter:
+    """
+    Background writer committing trace records in batched transactions.
+
+    Any thread can queue (sql, params) records. A daemon thread with its own
+    connection commits them once batch_size are waiting or flush_interval
+    seconds after the first of a batch arrived, running consecutive records
+    of the same statement with a single executemany. Records are written in
+    the order they were queued. The records of a batch that failed are
+    passed to on_rollback, on the writer thread.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        on_rollback: Optional[Callable[[List[_Record]], None]] = None,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_rollback = on_rollback
+        # records, flush markers, or None to stop
+        self._queue: "queue.Queue[Union[_Record, threading.Event, None]]" = (
+            queue.Queue()
+        )
+        self._error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = threading.Thread(
+            target=self._run, name="synapse-trace-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, sql: str, params: Sequence[Any]) -> None:
+        if self._thread is None:
+            raise RuntimeError("cannot write trace records after close")
+        self._queue.put((sql, params))
+
+    def flush(self) -> None:
+        """
+        Block until every record queued so far is committed.
+
+        Raises TraceWriteError if a batch failed since the last flush.
+        """
+        thread = self._thread
+        if thread is not None:
+            done = threading.Event()
+            self._queue.put(done)
+            while not done.wait(0.5):
+                if not thread.is_alive():
+                    raise TraceWriteError("Trace writer thread stopped")
+        error, self._error = self._error, None
+        if error is not None:
+            raise TraceWriteError(f"Failed to write trace records: {error}") from error
+
+    def close(self) -> None:
+        """Commit what is queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        conn = connect(self.db_path)
+        try:
+            while True:
+                item: Any = self._queue.get()
+                batch: List[_Record] = []
+                deadline = time.monotonic() + self.flush_interval
+                # collect until full, due, or asked to flush or stop
+                while isinstance(item, tuple):
+                    batch.append(item)
+                    remaining = deadline - time.monotonic()
+                    if len(batch) >= self.batch_size or remaining <= 0:
+                        item = False
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        item = False
+                self._commit(conn, batch)
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is None:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[_Record]) -> None:
+        if not batch:
+            return
+        try:
+            start = 0
+            while start < len(batch):
+                sql = batch[start][0]
+                end = start
+                while end < len(batch) and batch[end][0] == sql:
+                    end += 1
+                conn.executemany(sql, [params for _, params in batch[start:end]])
+                start = end
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            # surfaced by the next flush, e.g. at the end of the run
+            self._error = e
+            if self.on_rollback is not None:
+                self.on_rollback(batch)
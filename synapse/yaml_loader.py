@@ -12,9 +12,25 @@ def load_workflow(path: str) -> Dict[str, Any]:
     New schema:
         workflow:
             name: workflow-name
+            max_concurrency: 4
+            executor: thread | async | process
+            process_workers: 4
+            cache_max_mb: 256
+            release_outputs: drop | spill
+            trace: {durability: batched, batch_size: 256, flush_interval: 0.2}
+            models:
+                gpt-4: {max_concurrency: 2, requests_per_minute: 60, burst: 5}
             agents:
                 - name: AgentName
                   run: agent_file.py
+                  executor: process
+                  cache: {ttl: 3600}
+                  hedge_after: p95
+                  stream: true
+                  map_over: OtherAgent.papers
+                  batch: {max_size: 16, max_wait: 0.05}
+                  when: "OtherAgent.category == 'science'"
+                  inputs: [input, OtherAgent.papers]
                   depends_on: OtherAgent
                   retries: 2
                   model: gpt-4
@@ -62,6 +78,13 @@ def _load_new_schema(doc: Dict[str, Any], workflow_path: str) -> Dict[str, Any]:
         "schema_version": "2.0",
         "workflow_name": workflow.get("name", "unnamed"),
         "agents": agents,
+        "max_concurrency": workflow.get("max_concurrency"),
+        "executor": workflow.get("executor"),
+        "process_workers": workflow.get("process_workers"),
+        "cache_max_mb": workflow.get("cache_max_mb"),
+        "release_outputs": workflow.get("release_outputs"),
+        "trace": workflow.get("trace"),
+        "models": workflow.get("models"),
         "workflow_dir": workflow_dir,
         "workflow_path": workflow_path,
     }
@@ -0,0 +1,56 @@
+# tests/conftest.py
+import textwrap
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+import yaml
+
+from synapse import cache, memory, trace, trace_backends
+
+
+class Project:
+    """Scratch project: agent files and workflows written to a directory."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def agent(self, name: str, source: str) -> str:
+        """Write an agent module and return its file name."""
+        file_name = f"{name}.py"
+        (self.root / file_name).write_text(textwrap.dedent(source))
+        return file_name
+
+    def workflow(
+        self, agents: List[Dict[str, Any]], name: str = "test", **settings: Any
+    ) -> str:
+        """Write a schema 2.0 workflow and return its path."""
+        doc = {"workflow": {"name": name, **settings, "agents": agents}}
+        path = self.root / f"{name}.yaml"
+        path.write_text(yaml.safe_dump(doc, sort_keys=False))
+        return str(path)
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Project:
+    """A Project whose .synapse state (traces, cache, spill) stays in it."""
+    state = tmp_path / ".synapse"
+    state.mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(trace, "DB_PATH", str(state / "synapse_traces.db"))
+    monkeypatch.setattr(cache, "CACHE_DB_PATH", str(state / "cache.db"))
+    monkeypatch.setattr(memory, "SPILL_DIR", str(state / "spill"))
+    monkeypatch.setattr(trace_backends, "NDJSON_DIR", str(state / "traces"))
+    return Project(tmp_path)
+
+
+@pytest.fixture
+def echo_agent(project: Project) -> str:
+    """Agent returning the names of the outputs in its context."""
+    return project.agent(
+        "echo",
+        """
+        def run(context):
+            return {"saw": sorted(context.get("outputs", {}))}
+        """,
+    )
@@ -0,0 +1,56 @@
+# tests/test_agent_loader.py
+import textwrap
+
+from synapse.agent_loader import AgentLoader
+
+
+def _write(path, source):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(source))
+
+
+def test_agents_with_the_same_file_name_keep_their_own_run_batch(tmp_path):
+    _write(
+        tmp_path / "one" / "agent.py",
+        """
+        def run(context):
+            return {"from": "one"}
+
+
+        def run_batch(contexts):
+            return [{"from": "one"} for _ in contexts]
+        """,
+    )
+    _write(
+        tmp_path / "two" / "agent.py",
+        """
+        def run(context):
+            return {"from": "two"}
+        """,
+    )
+
+    one = AgentLoader(str(tmp_path / "one")).load_agent("agent.py")
+    two = AgentLoader(str(tmp_path / "two")).load_agent("agent.py")
+
+    assert one["batch_func"]([{}]) == [{"from": "one"}]
+    assert one["metadata"]["has_batch"]
+    assert two["batch_func"] is None
+    assert two["func"]({}) == {"from": "two"}
+
+
+def test_run_batch_is_read_from_the_agent_file(tmp_path):
+    # run comes from another module, run_batch from the agent file itself
+    _write(
+        tmp_path / "agent.py",
+        """
+        from json import dumps as run
+
+
+        def run_batch(contexts):
+            return [run(context) for context in contexts]
+        """,
+    )
+
+    loaded = AgentLoader(str(tmp_path)).load_agent("agent.py")
+
+    assert loaded["batch_func"]([{"a": 1}]) == ['{"a": 1}']
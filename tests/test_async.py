@@ -0,0 +1,69 @@
+# tests/test_async.py
+import time
+
+import pytest
+
+from synapse.orchestrator import Orchestrator
+
+
+@pytest.fixture
+def agents(project):
+    project.agent(
+        "nap",
+        """
+        import asyncio
+        import threading
+
+
+        async def run(context):
+            await asyncio.sleep(0.2)
+            return {"thread": threading.current_thread().name}
+        """,
+    )
+    project.agent(
+        "where",
+        """
+        import threading
+
+
+        def run(context):
+            return {"thread": threading.current_thread().name}
+        """,
+    )
+
+
+def _workflow(project, executor):
+    return project.workflow(
+        [
+            {"name": "A", "run": "nap.py"},
+            {"name": "B", "run": "nap.py"},
+            {"name": "C", "run": "where.py", "depends_on": ["A", "B"]},
+        ],
+        executor=executor,
+        max_concurrency=2,
+    )
+
+
+def test_async_agents_share_one_event_loop(project, agents):
+    with Orchestrator(_workflow(project, "async")) as orchestrator:
+        start = time.monotonic()
+        outputs = orchestrator.run("hi")["final_context"]["outputs"]
+        elapsed = time.monotonic() - start
+
+    # both naps overlap on the loop's thread; the sync agent gets a worker
+    assert elapsed < 0.35
+    assert outputs["A"]["thread"] == outputs["B"]["thread"]
+    assert outputs["C"]["thread"].startswith("synapse-sync-agent")
+
+
+def test_async_agents_also_run_in_thread_mode(project, agents):
+    with Orchestrator(_workflow(project, "thread")) as orchestrator:
+        outputs = orchestrator.run("hi")["final_context"]["outputs"]
+
+    assert sorted(outputs) == ["A", "B", "C"]
+    assert outputs["C"]["thread"].startswith("synapse-agent")
+
+
+def test_unknown_executor_is_rejected(project, agents):
+    with pytest.raises(ValueError):
+        Orchestrator(_workflow(project, "fibers"))
@@ -0,0 +1,80 @@
+# tests/test_batching.py
+import pytest
+
+from synapse.batching import MicroBatcher
+from synapse.orchestrator import Orchestrator
+
+
+def test_calls_are_grouped_up_to_max_size():
+    sizes = []
+
+    def run_batch(contexts):
+        sizes.append(len(contexts))
+        return [{"n": context["n"] * 2} for context in contexts]
+
+    batcher = MicroBatcher("A", run_batch, max_size=2, max_wait=1.0)
+    futures = [batcher.submit({"n": n}) for n in range(3)]
+    # a full batch goes out at once; the last call waits for max_wait or close
+    assert futures[1].result(timeout=0.5) == {"n": 2}
+    batcher.close()
+
+    assert [future.result(timeout=1) for future in futures] == [
+        {"n": 0},
+        {"n": 2},
+        {"n": 4},
+    ]
+    assert sizes == [2, 1]
+    with pytest.raises(RuntimeError):
+        batcher.submit({"n": 3})
+
+
+def test_a_bad_batch_fails_every_call_in_it():
+    batcher = MicroBatcher("A", lambda contexts: [{}], max_size=2, max_wait=0)
+    futures = [batcher.submit({}), batcher.submit({})]
+    batcher.close()
+
+    for future in futures:
+        with pytest.raises(ValueError, match="returned 1 outputs for 2 contexts"):
+            future.result(timeout=1)
+
+
+def test_map_items_are_sent_to_run_batch(project):
+    project.agent(
+        "items",
+        """
+        def run(context):
+            return {"values": list(range(6))}
+        """,
+    )
+    project.agent(
+        "square",
+        """
+        def run(context):
+            raise AssertionError("called one at a time")
+
+
+        def run_batch(contexts):
+            with open("batches.txt", "a") as f:
+                f.write(f"{len(contexts)}\\n")
+            return [context["item"] ** 2 for context in contexts]
+        """,
+    )
+    path = project.workflow(
+        [
+            {"name": "Source", "run": "items.py"},
+            {
+                "name": "Square",
+                "run": "square.py",
+                "depends_on": "Source",
+                "map_over": "Source.values",
+                "batch": {"max_size": 3, "max_wait": 0.2},
+            },
+        ],
+        max_concurrency=6,
+    )
+    with Orchestrator(path) as orchestrator:
+        outputs = orchestrator.run("hi")["final_context"]["outputs"]
+
+    assert outputs["Square"] == {"items": [0, 1, 4, 9, 16, 25]}
+    batches = (project.root / "batches.txt").read_text().split()
+    assert sorted(map(int, batches)) == [3, 3]
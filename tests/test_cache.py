@@ -0,0 +1,110 @@
+# tests/test_cache.py
+import json
+import sqlite3
+import time
+
+import pytest
+
+from synapse.cache import ResultCache, cache_key
+from synapse.orchestrator import Orchestrator
+
+
+def test_key_covers_source_model_and_inputs():
+    key = cache_key("src", "gpt-4", {"input": "hi"})
+    assert key == cache_key("src", "gpt-4", {"input": "hi"})
+    assert key != cache_key("src2", "gpt-4", {"input": "hi"})
+    assert key != cache_key("src", "mock", {"input": "hi"})
+    assert key != cache_key("src", "gpt-4", {"input": "bye"})
+
+
+@pytest.fixture
+def open_cache(tmp_path):
+    """Open ResultCaches in tmp_path; they are closed after the test."""
+    caches = []
+
+    def open_cache(**kwargs):
+        caches.append(ResultCache(str(tmp_path / "cache.db"), **kwargs))
+        return caches[-1]
+
+    yield open_cache
+    for cache in caches:
+        cache.close()
+
+
+def test_entries_expire_after_their_ttl(open_cache):
+    cache = open_cache()
+    cache.put("k", {"value": 1}, duration=2.5)
+
+    assert cache.get("k") == ({"value": 1}, 2.5)
+    time.sleep(0.05)
+    assert cache.get("k", ttl=0.01) is None
+    # expired entries are deleted, not just hidden
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entries_are_evicted(open_cache):
+    entry = {"data": "x" * 40}
+    size = len(json.dumps(entry))
+    cache = open_cache(max_bytes=2 * size)
+    cache.put("a", entry, 1.0)
+    time.sleep(0.01)
+    cache.put("b", entry, 1.0)
+    time.sleep(0.01)
+    cache.get("a")
+    cache.put("c", entry, 1.0)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    # a single output larger than the cache is never stored
+    cache.put("huge", {"data": "x" * 3 * size}, 1.0)
+    assert cache.get("huge") is None
+
+
+def test_workflow_reuses_cached_outputs(project):
+    project.agent(
+        "counted",
+        """
+        def run(context):
+            with open("calls.txt", "a") as f:
+                f.write("call\\n")
+            return {"echo": context["input"]}
+        """,
+    )
+    path = project.workflow([{"name": "A", "run": "counted.py", "cache": True}])
+
+    for _ in range(2):
+        with Orchestrator(path) as orchestrator:
+            result = orchestrator.run("hi")
+            statuses = [r["status"] for r in orchestrator.execution_results]
+    with Orchestrator(path) as orchestrator:
+        orchestrator.run("other input")
+
+    calls = (project.root / "calls.txt").read_text().split()
+    # the second run hit the cache, a new input missed it
+    assert len(calls) == 2
+    assert statuses == ["cached"]
+    assert result["final_context"]["outputs"]["A"] == {"echo": "hi"}
+
+
+def test_closed_cache_misses_and_stores_nothing(open_cache):
+    cache = open_cache()
+    cache.put("k", {"value": 1}, 1.0)
+    cache.close()
+    cache.close()
+
+    assert cache.get("k") is None
+    # e.g. a hedge loser finishing after the orchestrator closed
+    cache.put("late", {"value": 2}, 1.0)
+    assert open_cache().get("k") == ({"value": 1}, 1.0)
+
+
+def test_orchestrator_closes_its_cache(project, echo_agent):
+    path = project.workflow([{"name": "A", "run": echo_agent, "cache": True}])
+    with Orchestrator(path) as orchestrator:
+        orchestrator.run("hi")
+        cache = orchestrator.cache
+
+    assert cache is not None and orchestrator.cache is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        cache.conn.execute("SELECT 1")
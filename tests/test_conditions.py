@@ -0,0 +1,139 @@
+# tests/test_conditions.py
+import pytest
+
+from synapse.conditions import Condition, ConditionError
+from synapse.orchestrator import Orchestrator
+
+
+def test_condition_reads_outputs_and_context_keys():
+    condition = Condition("Classify.category == 'science' and len(input) > 2")
+
+    assert condition.names == {"Classify", "input"}
+    assert condition.evaluate(
+        {"input": "abc", "outputs": {"Classify": {"category": "science"}}}
+    )
+    assert not condition.evaluate({"input": "abc", "outputs": {}})
+
+
+def test_condition_names_agents_read_through_outputs():
+    condition = Condition("outputs.A.flag or outputs['B'] or outputs[input]")
+
+    # a computed key names no agent
+    assert condition.names == {"outputs", "input", "A", "B"}
+
+
+@pytest.mark.parametrize(
+    "source", ["__import__('os')", "input.__class__()", "[x for x in input]", "a ** b"]
+)
+def test_condition_rejects_anything_but_expressions(source):
+    with pytest.raises(ConditionError):
+        Condition(source)
+
+
+def _statuses(orchestrator):
+    return {r["agent_name"]: r["status"] for r in orchestrator.execution_results}
+
+
+def test_false_condition_skips_the_agent_and_its_only_dependents(project, echo_agent):
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent, "depends_on": "A", "when": "A.saw"},
+            {"name": "C", "run": echo_agent, "depends_on": "B"},
+            {"name": "D", "run": echo_agent, "depends_on": ["A", "B"]},
+        ]
+    )
+
+    with Orchestrator(path, trace="memory") as orchestrator:
+        orchestrator.run("hi")
+
+    assert _statuses(orchestrator) == {
+        "A": "success",
+        "B": "skipped",
+        "C": "skipped",
+        "D": "success",
+    }
+
+
+def test_condition_may_only_name_ancestors(project, echo_agent):
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent},
+            {"name": "C", "run": echo_agent, "depends_on": "A", "when": "B"},
+        ]
+    )
+
+    with pytest.raises(ValueError, match="when: reads B"):
+        Orchestrator(path, trace="memory").run("hi")
+
+
+def test_condition_only_sees_ancestor_outputs(project, echo_agent):
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent},
+            {
+                "name": "C",
+                "run": echo_agent,
+                "depends_on": "A",
+                "when": "len(outputs) == 1",
+            },
+            # the longer path through B makes it run before C
+            {"name": "D", "run": echo_agent, "depends_on": "B"},
+            {"name": "E", "run": echo_agent, "depends_on": "D"},
+        ],
+        max_concurrency=1,
+    )
+
+    with Orchestrator(path, trace="memory") as orchestrator:
+        orchestrator.run("hi")
+
+    # B finished before C was considered, but is not its ancestor
+    assert _statuses(orchestrator)["C"] == "success"
+
+
+def test_condition_keeps_released_ancestors(project, echo_agent):
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent, "depends_on": "A", "inputs": "input"},
+            {
+                "name": "C",
+                "run": echo_agent,
+                "depends_on": "B",
+                "inputs": "input",
+                "when": "A is not None",
+            },
+        ],
+        release_outputs="drop",
+    )
+
+    with Orchestrator(path, trace="memory") as orchestrator:
+        orchestrator.run("hi")
+
+    assert _statuses(orchestrator)["C"] == "success"
+
+
+@pytest.mark.parametrize("release", ["drop", "spill"])
+def test_condition_keeps_ancestors_read_through_outputs(project, echo_agent, release):
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent, "depends_on": "A", "inputs": "input"},
+            {
+                "name": "C",
+                "run": echo_agent,
+                "depends_on": "B",
+                "inputs": "input",
+                "when": "outputs.A is not None and outputs['A'].saw == []",
+            },
+        ],
+        release_outputs=release,
+        max_concurrency=1,
+    )
+
+    with Orchestrator(path, trace="memory") as orchestrator:
+        orchestrator.run("hi")
+
+    assert _statuses(orchestrator)["C"] == "success"
@@ -0,0 +1,54 @@
+# tests/test_context.py
+import json
+import pickle
+
+import pytest
+
+from synapse.context import FrozenDict, RunContext
+
+
+def test_snapshots_are_not_changed_by_later_outputs():
+    context = RunContext({"input": "hi"})
+    context.set_output("A", {"value": 1})
+    before = context.snapshot("A")
+    context.set_output("B", {"value": 2})
+
+    assert sorted(before["outputs"]) == ["A"]
+    assert before["last_output"] == {"value": 1}
+    assert sorted(context.snapshot()["outputs"]) == ["A", "B"]
+
+
+def test_outputs_are_shared_not_copied():
+    context = RunContext({"input": "hi"})
+    output = {"papers": [1, 2, 3]}
+    context.set_output("A", output)
+    context.set_output("B", {})
+
+    assert context.snapshot()["outputs"]["A"] is output
+
+
+def test_last_output_follows_the_named_dependency():
+    context = RunContext({"input": "hi"})
+    context.set_output("A", "a")
+    context.set_output("B", "b")
+
+    assert context.snapshot("A")["last_output"] == "a"
+    assert "last_output" not in context.snapshot()
+    # the run result keeps the latest output, as before
+    assert context.to_dict()["last_output"] == "b"
+
+
+def test_namespaces_are_read_only():
+    outputs = RunContext({"input": "hi"}).snapshot()["outputs"]
+    with pytest.raises(TypeError):
+        outputs["A"] = 1
+    with pytest.raises(TypeError):
+        outputs.update(A=1)
+
+
+def test_frozen_dicts_serialize_like_dicts():
+    frozen = FrozenDict({"A": {"value": 1}})
+    copy = pickle.loads(pickle.dumps(frozen))
+
+    assert type(copy) is FrozenDict and copy == frozen
+    assert json.loads(json.dumps(frozen)) == {"A": {"value": 1}}
@@ -0,0 +1,57 @@
+# tests/test_durations.py
+from synapse.dependency_graph import DependencyGraph
+from synapse.orchestrator import Orchestrator
+from synapse.scheduler import DagScheduler
+
+
+def test_priors_are_read_once_and_updated_from_runs(project, echo_agent):
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent, "depends_on": "A"},
+        ]
+    )
+    with Orchestrator(path) as orchestrator:
+        orchestrator.run("warm up")
+    calls = []
+
+    with Orchestrator(path) as orchestrator:
+        fetch = orchestrator.trace.fetch_durations
+
+        def counting_fetch(*args, **kwargs):
+            calls.append(args)
+            return fetch(*args, **kwargs)
+
+        orchestrator.trace.fetch_durations = counting_fetch
+        results = list(orchestrator.run_many(["a", "b", "c"], max_runs=1))
+        priors = orchestrator._duration_priors()
+
+    assert [r["error"] for r in results] == [None, None, None]
+    assert len(calls) == 1
+    # the warm-up run from the trace plus the three runs of the batch
+    assert len(priors["A"]) == len(priors["B"]) == 4
+
+
+def test_longest_remaining_path_runs_first():
+    graph = DependencyGraph(
+        [
+            {"name": "Short"},
+            {"name": "Long"},
+            {"name": "Tail", "depends_on": "Long"},
+            {"name": "Unknown"},
+        ]
+    )
+    scheduler = DagScheduler(
+        graph, max_concurrency=1, estimates={"Short": 5.0, "Long": 2.0, "Tail": 4.0}
+    )
+    started = []
+
+    def prepare(name, attempt, hedge):
+        started.append(name)
+        return lambda: None
+
+    scheduler.run(prepare, lambda name, attempt, future: None)
+
+    # Long + Tail = 6 beats Short = 5; Unknown is assumed to take the median, 4
+    assert scheduler.priorities()["Unknown"] == 4.0
+    assert started[:2] == ["Long", "Short"]
@@ -0,0 +1,59 @@
+# tests/test_hedging.py
+import time
+
+import pytest
+
+from synapse.orchestrator import Orchestrator, parse_hedge_after
+
+
+def test_hedge_after_is_seconds_or_a_percentile():
+    assert parse_hedge_after("A", 2.5) == ("after", 2.5)
+    assert parse_hedge_after("A", "p95") == ("percentile", 95.0)
+    for bad in ("p100", "pfast", 0):
+        with pytest.raises(ValueError):
+            parse_hedge_after("A", bad)
+
+
+@pytest.fixture
+def straggler(project):
+    """Agent whose first call is slow and later ones are fast."""
+    return project.agent(
+        "straggler",
+        """
+        import time
+
+        calls = []
+
+
+        def run(context):
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.6)
+            return {"call": len(calls)}
+        """,
+    )
+
+
+def test_duplicate_of_a_slow_attempt_wins(project, straggler):
+    path = project.workflow([{"name": "A", "run": straggler, "hedge_after": 0.1}])
+    with Orchestrator(path) as orchestrator:
+        start = time.monotonic()
+        result = orchestrator.run("hi")
+        elapsed = time.monotonic() - start
+        results = orchestrator.execution_results
+        nodes = orchestrator.trace.fetch_nodes(result["run_id"])
+
+    assert elapsed < 0.5
+    assert result["final_context"]["outputs"]["A"] == {"call": 2}
+    assert results[0]["hedged"] is True
+    assert [node["metadata"].get("hedge") for node in nodes] == [True]
+
+
+def test_percentile_waits_for_enough_history(project, straggler):
+    path = project.workflow([{"name": "A", "run": straggler, "hedge_after": "p50"}])
+    with Orchestrator(path) as orchestrator:
+        orchestrator._instantiate_agents()
+        assert orchestrator._hedge_delays({"A": [1.0, 2.0, 3.0, 4.0]}) == {}
+        delays = orchestrator._hedge_delays({"A": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]})
+
+    assert delays == {"A": 3.5}
@@ -0,0 +1,79 @@
+# tests/test_inputs.py
+import pytest
+
+from synapse.context import project as project_context
+from synapse.orchestrator import Orchestrator
+
+
+def test_projection_keeps_nesting_and_skips_missing_parts():
+    context = {
+        "input": "hi",
+        "outputs": {"Research": {"papers": [1, 2], "notes": "long"}},
+    }
+    projected = project_context(
+        context,
+        [["input"], ["outputs", "Research", "papers"], ["outputs", "Gone"]],
+    )
+
+    assert projected == {"input": "hi", "outputs": {"Research": {"papers": [1, 2]}}}
+    # values are shared, not copied
+    assert (
+        projected["outputs"]["Research"]["papers"]
+        is context["outputs"]["Research"]["papers"]
+    )
+
+
+@pytest.fixture
+def agents(project):
+    project.agent(
+        "research",
+        """
+        def run(context):
+            return {"papers": ["p1", "p2"], "notes": "x" * 1000}
+        """,
+    )
+    project.agent(
+        "show",
+        """
+        def run(context):
+            return {"context": context}
+        """,
+    )
+
+
+def test_agent_gets_and_traces_only_its_inputs(project, agents):
+    path = project.workflow(
+        [
+            {"name": "Research", "run": "research.py"},
+            {"name": "Other", "run": "research.py"},
+            {
+                "name": "Write",
+                "run": "show.py",
+                "depends_on": ["Research", "Other"],
+                "inputs": ["input", "Research.papers", "Research"],
+            },
+        ]
+    )
+    with Orchestrator(path) as orchestrator:
+        result = orchestrator.run("hi")
+        nodes = orchestrator.trace.fetch_nodes(result["run_id"])
+
+    seen = result["final_context"]["outputs"]["Write"]["context"]
+    # Research.papers is covered by the whole Research output
+    assert sorted(seen) == ["input", "outputs"]
+    assert sorted(seen["outputs"]) == ["Research"]
+    assert seen["outputs"]["Research"]["notes"] == "x" * 1000
+    traced = next(node for node in nodes if node["name"] == "Write")["input"]
+    assert traced == seen
+
+
+def test_inputs_must_be_context_keys_or_ancestors(project, agents):
+    path = project.workflow(
+        [
+            {"name": "Research", "run": "research.py"},
+            {"name": "Write", "run": "show.py", "inputs": ["Research.papers"]},
+        ]
+    )
+    with pytest.raises(ValueError, match="input 'Research.papers'"):
+        with Orchestrator(path) as orchestrator:
+            orchestrator.run("hi")
@@ -0,0 +1,67 @@
+# tests/test_limits.py
+import threading
+import time
+
+from synapse.dependency_graph import DependencyGraph
+from synapse.limits import ModelLimiter
+from synapse.scheduler import DagScheduler
+
+
+def test_concurrency_cap_per_model():
+    limiter = ModelLimiter({"gpt-4": {"max_concurrency": 1}})
+    assert limiter.acquire("gpt-4") is None
+    assert limiter.acquire("gpt-4") == 0.0
+    # models without an entry are not limited
+    assert limiter.acquire("mock") is None
+    limiter.release("gpt-4")
+    assert limiter.acquire("gpt-4") is None
+
+
+def test_rate_limit_allows_a_burst_then_waits():
+    limiter = ModelLimiter({"gpt-4": {"requests_per_minute": 60, "burst": 2}})
+    assert limiter.acquire("gpt-4") is None
+    assert limiter.acquire("gpt-4") is None
+    wait = limiter.acquire("gpt-4")
+    assert wait is not None and 0.9 < wait <= 1.0
+
+
+def test_workflow_settings_override_project_ones():
+    limiter = ModelLimiter.from_config(
+        {"gpt-4": {"max_concurrency": 4, "requests_per_minute": 60}},
+        {"gpt-4": {"max_concurrency": 1}},
+    )
+    assert limiter.max_concurrency == {"gpt-4": 1}
+    assert "gpt-4" in limiter.buckets
+    assert not ModelLimiter()
+
+
+def test_capped_agents_wait_without_taking_a_slot():
+    graph = DependencyGraph([{"name": name} for name in ("A", "B", "C")])
+    models = {"A": "gpt-4", "B": "gpt-4", "C": "mock"}
+    limiter = ModelLimiter({"gpt-4": {"max_concurrency": 1}})
+    running = {"gpt-4": 0}
+    peak = {"gpt-4": 0}
+    started = []
+    lock = threading.Lock()
+
+    def prepare(name, attempt, hedge):
+        started.append(name)
+
+        def task():
+            if models[name] == "gpt-4":
+                with lock:
+                    running["gpt-4"] += 1
+                    peak["gpt-4"] = max(peak["gpt-4"], running["gpt-4"])
+                time.sleep(0.1)
+                with lock:
+                    running["gpt-4"] -= 1
+
+        return task
+
+    scheduler = DagScheduler(graph, max_concurrency=2, models=models, limiter=limiter)
+    scheduler.run(prepare, lambda name, attempt, future: None)
+
+    assert peak["gpt-4"] == 1
+    # C went ahead of the gpt-4 agent that was waiting for the cap
+    assert started.index("C") < 2
+    assert max(scheduler.queue_waits["A"], scheduler.queue_waits["B"]) > 0.05
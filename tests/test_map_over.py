@@ -0,0 +1,83 @@
+# tests/test_map_over.py
+import pytest
+
+from synapse.orchestrator import Orchestrator
+
+
+@pytest.fixture
+def agents(project):
+    project.agent(
+        "papers",
+        """
+        def run(context):
+            return {"papers": [1, 2, 3]}
+        """,
+    )
+    project.agent(
+        "double",
+        """
+        import os
+
+
+        def run(context):
+            # the second item fails once, and only it is retried
+            if context["item_index"] == 1 and not os.path.exists("retried"):
+                open("retried", "w").close()
+                raise RuntimeError("flaky")
+            return context["item"] * 2
+        """,
+    )
+    project.agent(
+        "total",
+        """
+        def run(context):
+            return {"total": sum(context["outputs"]["Map"]["items"])}
+        """,
+    )
+
+
+def test_items_are_mapped_retried_and_reduced(project, agents):
+    path = project.workflow(
+        [
+            {"name": "Source", "run": "papers.py"},
+            {
+                "name": "Map",
+                "run": "double.py",
+                "depends_on": "Source",
+                "map_over": "Source.papers",
+                "backoff": {"base": 0, "jitter": "none"},
+            },
+            {"name": "Reduce", "run": "total.py", "depends_on": "Map"},
+        ],
+        max_concurrency=3,
+    )
+    with Orchestrator(path) as orchestrator:
+        result = orchestrator.run("hi")
+        nodes = orchestrator.trace.fetch_nodes(result["run_id"])
+
+    outputs = result["final_context"]["outputs"]
+    assert outputs["Map"] == {"items": [2, 4, 6]}
+    assert outputs["Reduce"] == {"total": 12}
+    attempts = sorted(
+        (node["metadata"]["map_index"], node["attempt"], node["status"])
+        for node in nodes
+        if node["name"] == "Map" and "map_index" in node["metadata"]
+    )
+    assert attempts == [
+        (0, 1, "success"),
+        (1, 1, "error"),
+        (1, 2, "success"),
+        (2, 1, "success"),
+    ]
+
+
+def test_source_must_be_a_dependency(project, agents):
+    path = project.workflow(
+        [
+            {"name": "Source", "run": "papers.py"},
+            {"name": "Map", "run": "double.py", "map_over": "Source.papers"},
+        ]
+    )
+    with pytest.raises(ValueError, match="depends_on"):
+        with Orchestrator(path) as orchestrator:
+            orchestrator.run("hi")
@@ -0,0 +1,71 @@
+# tests/test_process.py
+import os
+
+import pytest
+
+from synapse.agent import AgentExecutionError
+from synapse.executors import RemoteAgentError
+from synapse.orchestrator import Orchestrator
+
+
+@pytest.fixture
+def agents(project):
+    project.agent(
+        "pid",
+        """
+        import os
+
+
+        def run(context):
+            return {"pid": os.getpid()}
+        """,
+    )
+    project.agent(
+        "bad",
+        """
+        def run(context):
+            raise KeyError("missing")
+        """,
+    )
+
+
+def test_process_agents_run_in_preforked_workers(project, agents):
+    path = project.workflow(
+        [
+            {"name": "A", "run": "pid.py"},
+            {"name": "B", "run": "pid.py", "depends_on": "A"},
+            {"name": "C", "run": "pid.py", "depends_on": "B", "executor": "thread"},
+        ],
+        executor="process",
+        process_workers=1,
+    )
+    with Orchestrator(path) as orchestrator:
+        outputs = orchestrator.run("hi")["final_context"]["outputs"]
+
+    # one worker serves both process agents; the thread agent stays here
+    assert outputs["A"]["pid"] == outputs["B"]["pid"] != os.getpid()
+    assert outputs["C"]["pid"] == os.getpid()
+
+
+def test_worker_errors_keep_their_type(project, agents):
+    path = project.workflow(
+        [
+            {
+                "name": "A",
+                "run": "bad.py",
+                "executor": "process",
+                "retries": 1,
+                "retry_on": ["KeyError"],
+                "backoff": {"base": 0, "jitter": "none"},
+            }
+        ]
+    )
+    with Orchestrator(path) as orchestrator:
+        with pytest.raises(AgentExecutionError) as raised:
+            orchestrator.run("hi")
+
+    error = raised.value.last_error
+    assert isinstance(error, RemoteAgentError)
+    assert error.remote_type == "KeyError"
+    # retry_on matched the worker's error type, so it was retried
+    assert raised.value.result.attempts == 2
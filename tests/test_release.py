@@ -0,0 +1,163 @@
+# tests/test_release.py
+from typing import Any, Dict
+
+from synapse.orchestrator import Orchestrator
+
+
+def _run(path: str, prompt: str = "hi") -> Dict[str, Any]:
+    with Orchestrator(path, trace="memory") as orchestrator:
+        return orchestrator.run(prompt)
+
+
+def test_declared_input_of_an_ancestor_outlives_the_direct_dependent(project):
+    project.agent(
+        "value",
+        """
+        def run(context):
+            return {"value": len(context.get("outputs", {}))}
+        """,
+    )
+    project.agent(
+        "read",
+        """
+        def run(context):
+            return {"a": context["outputs"].get("A"), "b": context["outputs"]["B"]}
+        """,
+    )
+    path = project.workflow(
+        [
+            {"name": "A", "run": "value.py"},
+            {"name": "B", "run": "value.py", "depends_on": "A"},
+            {"name": "C", "run": "read.py", "depends_on": "B", "inputs": ["A", "B"]},
+        ],
+        release_outputs="drop",
+        max_concurrency=1,
+    )
+
+    result = _run(path)
+
+    outputs = result["final_context"]["outputs"]
+    assert outputs["C"] == {"a": {"value": 0}, "b": {"value": 1}}
+    # C was the last reader of both
+    assert set(outputs) == {"C"}
+
+
+def test_agents_without_inputs_keep_every_ancestor(project, echo_agent):
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent, "depends_on": "A"},
+            {"name": "C", "run": echo_agent, "depends_on": "B"},
+        ],
+        release_outputs="drop",
+    )
+
+    outputs = _run(path)["final_context"]["outputs"]
+
+    assert outputs["C"] == {"saw": ["A", "B"]}
+
+
+def test_cache_key_sees_released_ancestors(project, echo_agent):
+    agents = [
+        {"name": "A", "run": echo_agent},
+        {"name": "B", "run": echo_agent, "depends_on": "A"},
+        {"name": "C", "run": echo_agent, "depends_on": "B", "cache": True},
+    ]
+    kept = project.workflow(agents, name="kept")
+    dropped = project.workflow(agents, name="dropped", release_outputs="drop")
+
+    with Orchestrator(kept, trace="memory") as orchestrator:
+        orchestrator.run("hi")
+    with Orchestrator(dropped, trace="memory") as orchestrator:
+        orchestrator.run("hi")
+        results = {r["agent_name"]: r for r in orchestrator.get_execution_results()}
+
+    assert results["C"]["status"] == "cached"
+
+
+def test_unread_outputs_are_released_early(project, echo_agent):
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent, "depends_on": "A", "inputs": "input"},
+            {"name": "C", "run": echo_agent, "depends_on": "B", "inputs": "input"},
+        ],
+        release_outputs="drop",
+    )
+
+    with Orchestrator(path, trace="memory") as orchestrator:
+        run_id = orchestrator.run("hi")["run_id"]
+        versions = orchestrator.trace.fetch_contexts(run_id)
+
+    # A is gone once B, its only reader, has finished
+    before_c = next(v["ctx"] for v in versions if v["node"] == "C")
+    assert set(before_c["outputs"]) == {"B"}
+
+
+def test_spilled_outputs_are_read_back_at_the_end(project, echo_agent):
+    project.agent(
+        "spilled",
+        """
+        import os
+
+
+        def run(context):
+            spill = os.path.join(".synapse", "spill")
+            return {
+                "files": sorted(
+                    name for _, _, names in os.walk(spill) for name in names
+                )
+            }
+        """,
+    )
+    path = project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent, "depends_on": "A", "inputs": "input"},
+            {"name": "C", "run": "spilled.py", "depends_on": "B", "inputs": "input"},
+        ],
+        release_outputs="spill",
+    )
+
+    result = _run(path)
+
+    outputs = result["final_context"]["outputs"]
+    # B is still read by C, its dependent
+    assert outputs["C"] == {"files": ["A.pkl"]}
+    assert outputs["A"] == {"saw": []}
+    assert outputs["B"] == {"saw": []}
+    assert not (project.root / ".synapse" / "spill" / result["run_id"]).exists()
+
+
+def test_outputs_that_are_not_json_are_spilled_or_kept(project):
+    project.agent(
+        "values",
+        """
+        def run(context):
+            return {"tags": {"a", "b"}}
+        """,
+    )
+    project.agent(
+        "locked",
+        """
+        import threading
+
+
+        def run(context):
+            return {"lock": threading.Lock()}
+        """,
+    )
+    path = project.workflow(
+        [
+            {"name": "A", "run": "values.py"},
+            {"name": "L", "run": "locked.py"},
+            {"name": "B", "run": "values.py", "depends_on": ["A", "L"]},
+        ],
+        release_outputs="spill",
+    )
+
+    outputs = _run(path)["final_context"]["outputs"]
+
+    # A went through a pickle, L could not and stayed in memory
+    assert outputs["A"] == {"tags": {"a", "b"}}
+    assert type(outputs["L"]["lock"]).__name__ == "lock"
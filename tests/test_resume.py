@@ -0,0 +1,82 @@
+# tests/test_resume.py
+import pytest
+
+from synapse.orchestrator import Orchestrator
+
+
+@pytest.fixture
+def chain(project):
+    """A -> B -> C where B and C fail until their flag file exists."""
+    project.agent(
+        "count",
+        """
+        def run(context):
+            with open("calls.txt", "a") as f:
+                f.write("A\\n")
+            return {"value": 1}
+        """,
+    )
+    project.agent(
+        "gated",
+        """
+        import os
+
+
+        def run(context):
+            outputs = context["outputs"]
+            flag = "c_ok" if "B" in outputs else "b_ok"
+            if not os.path.exists(flag):
+                raise RuntimeError(f"missing {flag}")
+            return {"saw": sorted(outputs)}
+        """,
+    )
+    return project.workflow(
+        [
+            {"name": "A", "run": "count.py"},
+            {"name": "B", "run": "gated.py", "depends_on": "A", "retries": 0},
+            {"name": "C", "run": "gated.py", "depends_on": "B", "retries": 0},
+        ]
+    )
+
+
+def _statuses(orchestrator):
+    return {r["agent_name"]: r["status"] for r in orchestrator.execution_results}
+
+
+def test_resume_runs_only_what_failed(project, chain):
+    with Orchestrator(chain) as first:
+        with pytest.raises(Exception):
+            first.run("hi")
+    (project.root / "b_ok").touch()
+    (project.root / "c_ok").touch()
+
+    with Orchestrator(chain) as resumed:
+        result = resumed.resume(first.run_id)
+        parent = resumed.state.parent_run_id
+
+    assert parent == first.run_id
+    assert _statuses(resumed) == {"B": "success", "C": "success"}
+    assert result["final_context"]["outputs"]["A"] == {"value": 1}
+    assert (project.root / "calls.txt").read_text() == "A\n"
+
+
+def test_resume_a_resumed_run(project, chain):
+    with Orchestrator(chain) as first:
+        with pytest.raises(Exception):
+            first.run("hi")
+    (project.root / "b_ok").touch()
+    with Orchestrator(chain) as second:
+        with pytest.raises(Exception):
+            second.resume(first.run_id)
+    assert _statuses(second) == {"B": "success", "C": "failed"}
+    (project.root / "c_ok").touch()
+
+    with Orchestrator(chain) as third:
+        result = third.resume(second.run_id)
+
+    # A was reused by the second run and must not run again
+    assert _statuses(third) == {"C": "success"}
+    assert (project.root / "calls.txt").read_text() == "A\n"
+    outputs = result["final_context"]["outputs"]
+    assert outputs["C"] == {"saw": ["A", "B"]}
+    assert third.state is not None and third.state.reused == {"A", "B"}
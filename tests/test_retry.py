@@ -0,0 +1,58 @@
+# tests/test_retry.py
+import time
+
+import pytest
+
+from synapse.dependency_graph import DependencyGraph
+from synapse.retry import RetryPolicy
+from synapse.scheduler import DagScheduler
+
+
+def test_backoff_doubles_up_to_the_cap():
+    policy = RetryPolicy(retries=5, base=0.5, cap=3.0, jitter="none")
+    assert [policy.delay(n) for n in range(1, 6)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+
+@pytest.mark.parametrize("jitter, low", [("full", 0.0), ("equal", 1.0)])
+def test_jitter_stays_within_the_delay(jitter, low):
+    policy = RetryPolicy(base=2.0, cap=10.0, jitter=jitter)
+    delays = [policy.delay(1) for _ in range(200)]
+    assert all(low <= delay <= 2.0 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_unknown_jitter_is_rejected():
+    with pytest.raises(ValueError, match="Unknown jitter"):
+        RetryPolicy(jitter="some")
+
+
+def test_retry_on_matches_exception_type_names():
+    policy = RetryPolicy.from_config(
+        {"retries": 2, "retry_on": "TimeoutError", "backoff": {"jitter": "none"}}
+    )
+    assert policy.should_retry(TimeoutError(), 1)
+    # subclasses match through their MRO
+    assert policy.should_retry(type("Slow", (TimeoutError,), {})(), 2)
+    assert not policy.should_retry(ValueError(), 1)
+    assert not policy.should_retry(TimeoutError(), 3)
+
+
+def test_backoff_does_not_hold_a_slot():
+    graph = DependencyGraph([{"name": "A"}, {"name": "B"}])
+    events = []
+
+    def prepare(name, attempt, hedge):
+        events.append((name, attempt))
+        return lambda: attempt
+
+    def complete(name, attempt, future):
+        if name == "A" and attempt == 1:
+            return 0.2
+        return None
+
+    start = time.monotonic()
+    DagScheduler(graph, max_concurrency=1).run(prepare, complete)
+
+    # B ran while A was backing off, and A was retried after the delay
+    assert events.index(("B", 1)) < events.index(("A", 2))
+    assert time.monotonic() - start >= 0.2
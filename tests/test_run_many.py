@@ -0,0 +1,41 @@
+# tests/test_run_many.py
+import pytest
+
+from synapse.orchestrator import Orchestrator
+
+
+@pytest.fixture
+def workflow(project):
+    project.agent(
+        "upper",
+        """
+        def run(context):
+            if context["input"] == "bad":
+                raise ValueError("bad input")
+            return {"text": context["input"].upper()}
+        """,
+    )
+    return project.workflow([{"name": "A", "run": "upper.py", "retries": 0}])
+
+
+def test_every_input_gets_its_own_traced_run(workflow):
+    inputs = (text for text in ["a", "bad", "c"])
+    with Orchestrator(workflow) as orchestrator:
+        results = sorted(
+            orchestrator.run_many(inputs, max_runs=2), key=lambda r: r["index"]
+        )
+        runs = {run["run_id"]: run for run in orchestrator.trace.fetch_runs()}
+
+    assert len({r["run_id"] for r in results}) == 3
+    assert set(runs) >= {r["run_id"] for r in results}
+    good = [r["final_context"]["outputs"]["A"]["text"] for r in results[::2]]
+    assert good == ["A", "C"]
+    # a failing run is reported without stopping the others
+    assert [r["error"] is None for r in results] == [True, False, True]
+    assert results[1]["results"][0]["status"] == "failed"
+
+
+def test_max_runs_must_be_positive(workflow):
+    with Orchestrator(workflow) as orchestrator:
+        with pytest.raises(ValueError, match="max_runs"):
+            next(orchestrator.run_many(["a"], max_runs=-1))
@@ -0,0 +1,46 @@
+# tests/test_run_state.py
+from synapse.context import RunContext
+from synapse.orchestrator import Orchestrator
+from synapse.run_state import RunState
+
+
+def test_attempts_and_statuses_are_kept_in_memory():
+    state = RunState("run", RunContext({"input": "hi"}))
+    state.begin_attempt("A", "mock")
+    retried = state.begin_attempt("A", "mock")
+    state.finish(retried.succeed({"ok": True}))
+    failed = state.begin_attempt("B", "gpt-4")
+    state.finish(failed.fail(KeyError("x")))
+
+    results = state.execution_results()
+    assert [(r["agent_name"], r["status"], r["attempts"]) for r in results] == [
+        ("A", "retry_success", 2),
+        ("B", "failed", 1),
+    ]
+    assert results[1]["error_type"] == "KeyError"
+    assert state.results["A"].output == {"ok": True}
+
+
+def test_results_do_not_depend_on_the_trace(project):
+    project.agent(
+        "flaky",
+        """
+        calls = []
+
+
+        def run(context):
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("try again")
+            return {"calls": len(calls)}
+        """,
+    )
+    path = project.workflow(
+        [{"name": "A", "run": "flaky.py", "backoff": {"base": 0, "jitter": "none"}}]
+    )
+    # the null backend records nothing to read attempts back from
+    with Orchestrator(path, trace="null") as orchestrator:
+        orchestrator.run("hi")
+        results = orchestrator.execution_results
+
+    assert [(r["status"], r["attempts"]) for r in results] == [("retry_success", 2)]
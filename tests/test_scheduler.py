@@ -0,0 +1,92 @@
+# tests/test_scheduler.py
+import threading
+import time
+
+import pytest
+
+from synapse.dependency_graph import DependencyGraph
+from synapse.scheduler import DagScheduler
+
+
+def _graph(edges):
+    """DependencyGraph from {agent: [dependencies]}."""
+    return DependencyGraph(
+        [{"name": name, "depends_on": deps} for name, deps in edges.items()]
+    )
+
+
+class Recorder:
+    """prepare/complete pair logging start and finish order."""
+
+    def __init__(self, sleep=0.0, fail=()):
+        self.sleep = sleep
+        self.fail = set(fail)
+        self.started = []
+        self.finished = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, name, attempt, hedge):
+        self.started.append(name)
+
+        def task():
+            with self._lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            time.sleep(self.sleep)
+            with self._lock:
+                self.running -= 1
+            if name in self.fail:
+                raise RuntimeError(f"{name} failed")
+            return name
+
+        return task
+
+    def complete(self, name, attempt, future):
+        future.result()
+        self.finished.append(name)
+        return None
+
+
+def test_dependents_start_after_their_dependencies_finish():
+    graph = _graph({"A": [], "B": ["A"], "C": ["A"], "D": ["B", "C"]})
+    recorder = Recorder()
+    DagScheduler(graph, max_concurrency=4).run(recorder.prepare, recorder.complete)
+
+    finished = recorder.finished
+    assert sorted(finished) == ["A", "B", "C", "D"]
+    for name, dependencies in graph.graph.items():
+        for dependency in dependencies:
+            assert finished.index(dependency) < recorder.started.index(name)
+
+
+def test_independent_agents_run_in_parallel_up_to_the_limit():
+    graph = _graph({name: [] for name in "ABCDEF"})
+    recorder = Recorder(sleep=0.1)
+    start = time.monotonic()
+    DagScheduler(graph, max_concurrency=3).run(recorder.prepare, recorder.complete)
+
+    assert recorder.peak == 3
+    # two waves of three, not six in a row
+    assert time.monotonic() - start < 0.45
+
+
+def test_failure_stops_new_agents_and_is_reraised():
+    graph = _graph({"A": [], "B": ["A"], "C": []})
+    recorder = Recorder(fail={"A"})
+    with pytest.raises(RuntimeError, match="A failed"):
+        DagScheduler(graph, max_concurrency=1).run(recorder.prepare, recorder.complete)
+    assert "B" not in recorder.started
+
+
+def test_completed_agents_are_not_run_again():
+    graph = _graph({"A": [], "B": ["A"]})
+    recorder = Recorder()
+    DagScheduler(graph).run(recorder.prepare, recorder.complete, completed={"A"})
+    assert recorder.started == ["B"]
+
+
+def test_max_concurrency_must_be_positive():
+    with pytest.raises(ValueError):
+        DagScheduler(_graph({"A": []}), max_concurrency=0)
@@ -0,0 +1,120 @@
+# tests/test_streaming.py
+import threading
+import time
+
+from synapse.orchestrator import Orchestrator
+from synapse.streams import ItemStream
+
+
+def test_stream_delivers_items_as_they_arrive():
+    stream = ItemStream("A")
+    seen = []
+    reader = threading.Thread(target=lambda: seen.extend(stream))
+    reader.start()
+    stream.put(1)
+    stream.put(2)
+    stream.close()
+    reader.join(timeout=1)
+
+    assert seen == [1, 2]
+    # closed streams ignore late items and can be read again from the start
+    stream.put(3)
+    assert list(stream) == [1, 2]
+
+
+def test_consumer_starts_before_its_producer_finishes(project):
+    project.agent(
+        "produce",
+        """
+        import time
+
+
+        def run(context):
+            for i in range(3):
+                time.sleep(0.05)
+                yield i
+            open("produced", "w").close()
+        """,
+    )
+    project.agent(
+        "consume",
+        """
+        import os
+
+
+        def run(context):
+            items = []
+            done_early = None
+            for item in context["stream"]:
+                if done_early is None:
+                    done_early = not os.path.exists("produced")
+                items.append(item)
+            return {"items": items, "pipelined": done_early}
+        """,
+    )
+    path = project.workflow(
+        [
+            {"name": "P", "run": "produce.py"},
+            {"name": "C", "run": "consume.py", "depends_on": "P", "stream": True},
+        ]
+    )
+    with Orchestrator(path) as orchestrator:
+        result = orchestrator.run("hi")
+        nodes = orchestrator.trace.fetch_nodes(result["run_id"])
+
+    outputs = result["final_context"]["outputs"]
+    assert outputs["P"] == {"items": [0, 1, 2]}
+    assert outputs["C"] == {"items": [0, 1, 2], "pipelined": True}
+    producer = next(node for node in nodes if node["name"] == "P")
+    assert 0 < producer["metadata"]["time_to_first_item"] < 0.15
+
+
+def test_consumer_waits_for_a_retried_producer_without_its_slot(project):
+    project.agent(
+        "flaky",
+        """
+        import os
+
+
+        def run(context):
+            yield 0
+            if not os.path.exists("failed"):
+                open("failed", "w").close()
+                raise ConnectionError("dropped")
+            yield 1
+        """,
+    )
+    project.agent(
+        "consume",
+        """
+        def run(context):
+            return {"items": list(context["stream"])}
+        """,
+    )
+    path = project.workflow(
+        [
+            {
+                "name": "P",
+                "run": "flaky.py",
+                "retries": 1,
+                "backoff": {"base": 0.2, "jitter": "none"},
+            },
+            {
+                "name": "C",
+                "run": "consume.py",
+                "depends_on": "P",
+                "stream": True,
+                "timeout": 2,
+            },
+        ],
+        max_concurrency=1,
+    )
+
+    with Orchestrator(path) as orchestrator:
+        started = time.monotonic()
+        result = orchestrator.run("hi")
+        elapsed = time.monotonic() - started
+
+    # C did not take the only slot while P waited out its backoff
+    assert result["final_context"]["outputs"]["C"] == {"items": [0, 1]}
+    assert elapsed < 1.5
@@ -0,0 +1,46 @@
+# tests/test_targets.py
+import pytest
+
+from synapse.orchestrator import Orchestrator
+
+
+@pytest.fixture
+def workflow(project, echo_agent):
+    project.agent(
+        "broken",
+        """
+        raise ImportError("not needed for the target, so never loaded")
+        """,
+    )
+    return project.workflow(
+        [
+            {"name": "A", "run": echo_agent},
+            {"name": "B", "run": echo_agent, "depends_on": "A"},
+            {"name": "C", "run": echo_agent, "depends_on": "B"},
+            {"name": "Downstream", "run": "broken.py", "depends_on": "C"},
+            {"name": "Unrelated", "run": "broken.py"},
+        ]
+    )
+
+
+def test_only_the_target_and_its_ancestors_run(workflow):
+    with Orchestrator(workflow, targets=["B"]) as orchestrator:
+        result = orchestrator.run("hi")
+        ran = [r["agent_name"] for r in orchestrator.execution_results]
+
+    assert ran == ["A", "B"]
+    assert result["final_context"]["outputs"]["B"] == {"saw": ["A"]}
+
+
+def test_targets_can_be_repeated(workflow):
+    with Orchestrator(workflow, targets=["A", "C"]) as orchestrator:
+        orchestrator.run("hi")
+        ran = [r["agent_name"] for r in orchestrator.execution_results]
+
+    assert ran == ["A", "B", "C"]
+
+
+def test_unknown_target_is_rejected(workflow):
+    with pytest.raises(ValueError, match="Target agent Nope not found"):
+        with Orchestrator(workflow, targets=["Nope"]) as orchestrator:
+            orchestrator.run("hi")
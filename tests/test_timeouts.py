@@ -0,0 +1,190 @@
+# tests/test_timeouts.py
+import os
+import time
+
+import pytest
+
+from synapse.agent import AgentExecutionError, AgentTimeoutError
+from synapse.orchestrator import Orchestrator
+
+
+@pytest.fixture
+def hang_agent(project):
+    """Agent whose first call hangs for a second; it returns its threads."""
+    return project.agent(
+        "hang",
+        """
+        import threading
+        import time
+
+        calls = []
+
+
+        def run(context):
+            calls.append(threading.current_thread().name)
+            if len(calls) == 1:
+                time.sleep(1.0)
+            return {"threads": list(calls)}
+        """,
+    )
+
+
+def _hang_workflow(project, hang_agent, echo_agent, retries):
+    return project.workflow(
+        [
+            {
+                "name": "A",
+                "run": hang_agent,
+                "timeout": 0.2,
+                "retries": retries,
+                "backoff": {"base": 0, "jitter": "none"},
+            },
+            {"name": "B", "run": echo_agent, "depends_on": "A"},
+        ],
+        max_concurrency=1,
+    )
+
+
+def test_timed_out_attempt_is_retried_without_its_slot(project, hang_agent, echo_agent):
+    path = _hang_workflow(project, hang_agent, echo_agent, retries=1)
+    with Orchestrator(path) as orchestrator:
+        start = time.monotonic()
+        result = orchestrator.run("hi")
+        elapsed = time.monotonic() - start
+        # the hung call returns meanwhile; its result is not recorded
+        time.sleep(1.0)
+        nodes = orchestrator.trace.fetch_nodes(result["run_id"])
+
+    assert elapsed < 0.9
+    threads = result["final_context"]["outputs"]["A"]["threads"]
+    # both attempts ran on the scheduler's workers, not threads of their own
+    assert len(threads) == 2
+    assert all(name.startswith("synapse-agent_") for name in threads)
+    attempts = [
+        (node["attempt"], node["status"]) for node in nodes if node["name"] == "A"
+    ]
+    assert attempts == [(1, "error"), (2, "success")]
+    error = next(node["error"] for node in nodes if node["name"] == "A")
+    assert error["error"] == "Agent A timed out after 0.2s"
+
+
+def test_timeout_fails_the_run_once_retries_are_spent(project, hang_agent, echo_agent):
+    path = _hang_workflow(project, hang_agent, echo_agent, retries=0)
+    with Orchestrator(path) as orchestrator:
+        start = time.monotonic()
+        with pytest.raises(AgentExecutionError) as raised:
+            orchestrator.run("hi")
+        elapsed = time.monotonic() - start
+        statuses = {
+            r["agent_name"]: r["status"] for r in orchestrator.execution_results
+        }
+
+    assert elapsed < 0.9
+    assert isinstance(raised.value.last_error, AgentTimeoutError)
+    assert "B" not in statuses
+
+
+@pytest.mark.parametrize(
+    "returns, message",
+    [("None", "returned None"), ("{'value': object()}", "not JSON serializable")],
+)
+def test_invalid_output_of_a_timed_agent_is_recorded(project, returns, message):
+    project.agent("invalid", f"def run(context):\n    return {returns}\n")
+    # the default 30s timeout applies
+    path = project.workflow([{"name": "A", "run": "invalid.py", "retries": 0}])
+    with Orchestrator(path) as orchestrator:
+        with pytest.raises(AgentExecutionError):
+            orchestrator.run("hi")
+        nodes = orchestrator.trace.fetch_nodes(orchestrator.run_id)
+
+    assert [node["status"] for node in nodes] == ["error"]
+    assert message in nodes[0]["error"]["error"]
+
+
+def test_timed_out_process_agent_has_its_worker_replaced(project):
+    project.agent(
+        "stuck",
+        """
+        import os
+        import time
+
+
+        def run(context):
+            if not os.path.exists("stuck_pid"):
+                with open("stuck_pid", "w") as f:
+                    f.write(str(os.getpid()))
+                time.sleep(30)
+            return {"pid": os.getpid()}
+        """,
+    )
+    path = project.workflow(
+        [
+            {
+                "name": "A",
+                "run": "stuck.py",
+                "timeout": 2,
+                "backoff": {"base": 0, "jitter": "none"},
+            },
+            {"name": "B", "run": "stuck.py", "depends_on": "A"},
+        ],
+        executor="process",
+        process_workers=1,
+    )
+    with Orchestrator(path) as orchestrator:
+        start = time.monotonic()
+        outputs = orchestrator.run("hi")["final_context"]["outputs"]
+        elapsed = time.monotonic() - start
+
+    stuck_pid = int((project.root / "stuck_pid").read_text())
+    assert elapsed < 10
+    # the retry and the next agent ran on the worker preforked in its place
+    assert outputs["A"]["pid"] == outputs["B"]["pid"] != stuck_pid
+    with pytest.raises(ProcessLookupError):
+        os.kill(stuck_pid, 0)
+
+
+def test_timed_out_async_agent_is_cancelled_and_retried(project):
+    project.agent(
+        "slow_async",
+        """
+        import asyncio
+
+        calls = []
+
+
+        async def run(context):
+            calls.append(1)
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(30)
+                except asyncio.CancelledError:
+                    open("cancelled", "w").close()
+                    raise
+            return {"calls": len(calls)}
+        """,
+    )
+    path = project.workflow(
+        [
+            {
+                "name": "A",
+                "run": "slow_async.py",
+                "timeout": 0.2,
+                "backoff": {"base": 0, "jitter": "none"},
+            }
+        ],
+        executor="async",
+    )
+    with Orchestrator(path) as orchestrator:
+        start = time.monotonic()
+        result = orchestrator.run("hi")
+        elapsed = time.monotonic() - start
+        nodes = orchestrator.trace.fetch_nodes(result["run_id"])
+
+    assert elapsed < 0.9
+    assert (project.root / "cancelled").exists()
+    assert result["final_context"]["outputs"]["A"] == {"calls": 2}
+    assert [(node["attempt"], node["status"]) for node in nodes] == [
+        (1, "error"),
+        (2, "success"),
+    ]
+    assert nodes[0]["error"]["error"] == "Agent A timed out after 0.2s"
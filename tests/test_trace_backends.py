@@ -0,0 +1,214 @@
+# tests/test_trace_backends.py
+import sqlite3
+
+import pytest
+
+from synapse.trace import TraceBackend, TraceStore
+from synapse.trace_backends import (
+    MemoryTrace,
+    NDJSONTrace,
+    NullTrace,
+    _RecordTrace,
+    create_trace_backend,
+    import_ndjson,
+    list_segments,
+)
+
+T0 = 1_700_000_000.0
+
+
+def _record_run(backend, run_id="r1", parent_run_id=None):
+    """A small run: a success, a retried failure, a skip and two contexts."""
+    backend.start_run(run_id, "wf", parent_run_id=parent_run_id, ts=T0)
+    context = {"input": "hi", "outputs": {}}
+    backend.record_context_version(run_id, 1, "A", context, ts=T0 + 1)
+    backend.record_node(
+        run_id,
+        "a-1",
+        "A",
+        input_ctx=context,
+        output={"papers": [1, 2]},
+        duration=0.5,
+        attempt=1,
+        model="mock",
+        metadata={"file_name": "a.py"},
+        queue_wait=0.1,
+        ts=T0 + 2,
+    )
+    context = {"input": "hi", "outputs": {"A": {"papers": [1, 2]}}}
+    backend.record_context_version(run_id, 2, "B", context, ts=T0 + 3)
+    backend.record_error(
+        run_id,
+        "b-1",
+        "B",
+        error="boom",
+        stack="Traceback",
+        duration=0.25,
+        attempt=1,
+        model="mock",
+        ts=T0 + 4,
+    )
+    backend.record_skip(run_id, "c-1", "C", "mock", "when: False", ts=T0 + 5)
+    backend.finish_run(run_id, peak_rss=1024)
+
+
+def _contents(backend, run_id="r1"):
+    nodes = backend.fetch_nodes(run_id)
+    for node in nodes:
+        node.pop("id")
+    return {
+        "runs": backend.fetch_runs(),
+        "nodes": nodes,
+        "contexts": backend.fetch_contexts(run_id),
+        "versions": backend.fetch_context_versions(run_id),
+        "context": backend.fetch_context(run_id, 2),
+        "durations": backend.fetch_durations("wf"),
+        "outputs": backend.fetch_outputs(run_id),
+    }
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    store = TraceStore(str(tmp_path / "traces.db"))
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("name", ["memory", "ndjson"])
+def test_backends_read_back_what_sqlite_does(name, project, sqlite_store):
+    backend = create_trace_backend({"backend": name})
+    _record_run(sqlite_store)
+    _record_run(backend)
+
+    assert _contents(backend) == _contents(sqlite_store)
+    backend.close()
+
+
+def test_sqlite_round_trip(sqlite_store):
+    _record_run(sqlite_store, parent_run_id="r0")
+
+    contents = _contents(sqlite_store)
+
+    assert contents["runs"] == [
+        {
+            "run_id": "r1",
+            "started_at": T0,
+            "workflow": "wf",
+            "parent_run_id": "r0",
+            "peak_rss": 1024,
+        }
+    ]
+    assert [node["status"] for node in contents["nodes"]] == [
+        "success",
+        "error",
+        "skipped",
+    ]
+    assert contents["nodes"][0]["output"] == {"papers": [1, 2]}
+    assert contents["context"]["ctx"]["outputs"] == {"A": {"papers": [1, 2]}}
+    assert contents["durations"] == {"A": [0.5]}
+    assert contents["outputs"] == {"A": {"papers": [1, 2]}}
+
+
+@pytest.mark.parametrize("name", ["sqlite", "memory"])
+def test_outputs_are_read_past_any_page_of_nodes(name, project):
+    backend = create_trace_backend({"backend": name})
+    backend.start_run("r1", "wf", ts=T0)
+    for index in range(600):
+        backend.record_node(
+            "r1", "m", "Map", {}, index, 0.1, 1, "mock", {"map_index": index}
+        )
+    backend.record_node("r1", "m", "Map", {}, {"items": [0]}, 1.0, 1, "mock")
+    backend.record_node("r1", "a", "A", {}, {"v": 1}, 0.1, 1, "mock")
+    backend.record_node("r1", "a", "A", {}, {"v": 2}, 0.1, 2, "mock", status="cached")
+    backend.finish_run("r1", peak_rss=None)
+
+    assert len(backend.fetch_nodes("r1")) == 500
+    outputs = backend.fetch_outputs("r1")
+    # the latest output of each agent, item tasks left out
+    assert list(outputs.items()) == [("Map", {"items": [0]}), ("A", {"v": 2})]
+    backend.close()
+
+
+@pytest.mark.parametrize("durability", ["batched", "sync"])
+def test_closed_sqlite_store_releases_its_connection(tmp_path, durability):
+    store = TraceStore(str(tmp_path / "traces.db"), durability=durability)
+    _record_run(store)
+    store.close()
+    # closing twice is fine
+    store.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.conn.execute("SELECT 1")
+    # a late record, e.g. from a hedge loser, is refused, not written
+    with pytest.raises(RuntimeError, match="after close"):
+        _record_run(store, run_id="late")
+    reopened = TraceStore(str(tmp_path / "traces.db"))
+    assert [run["run_id"] for run in reopened.fetch_runs()] == ["r1"]
+    reopened.close()
+
+
+def test_ndjson_segments_import_into_sqlite(tmp_path, sqlite_store):
+    directory = str(tmp_path / "segments")
+    ndjson = NDJSONTrace(directory, segment_bytes=256)
+    _record_run(ndjson)
+    ndjson.close()
+    imported = TraceStore(str(tmp_path / "imported.db"))
+
+    segments = list_segments(directory)
+    count = import_ndjson(segments, imported)
+
+    assert len(segments) > 1
+    # run, two contexts, three nodes and the run end
+    assert count == 7
+    _record_run(sqlite_store)
+    assert _contents(imported) == _contents(sqlite_store)
+    imported.close()
+
+
+def test_memory_trace_keeps_only_the_latest_records():
+    memory = MemoryTrace(capacity=2)
+    _record_run(memory)
+
+    assert [node["name"] for node in memory.fetch_nodes("r1")] == ["B", "C"]
+    assert memory.fetch_contexts("r1") == []
+
+
+def test_null_trace_records_nothing():
+    null = NullTrace()
+    _record_run(null)
+
+    assert _contents(null) == {
+        "runs": [],
+        "nodes": [],
+        "contexts": [],
+        "versions": [],
+        "context": None,
+        "durations": {},
+        "outputs": {},
+    }
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown trace backend"):
+        create_trace_backend({"backend": "s3"})
+
+
+def test_backends_missing_methods_cannot_be_created():
+    class Partial(TraceBackend):
+        def fetch_runs(self, limit=50):
+            return []
+
+    class NoEmit(_RecordTrace):
+        def fetch_runs(self, limit=50):
+            return []
+
+        def fetch_nodes(self, run_id, limit=500):
+            return []
+
+        def fetch_contexts(self, run_id):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial()
+    with pytest.raises(TypeError):
+        NoEmit()
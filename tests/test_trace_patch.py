@@ -0,0 +1,64 @@
+# tests/test_trace_patch.py
+import sqlite3
+
+import pytest
+
+from synapse.trace import TraceStore
+from synapse.trace_patch import apply, diff
+
+
+def test_patch_turns_old_into_new_without_changing_it():
+    old = {"input": "hi", "outputs": {"A": {"n": 1}, "B": [1, 2]}}
+    new = {"input": "hi", "outputs": {"A": {"n": 2}, "C": True}}
+    ops = diff(old, new)
+
+    assert apply(old, ops) == new
+    assert old == {"input": "hi", "outputs": {"A": {"n": 1}, "B": [1, 2]}}
+    assert sorted(op["path"] for op in ops) == [
+        "/outputs/A/n",
+        "/outputs/B",
+        "/outputs/C",
+    ]
+
+
+def test_shared_values_are_skipped_and_types_kept_apart():
+    shared = {"papers": list(range(1000))}
+    assert diff({"A": shared}, {"A": shared}) == []
+    # 1 == True == 1.0 in Python, but not in JSON
+    assert diff({"n": 1}, {"n": True}) == [
+        {"op": "replace", "path": "/n", "value": True}
+    ]
+    assert diff([1, 2], [1.0, 2]) != []
+
+
+def test_keys_with_slashes_and_tildes_round_trip():
+    old = {"a/b": 1, "~c": {"d": 2}}
+    new = {"a/b": 2, "~c": {}, 3: "x"}
+    assert apply(old, diff(old, new)) == {"a/b": 2, "~c": {}, "3": "x"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TraceStore(str(tmp_path / "traces.db"), snapshot_interval=3)
+    yield store
+    store.close()
+
+
+def test_context_versions_are_rebuilt_from_patches(store):
+    contexts = []
+    outputs = {}
+    for version in range(1, 8):
+        outputs = {**outputs, f"A{version}": {"value": version}}
+        contexts.append({"input": "hi", "outputs": outputs})
+        store.record_context_version("run", version, f"A{version}", contexts[-1])
+
+    assert [v["ctx"] for v in store.fetch_contexts("run")] == contexts
+    assert store.fetch_context("run", 5)["ctx"] == contexts[4]
+    assert store.fetch_context("run", 9) is None
+
+    with sqlite3.connect(store.db_path) as conn:
+        bases = conn.execute(
+            "SELECT base_version FROM contexts ORDER BY version"
+        ).fetchall()
+    # a full snapshot every third version, patches against the previous one
+    assert [row[0] for row in bases] == [None, 1, 2, None, 4, 5, None]
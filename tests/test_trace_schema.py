@@ -0,0 +1,101 @@
+# tests/test_trace_schema.py
+import json
+import sqlite3
+
+import pytest
+
+from synapse.trace import TraceStore
+from synapse.trace_schema import SCHEMA_VERSION, connect, migrate
+
+
+def _version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_new_database_is_created_at_the_current_version(tmp_path):
+    conn = connect(str(tmp_path / "traces.db"))
+    assert migrate(conn) == SCHEMA_VERSION
+    # a second open has nothing left to do
+    assert migrate(conn) == SCHEMA_VERSION
+
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    }
+    assert {"idx_runs_workflow", "idx_nodes_run_id", "idx_contexts_run_id"} <= indexes
+    conn.close()
+
+
+def test_database_from_before_versioning_is_upgraded_in_place(tmp_path):
+    path = str(tmp_path / "traces.db")
+    with sqlite3.connect(path) as conn:
+        # as created by the first releases
+        conn.execute(
+            """CREATE TABLE runs (run_id TEXT PRIMARY KEY, started_at REAL,
+            workflow TEXT)"""
+        )
+        conn.execute(
+            """CREATE TABLE nodes (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT, agent_id TEXT, name TEXT, input_json TEXT,
+            output_json TEXT, duration REAL, attempt INTEGER, error TEXT,
+            ts REAL, model TEXT)"""
+        )
+        conn.execute("INSERT INTO runs VALUES ('old', 1.0, 'demo')")
+        conn.execute(
+            """INSERT INTO nodes (run_id, agent_id, name, input_json,
+            output_json, duration, attempt, ts, model)
+            VALUES ('old', 'a1', 'A', ?, ?, 0.5, 1, 1.0, 'mock')""",
+            (json.dumps({"input": "hi"}), json.dumps({"value": 1})),
+        )
+
+    store = TraceStore(path)
+    try:
+        nodes = store.fetch_nodes("old")
+        assert [(n["name"], n["input"], n["output"]) for n in nodes] == [
+            ("A", {"input": "hi"}, {"value": 1})
+        ]
+        assert [run["run_id"] for run in store.fetch_runs()] == ["old"]
+        assert _version(store.conn) == SCHEMA_VERSION
+    finally:
+        store.close()
+
+
+def test_database_from_a_newer_synapse_is_left_alone(tmp_path):
+    conn = connect(str(tmp_path / "traces.db"))
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+
+    assert migrate(conn) == SCHEMA_VERSION + 1
+    tables = conn.execute("SELECT name FROM sqlite_master").fetchall()
+    assert tables == []
+    conn.close()
+
+
+def test_read_only_store_reads_without_touching_the_database(tmp_path):
+    path = str(tmp_path / "traces.db")
+    store = TraceStore(path, durability="sync")
+    store.start_run("r1", "wf", ts=1.0)
+    store.close()
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=DELETE")
+
+    reader = TraceStore(path, read_only=True)
+    try:
+        assert [run["run_id"] for run in reader.fetch_runs()] == ["r1"]
+        with pytest.raises(RuntimeError, match="read-only"):
+            reader.start_run("r2", "wf")
+    finally:
+        reader.close()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+
+
+def test_read_only_store_refuses_an_old_database(tmp_path):
+    path = str(tmp_path / "traces.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE runs (run_id TEXT PRIMARY KEY)")
+
+    with pytest.raises(RuntimeError, match="schema version 0"):
+        TraceStore(path, read_only=True)
+    with sqlite3.connect(path) as conn:
+        assert _version(conn) == 0
@@ -0,0 +1,62 @@
+# tests/test_trace_store.py
+import sqlite3
+
+import pytest
+
+from synapse.trace import TraceStore
+from synapse.trace_writer import TraceWriteError
+
+
+def _record(store, run_id, name, output, outputs=None):
+    store.record_node(
+        run_id=run_id,
+        agent_id=name,
+        name=name,
+        input_ctx={"input": "hi", "outputs": outputs or {}},
+        output=output,
+        duration=0.5,
+        attempt=1,
+        model="mock",
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TraceStore(str(tmp_path / "traces.db"))
+    yield store
+    store.close()
+
+
+def test_nodes_round_trip_through_shared_blobs(store):
+    store.start_run("r1", workflow="wf")
+    big = {"text": "x" * 10000}
+    _record(store, "r1", "A", big)
+    _record(store, "r1", "B", {"n": 1}, outputs={"A": big})
+    store.finish_run("r1", peak_rss=None)
+
+    nodes = {node["name"]: node for node in store.fetch_nodes("r1")}
+
+    assert nodes["A"]["output"] == big
+    assert nodes["B"]["input"] == {"input": "hi", "outputs": {"A": big}}
+    blobs = store.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+    # "hi" and A's output are stored once although both nodes hold them
+    assert blobs == 7
+
+
+def test_blobs_of_a_failed_batch_are_written_again(store, tmp_path):
+    store.start_run("r1", workflow="wf")
+    store.flush()
+    other = sqlite3.connect(str(tmp_path / "traces.db"))
+    other.execute("ALTER TABLE blobs RENAME TO blobs_moved")
+    other.commit()
+    _record(store, "r1", "A", {"value": 1})
+    with pytest.raises(TraceWriteError):
+        store.flush()
+    other.execute("ALTER TABLE blobs_moved RENAME TO blobs")
+    other.commit()
+    other.close()
+
+    _record(store, "r1", "A", {"value": 1})
+    store.flush()
+
+    assert [node["output"] for node in store.fetch_nodes("r1")] == [{"value": 1}]
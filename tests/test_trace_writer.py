@@ -0,0 +1,70 @@
+# tests/test_trace_writer.py
+import sqlite3
+import time
+
+import pytest
+
+from synapse.trace_writer import TraceWriteError, TraceWriter
+
+INSERT = "INSERT INTO events (id, value) VALUES (?, ?)"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "writer.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, value TEXT)")
+    return path
+
+
+def _rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT id, value FROM events ORDER BY id").fetchall()
+
+
+def test_flush_commits_everything_queued_in_order(db_path):
+    writer = TraceWriter(db_path, batch_size=3, flush_interval=10)
+    for i in range(7):
+        writer.write(INSERT, (i, f"v{i}"))
+    writer.flush()
+
+    assert _rows(db_path) == [(i, f"v{i}") for i in range(7)]
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.write(INSERT, (7, "late"))
+
+
+def test_batches_are_committed_after_the_flush_interval(db_path):
+    writer = TraceWriter(db_path, batch_size=100, flush_interval=0.05)
+    writer.write(INSERT, (1, "a"))
+    deadline = time.monotonic() + 2
+    # no flush: the writer commits on its own once the interval is over
+    while not _rows(db_path) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    committed = _rows(db_path)
+    writer.close()
+
+    assert committed == [(1, "a")]
+
+
+def test_failed_batch_is_rolled_back_and_reported(db_path):
+    rolled_back = []
+    writer = TraceWriter(
+        db_path, batch_size=10, flush_interval=10, on_rollback=rolled_back.extend
+    )
+    writer.write(INSERT, (1, "a"))
+    writer.write(INSERT, (1, "duplicate"))
+    with pytest.raises(TraceWriteError):
+        writer.flush()
+    # the error is reported once, and later batches still go through
+    writer.write(INSERT, (2, "b"))
+    writer.flush()
+    writer.close()
+
+    assert _rows(db_path) == [(2, "b")]
+    assert [params for _, params in rolled_back] == [(1, "a"), (1, "duplicate")]
+
+
+def test_batch_size_must_be_positive(db_path):
+    with pytest.raises(ValueError):
+        TraceWriter(db_path, batch_size=0)